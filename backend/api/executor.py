@@ -0,0 +1,181 @@
+# api/executor.py
+"""
+Optional process pool for CPU-bound work.
+
+Sync FastAPI endpoints run in a threadpool and share one GIL, so a large
+calendar or batch computation would slow every other request. In "process"
+mode such work is submitted to a ProcessPoolExecutor instead:
+  - bounded: at most `max_pending` unfinished tasks, then ComputeBusy (-> 503)
+  - per-task timeout: ComputeTimeout (-> 504)
+  - shutdown() cancels queued tasks and waits for running ones
+In "inline" mode (or for small requests) functions are simply called.
+
+Workers are started with "forkserver" (or "spawn" where unavailable), never
+by forking the threaded server process. A timed-out task that is already
+running cannot be cancelled and keeps its worker and slot until it ends;
+after `max_timeouts` such timeouts in a row the pool is recycled, killing
+the stuck workers.
+"""
+
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+
+class ComputeBusy(Exception):
+    """Too many pending tasks."""
+
+
+class ComputeTimeout(Exception):
+    """A task did not finish within the timeout."""
+
+
+class ComputePool:
+    def __init__(self, mode: str = "inline", workers: int = 1, max_pending: int = 64, timeout: float = 30.0,
+                 max_timeouts: int = 3):
+        if mode not in ("inline", "process"):
+            raise ValueError(f"Unknown compute mode '{mode}'. Use 'inline' or 'process'.")
+        self.mode = mode
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.max_timeouts = max_timeouts
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._closed = False
+        self.submitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.recycled = 0
+        self._stuck = 0  # running tasks abandoned since the last success
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode == "process" and not self._closed
+
+    def _get_executor(self):
+        # Started lazily so importing the app never starts processes.
+        with self._lock:
+            if self._closed:
+                raise ComputeBusy("Compute pool is shut down.")
+            if self._executor is None:
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context(method)
+                )
+            return self._executor
+
+    def submit(self, fn, *args):
+        """Submit fn(*args) to the pool; the future releases its slot when done."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise ComputeBusy(f"More than {self.max_pending} computations pending.")
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.submitted += 1
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def result(self, future):
+        try:
+            value = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # cancel() only stops queued tasks; a running one keeps its worker
+            stuck = not future.cancel()
+            with self._lock:
+                self.timed_out += 1
+                self._stuck += stuck
+                recycle = self._stuck >= self.max_timeouts
+            if recycle:
+                self._recycle()
+            raise ComputeTimeout(f"Computation exceeded {self.timeout:g}s.") from None
+        with self._lock:
+            self._stuck = 0
+        return value
+
+    def _recycle(self):
+        """Replace the executor, terminating workers stuck on abandoned tasks."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._stuck = 0
+            self.recycled += 1
+        if executor is None:
+            return
+        # No public API kills running workers; their futures then fail with
+        # BrokenProcessPool, which releases their slots.
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    def run(self, fn, *args, offload: bool = True):
+        """fn(*args) in the pool when enabled and offload is True, otherwise inline."""
+        if not (offload and self.enabled):
+            return fn(*args)
+        return self.result(self.submit(fn, *args))
+
+    def map_ordered(self, fn, arg_tuples, window: int, on_error=None):
+        """
+        Yield fn(*args) for each item, in order, keeping at most `window` tasks
+        in flight so results stream out while memory stays bounded.
+
+        If a pooled task fails (timeout, killed worker), on_error(args, exc)
+        is yielded in its place; without on_error the exception propagates.
+        """
+        if not self.enabled:
+            for args in arg_tuples:
+                yield fn(*args)
+            return
+
+        def collect(args, future):
+            try:
+                return self.result(future)
+            except Exception as e:
+                if on_error is None:
+                    raise
+                return on_error(args, e)
+
+        pending = deque()
+        try:
+            for args in arg_tuples:
+                try:
+                    future = self.submit(fn, *args)
+                except ComputeBusy:
+                    # Pool saturated by other requests: drain ours, then do this one inline.
+                    while pending:
+                        yield collect(*pending.popleft())
+                    yield fn(*args)
+                    continue
+                pending.append((args, future))
+                if len(pending) >= window:
+                    yield collect(*pending.popleft())
+            while pending:
+                yield collect(*pending.popleft())
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._closed = True
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "workers": self.workers if self.mode == "process" else 0,
+            "max_pending": self.max_pending,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "recycled": self.recycled,
+        }
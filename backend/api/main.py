@@ -1,20 +1,44 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, Header, HTTPException, Query, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
-from datetime import date
-from core.prayer_times import get_prayer_times
+from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, Field
+from datetime import date, timedelta
+import json
+from core.prayer_times import get_prayer_times, resolve_fields
 from fastapi.middleware.cors import CORSMiddleware
 
 from core.methods import METHODS
-from core.scheduler import calculate_schedule
-from core.scheduler import calculate_schedule
 from typing import List, Optional
 
+from contextlib import asynccontextmanager
+
+from api import tasks
+from api.cache import ResponseCache, etag_matches, make_etag, quantize
+from api.coalesce import SingleFlight
+from api.executor import ComputeBusy, ComputePool, ComputeTimeout
+from config import settings
+
+# Large calendar / batch / schedule computations can run in worker processes
+# (COMPUTE_MODE=process); everything else stays inline.
+compute_pool = ComputePool(
+    mode=settings.COMPUTE_MODE,
+    workers=settings.COMPUTE_WORKERS,
+    max_pending=settings.COMPUTE_MAX_PENDING,
+    timeout=settings.COMPUTE_TIMEOUT_SECONDS,
+)
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    # Graceful shutdown: cancel queued work, wait for running tasks.
+    compute_pool.shutdown()
+
 app = FastAPI(
     title="Al-Vaqth API",
     description="Backend for Al-Vaqth - The Prayer Time Engine.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS (Required for React Frontend)
@@ -36,10 +60,16 @@ class PrayerTimesRequest(BaseModel):
 
     timezone: str = "UTC"
 
+class BatchRequest(BaseModel):
+    queries: List[PrayerTimesRequest]
+
 class TaskItem(BaseModel):
     name: str
-    duration_minutes: int
+    id: Optional[str] = None  # defaults to the name
+    duration_minutes: int = Field(gt=0)
     type: str = "shallow"  # 'deep' or 'shallow'
+    priority: int = 0  # higher is placed first
+    splittable: bool = True  # may be spread over several gaps
 
 class ScheduleRequest(BaseModel):
     latitude: float
@@ -49,6 +79,15 @@ class ScheduleRequest(BaseModel):
     method: str = "MWL"
     tasks: List[TaskItem]
 
+class ScheduleRangeRequest(BaseModel):
+    latitude: float
+    longitude: float
+    start: date
+    end: date
+    timezone: str
+    method: str = "MWL"
+    tasks: List[TaskItem]
+
 @app.get("/")
 def read_root():
     return FileResponse('static/index.html')
@@ -60,62 +99,251 @@ def list_methods():
     """
     return {key: val["name"] for key, val in METHODS.items()}
 
+# The answer for (lat, lng, date, method, timezone) never changes, so /times
+# responses are cached server-side and marked cacheable for clients.
+times_cache = ResponseCache(settings.TIMES_CACHE_SIZE, settings.TIMES_CACHE_TTL_SECONDS)
+
+# Identical concurrent requests share one in-flight computation.
+times_flight = SingleFlight()
+range_flight = SingleFlight()
+schedule_flight = SingleFlight()
+
 @app.get("/times")
 def calculate_times(
+    response: Response,
     lat: float = Query(..., description="Latitude"),
     lng: float = Query(..., description="Longitude"),
     date_str: date = Query(..., alias="date", description="Date in YYYY-MM-DD format"),
     method: str = Query("MWL", description="Calculation method key (e.g. MWL, ISNA, KARACHI)"),
-    timezone: str = Query("Europe/London", description="IANA Timezone string")
+    timezone: str = Query("Europe/London", description="IANA Timezone string"),
+    fields: Optional[str] = Query(None, description="Comma-separated prayers to compute (e.g. maghrib,isha); default all"),
+    if_none_match: Optional[str] = Header(None)
 ):
     """
     Calculate prayer times for a specific location and date.
     Returns standard and Hanafi Asr times, and high-latitude fallback info.
+    With `fields`, only those prayers (and what they depend on) are computed.
+
+    Responses carry an ETag and a long Cache-Control lifetime; a matching
+    If-None-Match returns 304 without computing anything.
     """
     if method not in METHODS:
         supported = ", ".join(METHODS.keys())
         raise HTTPException(status_code=400, detail=f"Unknown method '{method}'. Supported: {supported}")
 
     try:
-        result = get_prayer_times(
-            latitude=lat,
-            longitude=lng,
-            on_date=date_str,
-            method_key=method,
-            timezone=timezone
-        )
+        selected = resolve_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    lat = quantize(lat, settings.COORDINATE_PRECISION)
+    lng = quantize(lng, settings.COORDINATE_PRECISION)
+    key = (lat, lng, date_str, method, timezone)
+    if fields is not None:
+        key += (",".join(selected),)
+    etag = make_etag(app.version, *key)
+    cache_headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.TIMES_CACHE_MAX_AGE}",
+    }
+
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=cache_headers)
+
+    def compute():
+        try:
+            result = get_prayer_times(
+                latitude=lat,
+                longitude=lng,
+                on_date=date_str,
+                method_key=method,
+                timezone=timezone,
+                fields=selected
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        times_cache.set(key, result)
         return result
+
+    result = times_cache.get(key)
+    if result is None:
+        result = times_flight.do(key, compute)
+
+    response.headers.update(cache_headers)
+    return result
+
+@app.get("/stats")
+def service_stats():
+    """
+    Cache counters for monitoring.
+    """
+    return {
+        "times_cache": times_cache.stats(),
+        "coalescing": {
+            "times": times_flight.stats(),
+            "times_range": range_flight.stats(),
+            "schedule": schedule_flight.stats(),
+        },
+        "compute_pool": compute_pool.stats(),
+    }
+
+def run_compute(fn, *args, offload):
+    """
+    Run a computation (inline or in the process pool) and map failures to HTTP errors.
+    """
+    try:
+        return compute_pool.run(fn, *args, offload=offload)
+    except ComputeBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except ComputeTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+MAX_RANGE_DAYS = 366
+
+def resolve_date_range(year, month, start, end):
+    """
+    Turn the /times/range query into (start, end).
+    Either year (optionally with month) or an explicit start and end.
+    """
+    if year is not None:
+        if start is not None or end is not None:
+            raise HTTPException(status_code=400, detail="Use either year/month or start/end, not both.")
+        if month is None:
+            return date(year, 1, 1), date(year, 12, 31)
+        first = date(year, month, 1)
+        next_month = date(year + (month == 12), month % 12 + 1, 1)
+        return first, next_month - timedelta(days=1)
+
+    if month is not None:
+        raise HTTPException(status_code=400, detail="month requires year.")
+    if start is None or end is None:
+        raise HTTPException(status_code=400, detail="Provide year (and optional month) or start and end.")
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start.")
+    if (end - start).days + 1 > MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {MAX_RANGE_DAYS} days.")
+    return start, end
+
+@app.get("/times/range")
+def calculate_times_range(
+    lat: float = Query(..., description="Latitude"),
+    lng: float = Query(..., description="Longitude"),
+    year: Optional[int] = Query(None, ge=1900, le=2100, description="Whole year (e.g. 2025)"),
+    month: Optional[int] = Query(None, ge=1, le=12, description="Month of `year` (1-12)"),
+    start: Optional[date] = Query(None, description="First date (YYYY-MM-DD), with `end`"),
+    end: Optional[date] = Query(None, description="Last date (YYYY-MM-DD), inclusive"),
+    method: str = Query("MWL", description="Calculation method key (e.g. MWL, ISNA, KARACHI)"),
+    timezone: str = Query("Europe/London", description="IANA Timezone string")
+):
+    """
+    Prayer timetable for a month, a year or an arbitrary date range, computed in one pass.
+    Columnar response: `dates` plus one list per prayer under `times`.
+    """
+    if method not in METHODS:
+        supported = ", ".join(METHODS.keys())
+        raise HTTPException(status_code=400, detail=f"Unknown method '{method}'. Supported: {supported}")
+
+    range_start, range_end = resolve_date_range(year, month, start, end)
+
+    offload = (range_end - range_start).days + 1 >= settings.COMPUTE_OFFLOAD_MIN_DAYS
+
+    def compute():
+        return run_compute(
+            tasks.times_range, lat, lng, range_start, range_end, method, timezone,
+            offload=offload
+        )
+
+    return range_flight.do((lat, lng, range_start, range_end, method, timezone), compute)
+
+MAX_BATCH_QUERIES = 50_000
+
+def iter_batch_results(queries):
+    """
+    One NDJSON line per query, produced lazily so memory stays flat.
+    A failing query (bad timezone, unknown method, polar edge case) yields an
+    error line instead of aborting the batch.
+
+    Queries are processed in chunks; with the process pool enabled, a bounded
+    window of chunks runs in parallel and results are streamed in order. A
+    chunk that times out in the pool yields an error line per query.
+    """
+    chunk_size = settings.COMPUTE_BATCH_CHUNK
+
+    def chunks():
+        for first in range(0, len(queries), chunk_size):
+            chunk = [
+                (q.latitude, q.longitude, q.date, q.method, q.timezone)
+                for q in queries[first:first + chunk_size]
+            ]
+            yield first, chunk
+
+    if len(queries) <= chunk_size:
+        for first, chunk in chunks():
+            yield from tasks.batch_lines(first, chunk)
+        return
+
+    window = 2 * compute_pool.workers
+    on_error = lambda args, error: tasks.batch_error_lines(*args, error)
+    for lines in compute_pool.map_ordered(tasks.batch_lines, chunks(), window=window, on_error=on_error):
+        yield from lines
+
+@app.post("/times/batch")
+def calculate_times_batch(req: BatchRequest):
+    """
+    Prayer times for many (location, date, method, timezone) queries.
+    Streams `application/x-ndjson`: one line per query, in request order, each with
+    its `index` and either `result` or `error`.
+    """
+    if len(req.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"Batch is limited to {MAX_BATCH_QUERIES} queries.")
+    return StreamingResponse(iter_batch_results(req.queries), media_type="application/x-ndjson")
+
 @app.post("/schedule")
 def generate_schedule(req: ScheduleRequest):
     """
     Generate a faith-optimized schedule based on prayer times.
     """
-    try:
-        # 1. Get Prayer Times
-        prayer_data = get_prayer_times(
-            latitude=req.latitude,
-            longitude=req.longitude,
-            on_date=req.date,
-            method_key=req.method,
-            timezone=req.timezone
+    def compute():
+        # Convert Pydantic models to dicts for the core logic
+        task_list = [t.dict(exclude_none=True) for t in req.tasks]
+        return run_compute(
+            tasks.build_schedule,
+            req.latitude, req.longitude, req.date, req.method, req.timezone, task_list,
+            offload=len(task_list) >= settings.COMPUTE_OFFLOAD_MIN_TASKS
         )
-        
-        # 2. Convert Pydantic models to dicts for the core logic
-        task_list = [t.dict() for t in req.tasks]
-        
-        # 3. Calculate Schedule
-        schedule = calculate_schedule(task_list, prayer_data)
-        
-        return {
-            "date": req.date,
-            "prayer_times": prayer_data['times'],
-            "schedule": schedule
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+
+    key = json.dumps(jsonable_encoder(req), sort_keys=True)
+    return schedule_flight.do(key, compute)
+
+MAX_SCHEDULE_DAYS = 31
+
+@app.post("/schedule/range")
+def generate_schedule_range(req: ScheduleRangeRequest):
+    """
+    Plan a task backlog over several days (e.g. a week). Work that does not fit
+    on one day is carried over to the next; what is left at the end is returned
+    under `unscheduled`.
+    """
+    if req.method not in METHODS:
+        supported = ", ".join(METHODS.keys())
+        raise HTTPException(status_code=400, detail=f"Unknown method '{req.method}'. Supported: {supported}")
+    if req.end < req.start:
+        raise HTTPException(status_code=400, detail="end must not be before start.")
+    if (req.end - req.start).days + 1 > MAX_SCHEDULE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Schedules are limited to {MAX_SCHEDULE_DAYS} days.")
+
+    def compute():
+        task_list = [t.dict(exclude_none=True) for t in req.tasks]
+        return run_compute(
+            tasks.build_schedule_range,
+            req.latitude, req.longitude, req.start, req.end, req.method, req.timezone, task_list,
+            offload=len(task_list) >= settings.COMPUTE_OFFLOAD_MIN_TASKS
+        )
+
+    key = json.dumps(jsonable_encoder(req), sort_keys=True)
+    return schedule_flight.do(key, compute)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,87 @@
+# api/tasks.py
+"""
+Top-level computation functions for the API.
+
+Kept free of FastAPI objects so they can be pickled and run in a worker
+process (see api/executor.py) as well as inline.
+"""
+
+import json
+
+from core.prayer_calendar import get_prayer_datetimes_range, get_prayer_times_range
+from core.prayer_times import get_prayer_day, get_prayer_times
+from core.scheduler import MultiDayPlan, calculate_schedule
+
+
+def batch_lines(first_index, queries):
+    """
+    NDJSON lines for a chunk of /times/batch queries.
+    queries: (latitude, longitude, date, method, timezone) tuples.
+    """
+    lines = []
+    for offset, (latitude, longitude, on_date, method, timezone) in enumerate(queries):
+        try:
+            result = get_prayer_times(
+                latitude=latitude,
+                longitude=longitude,
+                on_date=on_date,
+                method_key=method,
+                timezone=timezone
+            )
+            line = {"index": first_index + offset, "status": "ok", "result": result}
+        except Exception as e:
+            line = {"index": first_index + offset, "status": "error", "error": str(e)}
+        lines.append(json.dumps(line) + "\n")
+    return lines
+
+
+def batch_error_lines(first_index, queries, error):
+    """Error lines for a chunk whose computation failed as a whole (e.g. timed out)."""
+    return [
+        json.dumps({"index": first_index + offset, "status": "error", "error": str(error)}) + "\n"
+        for offset in range(len(queries))
+    ]
+
+
+def build_schedule(latitude, longitude, on_date, method, timezone, tasks):
+    """Prayer times + schedule for /schedule. tasks: list of task dicts."""
+    prayer_day = get_prayer_day(
+        latitude=latitude,
+        longitude=longitude,
+        on_date=on_date,
+        method_key=method,
+        timezone=timezone
+    )
+    schedule, unscheduled = calculate_schedule(tasks, prayer_day)
+    return {
+        "date": on_date,
+        "prayer_times": prayer_day.to_dict()["times"],
+        "schedule": schedule,
+        "unscheduled": unscheduled
+    }
+
+
+def build_schedule_range(latitude, longitude, start, end, method, timezone, tasks):
+    """Multi-day plan for /schedule/range: prayer times for the whole range in one pass."""
+    days = get_prayer_datetimes_range(
+        latitude=latitude,
+        longitude=longitude,
+        start=start,
+        end=end,
+        method_key=method,
+        timezone=timezone
+    )
+    plan = MultiDayPlan(days, tasks)
+    return {"start": start, "end": end, **plan.render()}
+
+
+def times_range(latitude, longitude, start, end, method, timezone):
+    """Columnar timetable for /times/range."""
+    return get_prayer_times_range(
+        latitude=latitude,
+        longitude=longitude,
+        start=start,
+        end=end,
+        method_key=method,
+        timezone=timezone
+    )
@@ -0,0 +1,47 @@
+# config/settings.py
+"""
+Runtime settings for the Al-Vaqth API.
+Every value can be overridden with an environment variable of the same name.
+"""
+
+import os
+
+
+def _optional_int(name):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else None
+
+
+# -----------------------
+# /times response cache
+# -----------------------
+# Entries kept in memory (LRU) and how long each one lives.
+TIMES_CACHE_SIZE = int(os.getenv("TIMES_CACHE_SIZE", "10000"))
+TIMES_CACHE_TTL_SECONDS = int(os.getenv("TIMES_CACHE_TTL_SECONDS", "86400"))
+
+# Cache-Control max-age sent to clients. A (location, date, method, timezone)
+# answer never changes, so this can be long.
+TIMES_CACHE_MAX_AGE = int(os.getenv("TIMES_CACHE_MAX_AGE", "604800"))
+
+# Round latitude/longitude to this many decimal places before computing and
+# caching (4 places ~ 11 m, far below one minute of prayer time). Unset = exact.
+COORDINATE_PRECISION = _optional_int("COORDINATE_PRECISION")
+
+
+# -----------------------
+# CPU-heavy computation
+# -----------------------
+# "inline": compute in the request thread (default).
+# "process": large calendar / batch / schedule requests run in a process pool
+#            so they use every core; small requests always stay inline.
+COMPUTE_MODE = os.getenv("COMPUTE_MODE", "inline")
+COMPUTE_WORKERS = _optional_int("COMPUTE_WORKERS") or os.cpu_count() or 1
+
+# Tasks submitted but not finished. Beyond this the API answers 503 instead of queueing.
+COMPUTE_MAX_PENDING = int(os.getenv("COMPUTE_MAX_PENDING", "64"))
+COMPUTE_TIMEOUT_SECONDS = float(os.getenv("COMPUTE_TIMEOUT_SECONDS", "30"))
+
+# What counts as "large"
+COMPUTE_OFFLOAD_MIN_DAYS = int(os.getenv("COMPUTE_OFFLOAD_MIN_DAYS", "32"))
+COMPUTE_OFFLOAD_MIN_TASKS = int(os.getenv("COMPUTE_OFFLOAD_MIN_TASKS", "200"))
+COMPUTE_BATCH_CHUNK = int(os.getenv("COMPUTE_BATCH_CHUNK", "500"))
@@ -0,0 +1,180 @@
+# core/prayer_calendar.py
+"""
+Prayer timetable for a date range.
+
+Same rules as prayer_times.get_prayer_times (method plan, Asr variants,
+middle-of-the-night fallback, offsets), but evaluated for every day of the
+range at once with the vectorized solar engine: each day's solar state is
+computed once and shared by all of that day's events.
+
+Output is columnar: one list per prayer instead of one dict per day.
+"""
+
+from __future__ import annotations
+
+from datetime import date as Date, datetime, timedelta
+
+import numpy as np
+
+from core import solar_vectorized as vsolar
+from core.location import Location, cached_location
+from core.method_plans import get_plan
+from core.prayer_day import PRAYER_KEYS
+
+_HORIZON_ALTITUDE = -0.833
+
+
+def _minutes(delta: timedelta) -> float:
+    return delta.total_seconds() / 60.0
+
+
+def _format_column(days: np.ndarray, minutes_utc: np.ndarray, tz) -> list:
+    """Minutes after 00:00 UTC of each day -> local "HH:MM" (None where NaN)."""
+    out = []
+    for day, value in zip(days.tolist(), minutes_utc.tolist()):
+        if value != value:  # NaN
+            out.append(None)
+            continue
+        # Whole seconds (floor), like strftime on the scalar engine's datetimes
+        micros = day * 86_400_000_000 + round(value * 60e6)
+        local = datetime.fromtimestamp(micros // 1_000_000, tz)
+        out.append(f"{local.hour:02d}:{local.minute:02d}")
+    return out
+
+
+def _datetime_column(days: np.ndarray, minutes_utc: np.ndarray, tz) -> list:
+    """Minutes after 00:00 UTC of each day -> aware local datetime (None where NaN)."""
+    out = []
+    for day, value in zip(days.tolist(), minutes_utc.tolist()):
+        if value != value:  # NaN
+            out.append(None)
+            continue
+        micros = day * 86_400_000_000 + round(value * 60e6)
+        out.append(datetime.fromtimestamp(micros // 1_000_000, tz))
+    return out
+
+
+def _compute_range(latitude, longitude, start, end, method_key, timezone, location):
+    """Shared core of the range functions: per-prayer columns of minutes after 00:00 UTC."""
+    if end < start:
+        raise ValueError("end must not be before start.")
+
+    plan = get_plan(method_key)
+    if location is None:
+        location = cached_location(latitude, longitude, timezone)
+
+    lat = location.latitude
+    lng = location.longitude
+    dates = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+
+    # -----------------------
+    # Solar state: once per day
+    # -----------------------
+    zuhr = vsolar._solar_noon_utc(lat, lng, dates)
+    state = vsolar._noon_state(lat, lng, dates)
+
+    def at_altitude(altitude_deg, direction):
+        return vsolar._event_time_from_state(lat, lng, state, altitude_deg, direction)
+
+    sunrise = at_altitude(_HORIZON_ALTITUDE, "before")
+    maghrib = at_altitude(_HORIZON_ALTITUDE, "after")
+    fajr = at_altitude(-plan.fajr_angle, "before")
+
+    asr_standard = at_altitude(vsolar._asr_altitude_deg(lat, state.declination_rad, 1), "after")
+    asr_hanafi = at_altitude(vsolar._asr_altitude_deg(lat, state.declination_rad, 2), "after")
+    asr_primary = asr_hanafi if plan.asr_factor == 2 else asr_standard
+
+    if plan.isha_strategy == "minutes":
+        isha = maghrib + _minutes(plan.isha_delay)
+    else:
+        isha = at_altitude(-plan.isha_angle, "after")
+
+    # -----------------------
+    # High-latitude fallback (middle of the night)
+    # -----------------------
+    night = (sunrise + 1440.0) - maghrib
+    fajr_fallback = np.isnan(fajr) & ~np.isnan(night)
+    isha_fallback = np.isnan(isha) & ~np.isnan(night)
+    fajr = np.where(fajr_fallback, sunrise - night / 2, fajr)
+    isha = np.where(isha_fallback, maghrib + night / 2, isha)
+
+    # -----------------------
+    # Offsets
+    # -----------------------
+    columns = {
+        "fajr": fajr + _minutes(plan.fajr_offset),
+        "sunrise": sunrise + _minutes(plan.sunrise_offset),
+        "zuhr": zuhr + _minutes(plan.zuhr_offset),
+        "asr": asr_primary + _minutes(plan.asr_offset),
+        "asr_standard": asr_standard + _minutes(plan.asr_offset),
+        "asr_hanafi": asr_hanafi + _minutes(plan.asr_offset),
+        "maghrib": maghrib + _minutes(plan.maghrib_offset),
+        "isha": isha + _minutes(plan.isha_offset),
+    }
+    return plan, location, dates, columns, fajr_fallback, isha_fallback
+
+
+def get_prayer_times_range(
+    *,
+    latitude: float | None = None,
+    longitude: float | None = None,
+    start: Date,
+    end: Date,
+    method_key: str = "MWL",
+    timezone: str = "Europe/London",
+    location: Location | None = None,
+) -> dict:
+    """
+    Compute prayer times for every date in [start, end] (inclusive).
+
+    Days where the sun never rises or sets (polar day/night) have null times;
+    Fajr/Isha use the middle-of-the-night fallback exactly like get_prayer_times.
+    """
+    plan, location, dates, columns, fajr_fallback, isha_fallback = _compute_range(
+        latitude, longitude, start, end, method_key, timezone, location
+    )
+    days = dates.astype("int64")
+
+    any_fallback = bool(fajr_fallback.any() or isha_fallback.any())
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "timezone": location.timezone,
+        "method": plan.name,
+        "location": {
+            "latitude": location.latitude,
+            "longitude": location.longitude,
+        },
+        "dates": [str(d) for d in dates],
+        "high_latitude_fallback": {
+            "fajr": fajr_fallback.tolist(),
+            "isha": isha_fallback.tolist(),
+            "method": "middle_of_the_night" if any_fallback else None,
+        },
+        "times": {key: _format_column(days, columns[key], location.tz) for key in PRAYER_KEYS},
+    }
+
+
+def get_prayer_datetimes_range(
+    *,
+    latitude: float | None = None,
+    longitude: float | None = None,
+    start: Date,
+    end: Date,
+    method_key: str = "MWL",
+    timezone: str = "Europe/London",
+    location: Location | None = None,
+) -> list[dict]:
+    """
+    One {"date": date, "times": {prayer: aware local datetime | None}} per day
+    in [start, end], for planners that work across several days.
+    """
+    _, location, dates, columns, _, _ = _compute_range(
+        latitude, longitude, start, end, method_key, timezone, location
+    )
+    days = dates.astype("int64")
+    datetimes = {key: _datetime_column(days, columns[key], location.tz) for key in PRAYER_KEYS}
+    return [
+        {"date": start + timedelta(days=i), "times": {key: datetimes[key][i] for key in PRAYER_KEYS}}
+        for i in range(len(dates))
+    ]
@@ -9,10 +9,13 @@ Responsibilities:
 - Handle high-latitude edge cases safely
 """
 
-from datetime import date as Date
-from zoneinfo import ZoneInfo
+from __future__ import annotations
 
-from core.methods import METHODS
+from datetime import date as Date, timedelta
+
+from core.location import Location, cached_location
+from core.method_plans import get_plan
+from core.prayer_day import PRAYER_KEYS, PrayerDay, epoch_seconds
 from core import solar_calculations as solar
 
 
@@ -25,156 +28,200 @@ def middle_of_night(maghrib, sunrise):
     return maghrib + (night_duration / 2)
 
 
-def get_prayer_times(
+def resolve_fields(fields) -> tuple[str, ...]:
+    """
+    Validate a fields selector (iterable of prayer names, or a comma-separated
+    string) and return it in PRAYER_KEYS order. None means every field.
+    """
+    if fields is None:
+        return PRAYER_KEYS
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    wanted = {f.strip().lower() for f in fields if f.strip()}
+    unknown = wanted.difference(PRAYER_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}. Supported: {', '.join(PRAYER_KEYS)}")
+    if not wanted:
+        raise ValueError("fields must name at least one prayer.")
+    return tuple(key for key in PRAYER_KEYS if key in wanted)
+
+
+def get_prayer_day(
     *,
-    latitude: float,
-    longitude: float,
+    latitude: float | None = None,
+    longitude: float | None = None,
     on_date: Date,
     method_key: str = "MWL",
     timezone: str = "Europe/London",
-) -> dict:
+    location: Location | None = None,
+    fields=None,
+) -> PrayerDay:
     """
-    Compute prayer times for a given location and date.
-
-    Inputs:
-      - latitude, longitude: GPS coordinates
-      - on_date: datetime.date
-      - method_key: key from METHODS (MWL, ISNA, UMM_AL_QURA, KARACHI)
-      - timezone: IANA timezone string
+    Same inputs as get_prayer_times, but returns a PrayerDay (integer UTC
+    seconds, formatted on demand). For internal callers (the scheduler,
+    reminders) that want instants rather than "HH:MM" strings.
 
-    Returns:
-      dict containing calculated prayer times
+    fields: only compute these prayers (see resolve_fields). Anchors they
+    depend on (e.g. sunrise and sunset for the high-latitude fallback) are
+    computed only when actually needed.
     """
 
-    if method_key not in METHODS:
-        raise ValueError(f"Unknown method '{method_key}'")
-
-    method = METHODS[method_key]
-    tz = ZoneInfo(timezone)
+    wanted = resolve_fields(fields)
+    plan = get_plan(method_key)
+    if location is None:
+        location = cached_location(latitude, longitude, timezone)
 
     # -----------------------
-    # Solar anchor points
+    # Solar anchor points (computed on first use)
     # -----------------------
-    sunrise = solar.sunrise(latitude, longitude, on_date, tz)
-    sunset = solar.sunset(latitude, longitude, on_date, tz)
-    solar_noon = solar.solar_noon(latitude, longitude, on_date, tz)
+    anchors = {}
 
-    maghrib = sunset
+    def anchor(name, compute):
+        value = anchors.get(name)
+        if value is None:
+            value = anchors[name] = compute()
+        return value
+
+    def sunrise():
+        return anchor("sunrise", lambda: solar.sunrise_at(location, on_date))
+
+    def maghrib():
+        return anchor("maghrib", lambda: solar.sunset_at(location, on_date))
+
+    def asr(factor):
+        return anchor(("asr", factor), lambda: solar.asr_time_at(location, on_date, asr_factor=factor))
+
+    def night_duration():
+        # Night duration: (Sunrise tomorrow) - Maghrib
+        # We approximate using sunrise today + 24 hours
+        return anchor("night", lambda: (sunrise() + timedelta(days=1)) - maghrib())
+
+    times = {}
+    fajr_fallback = isha_fallback = None
 
     # -----------------------
     # Fajr (with fallback)
     # -----------------------
-    try:
-        fajr = solar.time_when_sun_reaches_angle(
-            latitude=latitude,
-            longitude=longitude,
-            on_date=on_date,
-            tz=tz,
-            angle_degrees=-method["fajr_angle"],
+    if "fajr" in wanted:
+        event = solar.solve_sin_altitude_at(
+            location,
+            on_date,
+            sin_altitude=plan.sin_fajr_altitude,
             direction="before",
         )
-        fajr_fallback = False
-    except ValueError:
-        # Fallback: Half of night
-        # Night duration: (Sunrise tomorrow) - Maghrib
-        # We approximate using sunrise today + 24 hours
-        from datetime import timedelta
-        night_duration = (sunrise + timedelta(days=1)) - maghrib
-        fajr = sunrise - (night_duration / 2)
-        fajr_fallback = True
+        fajr_fallback = not event.reachable
+        if fajr_fallback:
+            # Fallback: Half of night
+            fajr = sunrise() - (night_duration() / 2)
+        else:
+            fajr = event.time
+        times["fajr"] = fajr + plan.fajr_offset
+
+    if "sunrise" in wanted:
+        times["sunrise"] = sunrise() + plan.sunrise_offset
+    if "zuhr" in wanted:
+        times["zuhr"] = solar.solar_noon_at(location, on_date) + plan.zuhr_offset
 
     # -----------------------
-    # Asr (Standard + Hanafi)
+    # Asr (Standard + Hanafi); primary based on method
     # -----------------------
-    asr_standard = solar.asr_time(
-        latitude=latitude,
-        longitude=longitude,
-        on_date=on_date,
-        tz=tz,
-        asr_factor=1,
-    )
-    asr_hanafi = solar.asr_time(
-        latitude=latitude,
-        longitude=longitude,
-        on_date=on_date,
-        tz=tz,
-        asr_factor=2,
-    )
-    
-    # Primary Asr based on method
-    asr_primary = asr_hanafi if method.get("asr_factor", 1) == 2 else asr_standard
+    if "asr" in wanted:
+        times["asr"] = asr(2 if plan.asr_factor == 2 else 1) + plan.asr_offset
+    if "asr_standard" in wanted:
+        times["asr_standard"] = asr(1) + plan.asr_offset # Apply asr offset to both
+    if "asr_hanafi" in wanted:
+        times["asr_hanafi"] = asr(2) + plan.asr_offset
+
+    if "maghrib" in wanted:
+        times["maghrib"] = maghrib() + plan.maghrib_offset
 
     # -----------------------
     # Isha (with fallback)
     # -----------------------
-    try:
-        if "isha_minutes" in method:
-            isha = maghrib + solar.minutes(method["isha_minutes"])
+    if "isha" in wanted:
+        if plan.isha_strategy == "minutes":
+            isha = maghrib() + plan.isha_delay
+            isha_fallback = False
         else:
-            isha = solar.time_when_sun_reaches_angle(
-                latitude=latitude,
-                longitude=longitude,
-                on_date=on_date,
-                tz=tz,
-                angle_degrees=-method["isha_angle"],
+            event = solar.solve_sin_altitude_at(
+                location,
+                on_date,
+                sin_altitude=plan.sin_isha_altitude,
                 direction="after",
             )
-        isha_fallback = False
-    except ValueError:
-        # Fallback: Half of night
-        from datetime import timedelta
-        night_duration = (sunrise + timedelta(days=1)) - maghrib
-        isha = maghrib + (night_duration / 2)
-        isha_fallback = True
+            isha_fallback = not event.reachable
+            if isha_fallback:
+                # Fallback: Half of night
+                isha = maghrib() + (night_duration() / 2)
+            else:
+                isha = event.time
+        times["isha"] = isha + plan.isha_offset
+
+    return PrayerDay(
+        on_date,
+        location,
+        plan.name,
+        {key: epoch_seconds(dt) for key, dt in times.items()},
+        fajr_fallback=fajr_fallback,
+        isha_fallback=isha_fallback,
+    )
 
-    # -----------------------
-    # Apply Offsets
-    # -----------------------
-    offsets = method.get("offsets", {})
-    
-    def apply_offset(dt, key):
-        if key in offsets:
-            from datetime import timedelta
-            return dt + timedelta(minutes=offsets[key])
-        return dt
-
-    fajr = apply_offset(fajr, "fajr")
-    sunrise = apply_offset(sunrise, "sunrise")
-    solar_noon = apply_offset(solar_noon, "zuhr")
-    asr_primary = apply_offset(asr_primary, "asr")
-    asr_standard = apply_offset(asr_standard, "asr") # Apply asr offset to both
-    asr_hanafi = apply_offset(asr_hanafi, "asr")
-    maghrib = apply_offset(maghrib, "maghrib")
-    isha = apply_offset(isha, "isha")
+
+def get_prayer_datetimes(
+    *,
+    latitude: float | None = None,
+    longitude: float | None = None,
+    on_date: Date,
+    method_key: str = "MWL",
+    timezone: str = "Europe/London",
+    location: Location | None = None,
+    fields=None,
+) -> dict:
+    """
+    Same inputs and output as get_prayer_times, but "times" holds timezone-aware
+    local datetimes (whole seconds) instead of "HH:MM" strings.
+    """
+    return get_prayer_day(
+        latitude=latitude,
+        longitude=longitude,
+        on_date=on_date,
+        method_key=method_key,
+        timezone=timezone,
+        location=location,
+        fields=fields,
+    ).to_dict("datetime")
 
 
-    # -----------------------
-    # Output formatting
-    # -----------------------
-    def fmt(dt):
-        return dt.strftime("%H:%M")
-
-    return {
-        "date": on_date.isoformat(),
-        "timezone": timezone,
-        "method": method["name"],
-        "location": {
-            "latitude": latitude,
-            "longitude": longitude,
-        },
-        "high_latitude_fallback": {
-            "fajr": fajr_fallback,
-            "isha": isha_fallback,
-            "method": "middle_of_the_night" if (fajr_fallback or isha_fallback) else None,
-        },
-        "times": {
-            "fajr": fmt(fajr),
-            "sunrise": fmt(sunrise),
-            "zuhr": fmt(solar_noon),
-            "asr": fmt(asr_primary),
-            "asr_standard": fmt(asr_standard),
-            "asr_hanafi": fmt(asr_hanafi),
-            "maghrib": fmt(maghrib),
-            "isha": fmt(isha),
-        },
-    }
+def get_prayer_times(
+    *,
+    latitude: float | None = None,
+    longitude: float | None = None,
+    on_date: Date,
+    method_key: str = "MWL",
+    timezone: str = "Europe/London",
+    location: Location | None = None,
+    fields=None,
+) -> dict:
+    """
+    Compute prayer times for a given location and date.
+
+    Inputs:
+      - latitude, longitude: GPS coordinates
+      - on_date: datetime.date
+      - method_key: key from METHODS (MWL, ISNA, UMM_AL_QURA, KARACHI) or a registered custom method
+      - timezone: IANA timezone string
+      - location: precomputed Location; replaces latitude/longitude/timezone
+      - fields: optional subset of prayers to compute (e.g. ["maghrib"]); default all
+
+    Returns:
+      dict containing calculated prayer times
+    """
+    return get_prayer_day(
+        latitude=latitude,
+        longitude=longitude,
+        on_date=on_date,
+        method_key=method_key,
+        timezone=timezone,
+        location=location,
+        fields=fields,
+    ).to_dict()
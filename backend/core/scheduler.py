@@ -1,78 +1,324 @@
-from datetime import datetime, time, timedelta
+# core/scheduler.py
+"""
+Barakah-block day planner.
+
+The day is divided into blocks by the prayer times (aware datetimes straight
+from a PrayerDay, no string round trip). Tasks are then
+packed into the blocks by duration:
+  - higher priority first, longer first within a priority (first-fit decreasing)
+  - each task type has preferred blocks ("deep" work goes to the morning first)
+  - a splittable task that fits nowhere whole is spread over the free gaps
+    (pieces of at least MIN_SPLIT_MINUTES); anything left over is returned
+    as unscheduled instead of silently overbooking a block
+
+MultiDayPlan runs the same packing over a range of days, carrying what did
+not fit into the next day, and re-plans only the days a change reaches.
+
+Free time is kept in a FreeIntervals structure: gaps sorted by length and
+looked up with bisect (best fit), so packing stays fast with hundreds of tasks.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+from core.prayer_day import PrayerDay
+
+MIN_SPLIT_MINUTES = 15
+
+# (type, period, start prayer, end prayer, suggested activity)
+BLOCKS = (
+    ("spiritual", "Early Morning (Barakah Hour)", "fajr", "sunrise",
+     "Spiritual reading, Quran, or Planning the day."),
+    ("work_deep", "Morning Deep Work", "sunrise", "zuhr",
+     "Deep Work. Tackle your hardest task here."),
+    ("work_shallow", "Mid-Day Block", "zuhr", "asr",
+     "Meetings, Emails, Admin tasks."),
+    ("personal", "Late Afternoon", "asr", "maghrib",
+     "Wrap up work. Exercise. Family time."),
+    ("social", "Evening Connection", "maghrib", "isha",
+     "Dinner, Family, Community."),
+)
+
+# Blocks each task type may use, most preferred first
+PREFERRED_BLOCKS = {
+    "deep": ("work_deep", "work_shallow", "personal"),
+    "shallow": ("work_shallow", "work_deep", "personal"),
+}
+WORK_BLOCKS = ("work_deep", "work_shallow", "personal")
+
+
+class FreeIntervals:
+    """
+    Disjoint free [start, end) intervals of one block, indexed by length.
+
+    Gaps are kept in a list of (length, start) sorted with insort, so take()
+    finds the shortest gap that fits (earliest first among equals) with one
+    bisect, and largest() is the last entry; no scan over the gaps.
+    """
+
+    __slots__ = ("_by_length", "_ends", "free")
+
+    def __init__(self, start: datetime, end: datetime):
+        self._by_length: list[tuple[timedelta, datetime]] = []
+        self._ends: dict[datetime, datetime] = {}
+        self.free = timedelta(0)
+        if start is not None and end is not None and end > start:
+            self._add(start, end)
+
+    def _add(self, start, end):
+        insort(self._by_length, (end - start, start))
+        self._ends[start] = end
+        self.free += end - start
+
+    def intervals(self) -> list[tuple[datetime, datetime]]:
+        return sorted(self._ends.items())
+
+    def largest(self) -> timedelta:
+        return self._by_length[-1][0] if self._by_length else timedelta(0)
+
+    def take(self, duration: timedelta) -> tuple[datetime, datetime] | None:
+        """Book `duration` at the start of the shortest gap long enough (None if none is)."""
+        index = bisect_left(self._by_length, (duration,))
+        if index == len(self._by_length):
+            return None
+        length, start = self._by_length.pop(index)
+        end = self._ends.pop(start)
+        self.free -= length
+        if length > duration:
+            self._add(start + duration, end)
+        return start, start + duration
+
+
+@dataclass
+class Block:
+    key: str
+    period: str
+    start: datetime
+    end: datetime
+    suggested_activity: str
+    free: FreeIntervals = field(init=False)
+    placed: list = field(default_factory=list)
+
+    def __post_init__(self):
+        self.free = FreeIntervals(self.start, self.end)
+
+
+def _minutes(delta: timedelta) -> int:
+    return int(delta.total_seconds() // 60)
+
+
+def build_blocks(times: dict) -> list[Block]:
+    """Barakah blocks for one day. times: prayer name -> aware datetime."""
+    return [
+        Block(key, period, times[start], times[end], activity)
+        for key, period, start, end, activity in BLOCKS
+    ]
+
+
+def _task_order(indexed_task):
+    index, task = indexed_task
+    return (-task.get("priority", 0), -task["duration_minutes"], index)
+
+
+def pack_tasks(blocks: list[Block], tasks: list[dict]) -> list[dict]:
+    """
+    Place tasks into the blocks' free time. Returns the unscheduled remainder
+    (task dicts with "remaining_minutes").
+    """
+    by_key = {block.key: block for block in blocks}
+    min_split = timedelta(minutes=MIN_SPLIT_MINUTES)
+    unscheduled = []
+
+    for index, task in sorted(enumerate(tasks), key=_task_order):
+        allowed = [by_key[k] for k in PREFERRED_BLOCKS.get(task.get("type"), PREFERRED_BLOCKS["shallow"]) if k in by_key]
+        remaining = timedelta(minutes=task["duration_minutes"])
+        if remaining <= timedelta(0):
+            continue
+
+        # Whole, in the first preferred block that has room
+        for block in allowed:
+            slot = block.free.take(remaining)
+            if slot is not None:
+                block.placed.append((slot, task, None))
+                remaining = timedelta(0)
+                break
+
+        # Otherwise split it across the gaps, in preference order
+        if remaining and task.get("splittable", True):
+            parts = []
+            for block in allowed:
+                while remaining and block.free.free >= min(min_split, remaining):
+                    # Whole minutes, so the parts add up exactly to the task
+                    piece = min(remaining, timedelta(minutes=_minutes(block.free.largest())))
+                    if piece < min(min_split, remaining):
+                        break
+                    slot = block.free.take(piece)
+                    parts.append((block, slot))
+                    remaining -= piece
+                if not remaining:
+                    break
+            for number, (block, slot) in enumerate(parts, start=1):
+                block.placed.append((slot, task, (number, len(parts))))
+
+        if remaining:
+            unscheduled.append({**task, "remaining_minutes": _minutes(remaining)})
+
+    return unscheduled
+
+
+def _fmt(dt: datetime | None) -> str | None:
+    # None: the prayer does not occur that day (polar day/night)
+    return dt.strftime("%H:%M") if dt is not None else None
+
+
+def render_blocks(blocks: list[Block]) -> list[dict]:
+    """JSON-ready schedule: one dict per block, tasks in time order."""
+    schedule = []
+    for block in blocks:
+        entry = {
+            "period": block.period,
+            "start": _fmt(block.start),
+            "end": _fmt(block.end),
+            "suggested_activity": block.suggested_activity,
+            "type": block.key,
+        }
+        if block.key in WORK_BLOCKS:
+            entry["tasks"] = []
+            for (start, end), task, part in sorted(block.placed, key=lambda p: p[0][0]):
+                item = {**task, "start": _fmt(start), "end": _fmt(end), "scheduled_minutes": _minutes(end - start)}
+                if part is not None:
+                    item["part"], item["parts"] = part
+                entry["tasks"].append(item)
+            entry["free_minutes"] = _minutes(block.free.free)
+        schedule.append(entry)
+    return schedule
 
-def parse_time(t_str):
-    """Parses HH:MM string to time object."""
-    return datetime.strptime(t_str, "%H:%M").time()
 
 def calculate_schedule(tasks, prayer_times):
     """
     Generates a schedule by placing tasks into 'Barakah Blocks' defined by prayer times.
-    
+
     Args:
-        tasks: List of dicts {'name': str, 'duration_minutes': int, 'type': 'deep'|'shallow'}
-        prayer_times: Dict output from get_prayer_times()
-    
+        tasks: List of dicts {'name': str, 'duration_minutes': int, 'type': 'deep'|'shallow',
+               optional 'priority': int (higher first), 'splittable': bool (default True)}
+        prayer_times: PrayerDay from get_prayer_day(), or the get_prayer_datetimes() dict
+
     Returns:
-        List of dicts representing the schedule blocks.
+        (schedule blocks, unscheduled tasks)
     """
-    
-    # Extract times
-    times = prayer_times['times']
-    fajr = parse_time(times['fajr'])
-    sunrise = parse_time(times['sunrise'])
-    zuhr = parse_time(times['zuhr'])
-    asr = parse_time(times['asr'])
-    maghrib = parse_time(times['maghrib'])
-    isha = parse_time(times['isha'])
-    
-    schedule = []
-    
-    # 1. Fajr - Sunrise (The "Barakah" Hour)
-    schedule.append({
-        "period": "Early Morning (Barakah Hour)",
-        "start": times['fajr'],
-        "end": times['sunrise'],
-        "suggested_activity": "Spiritual reading, Quran, or Planning the day.",
-        "type": "spiritual"
-    })
-    
-    # 2. Sunrise - Zuhr (Deep Work)
-    # This is usually the longest block. Good for hard tasks.
-    schedule.append({
-        "period": "Morning Deep Work",
-        "start": times['sunrise'],
-        "end": times['zuhr'],
-        "suggested_activity": "Deep Work. Tackle your hardest task here.",
-        "type": "work_deep",
-        "tasks": [t for t in tasks if t.get('type') == 'deep']
-    })
-    
-    # 3. Zuhr - Asr (Mid-Day Push)
-    schedule.append({
-        "period": "Mid-Day Block",
-        "start": times['zuhr'],
-        "end": times['asr'],
-        "suggested_activity": "Meetings, Emails, Admin tasks.",
-        "type": "work_shallow",
-        "tasks": [t for t in tasks if t.get('type') != 'deep']
-    })
-    
-    # 4. Asr - Maghrib (Wrap Up)
-    schedule.append({
-        "period": "Late Afternoon",
-        "start": times['asr'],
-        "end": times['maghrib'],
-        "suggested_activity": "Wrap up work. Exercise. Family time.",
-        "type": "personal"
-    })
-    
-    # 5. Maghrib - Isha (Community/Family)
-    schedule.append({
-        "period": "Evening Connection",
-        "start": times['maghrib'],
-        "end": times['isha'],
-        "suggested_activity": "Dinner, Family, Community.",
-        "type": "social"
-    })
-    
-    return schedule
+    if isinstance(prayer_times, PrayerDay):
+        times = prayer_times.datetimes()
+    else:
+        times = prayer_times["times"]
+    blocks = build_blocks(times)
+    unscheduled = pack_tasks(blocks, tasks)
+    return render_blocks(blocks), unscheduled
+
+
+# -----------------------
+# Multi-day planning
+# -----------------------
+def task_id(task: dict) -> str:
+    """Tasks are identified by "id" when given, else by name."""
+    return task.get("id") or task["name"]
+
+
+def _carry(unscheduled: list[dict]) -> list[dict]:
+    """Unscheduled remainders as tomorrow's tasks."""
+    carried = []
+    for task in unscheduled:
+        task = dict(task)
+        task["duration_minutes"] = task.pop("remaining_minutes")
+        task["carried_over"] = True
+        carried.append(task)
+    return carried
+
+
+@dataclass
+class DayPlan:
+    date: date
+    times: dict
+    blocks: list[Block]
+    carry_out: list[dict]
+
+
+class MultiDayPlan:
+    """
+    Plans a task backlog over consecutive days.
+
+    Day 1 gets the whole backlog; whatever it cannot place (including the
+    rest of a partly placed task) is carried into day 2, and so on. What is
+    still left after the last day is `unscheduled`.
+
+    add_task() and complete_task() re-plan incrementally: packing restarts at
+    the first day the change can touch and stops as soon as a day carries
+    out exactly what it did before, since every later day then sees the same
+    input. Prayer times are computed once, up front.
+
+    days: [{"date": date, "times": {prayer: aware datetime | None}}], e.g.
+    prayer_calendar.get_prayer_datetimes_range().
+    """
+
+    def __init__(self, days: list[dict], tasks: list[dict]):
+        self.tasks = list(tasks)
+        self.days: list[DayPlan] = [DayPlan(d["date"], d["times"], [], []) for d in days]
+        self._replan(0, self.tasks, stop_early=False)
+
+    @property
+    def unscheduled(self) -> list[dict]:
+        carry = self.days[-1].carry_out if self.days else self.tasks
+        return [{**task, "remaining_minutes": task["duration_minutes"]} for task in carry]
+
+    def _replan(self, first: int, carry_in: list[dict], stop_early: bool = True) -> list[date]:
+        """Re-pack days from index `first`; returns the dates that were re-planned."""
+        changed = []
+        for day in self.days[first:]:
+            previous = day.carry_out
+            day.blocks = build_blocks(day.times)
+            day.carry_out = _carry(pack_tasks(day.blocks, carry_in))
+            changed.append(day.date)
+            if stop_early and day.carry_out == previous:
+                break
+            carry_in = day.carry_out
+        return changed
+
+    def add_task(self, task: dict) -> list[date]:
+        """Add a task to the backlog; returns the dates whose plan was recomputed."""
+        self.tasks.append(task)
+        return self._replan(0, self.tasks)
+
+    def complete_task(self, tid: str) -> list[date]:
+        """
+        Drop a task (done, or cancelled); returns the dates whose plan was
+        recomputed. Days before its first placed piece are unaffected: an
+        unplaced task takes no time, so only their carry-over changes.
+        """
+        self.tasks = [t for t in self.tasks if task_id(t) != tid]
+        first = None
+        for index, day in enumerate(self.days):
+            if any(task_id(task) == tid for block in day.blocks for _, task, _ in block.placed):
+                first = index
+                break
+        if first is None:
+            first = len(self.days)
+        for day in self.days[:first]:
+            day.carry_out = [t for t in day.carry_out if task_id(t) != tid]
+        carry_in = self.days[first - 1].carry_out if first else self.tasks
+        return self._replan(first, carry_in)
+
+    def render(self) -> dict:
+        """JSON-ready plan: one schedule per day plus the leftover tasks."""
+        return {
+            "days": [
+                {
+                    "date": day.date.isoformat(),
+                    "prayer_times": {name: _fmt(dt) for name, dt in day.times.items()},
+                    "schedule": render_blocks(day.blocks),
+                }
+                for day in self.days
+            ],
+            "unscheduled": self.unscheduled,
+        }
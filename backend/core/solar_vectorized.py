@@ -0,0 +1,208 @@
+# core/solar_vectorized.py
+# Array-based counterpart of solar_calculations.py (NumPy).
+# Same NOAA-style formulas, evaluated for whole calendars / city grids in one pass.
+#
+# Conventions:
+#   - dates are anything np.asarray(..., dtype="datetime64[D]") accepts
+#     (datetime.date objects, ISO strings, datetime64 arrays).
+#   - latitude / longitude / altitude arguments broadcast against the dates,
+#     e.g. dates of shape (365,) with latitudes of shape (N, 1) -> (N, 365).
+#   - event times are returned as float minutes after 00:00 UTC of each date.
+#     Unreachable altitudes (polar day/night) come back as NaN instead of raising.
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Literal
+
+import numpy as np
+
+
+_UNIX_EPOCH_JD = 2440587.5  # Julian Day of 1970-01-01T00:00 UTC
+_MINUTES_PER_DAY = 1440.0
+
+
+# -----------------------------
+# Small helpers
+# -----------------------------
+
+def as_dates(dates) -> np.ndarray:
+    """Coerce dates to a datetime64[D] array."""
+    return np.asarray(dates, dtype="datetime64[D]")
+
+
+def minutes_to_datetime64(dates, minutes_utc) -> np.ndarray:
+    """
+    Convert "minutes after 00:00 UTC of date" into datetime64[us] instants.
+    NaN minutes become NaT.
+    """
+    days = as_dates(dates).astype("datetime64[us]")
+    minutes_utc = np.asarray(minutes_utc, dtype=float)
+    valid = np.isfinite(minutes_utc)
+    micros = np.where(valid, np.round(minutes_utc * 60e6), 0).astype("int64")
+    out = days + micros.astype("timedelta64[us]")
+    return np.where(valid, out, np.datetime64("NaT"))
+
+
+# -----------------------------
+# Core solar model (NOAA-style)
+# -----------------------------
+
+@dataclass(frozen=True)
+class _SolarStateArray:
+    """Solar quantities for an array of moments (in UTC)."""
+    declination_rad: np.ndarray
+    eq_time_minutes: np.ndarray  # equation of time in minutes
+
+
+def _julian_day(dates, minutes_utc=0.0) -> np.ndarray:
+    """
+    Julian Day for "date + minutes_utc" instants.
+    Equivalent to solar_calculations._julian_day for Gregorian dates.
+    """
+    days = as_dates(dates).astype("int64")  # days since 1970-01-01
+    return days + _UNIX_EPOCH_JD + np.asarray(minutes_utc, dtype=float) / _MINUTES_PER_DAY
+
+
+def _solar_state(dates, minutes_utc=0.0) -> _SolarStateArray:
+    """
+    Compute solar declination and equation of time for every instant.
+    Term-for-term identical to solar_calculations._solar_state.
+    """
+    jd = _julian_day(dates, minutes_utc)
+    T = (jd - 2451545.0) / 36525.0
+
+    L0 = np.mod(280.46646 + T * (36000.76983 + 0.0003032 * T), 360.0)
+    M = 357.52911 + T * (35999.05029 - 0.0001537 * T)
+    e = 0.016708634 - T * (0.000042037 + 0.0000001267 * T)
+
+    Mrad = np.deg2rad(M)
+    C = (
+        np.sin(Mrad) * (1.914602 - T * (0.004817 + 0.000014 * T))
+        + np.sin(2 * Mrad) * (0.019993 - 0.000101 * T)
+        + np.sin(3 * Mrad) * 0.000289
+    )
+
+    true_long = L0 + C
+    omega = 125.04 - 1934.136 * T
+    lambda_sun = true_long - 0.00569 - 0.00478 * np.sin(np.deg2rad(omega))
+
+    eps0 = 23.0 + (26.0 + ((21.448 - T * (46.815 + T * (0.00059 - T * 0.001813))) / 60.0)) / 60.0
+    eps = eps0 + 0.00256 * np.cos(np.deg2rad(omega))
+
+    decl = np.arcsin(np.sin(np.deg2rad(eps)) * np.sin(np.deg2rad(lambda_sun)))
+
+    y = np.tan(np.deg2rad(eps) / 2.0)
+    y *= y
+
+    L0rad = np.deg2rad(L0)
+
+    eq_time = 4.0 * np.rad2deg(
+        y * np.sin(2.0 * L0rad)
+        - 2.0 * e * np.sin(Mrad)
+        + 4.0 * e * y * np.sin(Mrad) * np.cos(2.0 * L0rad)
+        - 0.5 * y * y * np.sin(4.0 * L0rad)
+        - 1.25 * e * e * np.sin(2.0 * Mrad)
+    )
+
+    return _SolarStateArray(declination_rad=decl, eq_time_minutes=eq_time)
+
+
+def _solar_noon_utc(latitude, longitude, dates) -> np.ndarray:
+    """
+    Approximate solar noon (minutes after 00:00 UTC) for every date/longitude.
+    NOAA approach, evaluated at 12:00 UTC like the scalar version:
+      solarNoonUTC (minutes) ~= 720 - 4*longitude - eqTime
+    """
+    state = _solar_state(dates, 720.0)
+    return 720.0 - 4.0 * np.asarray(longitude, dtype=float) - state.eq_time_minutes
+
+
+def _noon_state(latitude, longitude, dates) -> _SolarStateArray:
+    """Solar state at each location's solar noon (the per-day approximation)."""
+    noon_minutes = _solar_noon_utc(latitude, longitude, dates)
+    return _solar_state(dates, noon_minutes)
+
+
+def _event_time_from_state(
+    latitude,
+    longitude,
+    state: _SolarStateArray,
+    altitude_deg,
+    direction: Literal["before", "after"],
+) -> np.ndarray:
+    """Hour-angle solve for precomputed noon states. NaN where unreachable."""
+    lat = np.deg2rad(np.asarray(latitude, dtype=float))
+    alt = np.deg2rad(np.asarray(altitude_deg, dtype=float))
+    dec = state.declination_rad
+
+    denom = np.cos(lat) * np.cos(dec)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cosH_raw = (np.sin(alt) - np.sin(lat) * np.sin(dec)) / denom
+    # Same reachability rules as the scalar solver, but masked instead of raised.
+    reachable = (np.abs(denom) >= 1e-12) & (cosH_raw >= -1.0) & (cosH_raw <= 1.0)
+
+    H_deg = np.rad2deg(np.arccos(np.clip(cosH_raw, -1.0, 1.0)))
+    delta_minutes = 4.0 * H_deg
+
+    solar_noon_minutes = 720.0 - 4.0 * np.asarray(longitude, dtype=float) - state.eq_time_minutes
+    if direction == "before":
+        event_minutes = solar_noon_minutes - delta_minutes
+    else:
+        event_minutes = solar_noon_minutes + delta_minutes
+
+    return np.where(reachable, event_minutes, np.nan)
+
+
+def _event_time_utc(
+    latitude,
+    longitude,
+    dates,
+    altitude_deg,
+    direction: Literal["before", "after"],
+) -> np.ndarray:
+    """
+    Minutes after 00:00 UTC when the sun reaches altitude_deg on each date.
+
+    direction:
+      - "before": morning event (before solar noon)
+      - "after" : evening event (after solar noon)
+
+    Where the sun never reaches the altitude (polar day/night) the entry is NaN.
+    """
+    state = _noon_state(latitude, longitude, dates)
+    return _event_time_from_state(latitude, longitude, state, altitude_deg, direction)
+
+
+def _asr_altitude_deg(latitude, declination_rad, asr_factor) -> np.ndarray:
+    """
+    Solar altitude for Asr (see solar_calculations.asr_time):
+      tan(alt) = 1 / (n + tan(|lat - decl|))
+    """
+    phi = np.abs(np.deg2rad(np.asarray(latitude, dtype=float)) - declination_rad)
+    return np.rad2deg(np.arctan(1.0 / (np.asarray(asr_factor, dtype=float) + np.tan(phi))))
+
+
+# -----------------------------
+# Public API functions
+# -----------------------------
+
+def sunrise_utc(latitude, longitude, dates) -> np.ndarray:
+    """Sunrise (minutes after 00:00 UTC), altitude -0.833 degrees."""
+    return _event_time_utc(latitude, longitude, dates, -0.833, "before")
+
+
+def sunset_utc(latitude, longitude, dates) -> np.ndarray:
+    """Sunset (minutes after 00:00 UTC), altitude -0.833 degrees."""
+    return _event_time_utc(latitude, longitude, dates, -0.833, "after")
+
+
+def asr_time_utc(latitude, longitude, dates, asr_factor=1) -> np.ndarray:
+    """
+    Asr (minutes after 00:00 UTC) for asr_factor 1 (Shafi'i/Maliki/Hanbali) or 2 (Hanafi).
+    """
+    if not np.all(np.isin(asr_factor, (1, 2))):
+        raise ValueError("asr_factor must be 1 or 2.")
+    state = _noon_state(latitude, longitude, dates)
+    alt_deg = _asr_altitude_deg(latitude, state.declination_rad, asr_factor)
+    return _event_time_from_state(latitude, longitude, state, alt_deg, "after")
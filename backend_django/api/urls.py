@@ -1,10 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import RafeeqViewSet
+from .views import RafeeqViewSet, WhatsAppWebhookView
 
 router = DefaultRouter()
 router.register(r'rafeeq', RafeeqViewSet, basename='rafeeq')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('webhooks/whatsapp/', WhatsAppWebhookView.as_view(), name='whatsapp-webhook'),
 ]
@@ -1,10 +1,31 @@
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from users.models import User
+from rafeeq.aggregates import user_stats
+from rafeeq.export import export_lines, parse_bound
+from rafeeq.ingest import ingest_webhook
 from rafeeq.models import Subscription, Habit
 from .serializers import OptInSerializer, UserSerializer
 
+
+def _owned_user(request, phone):
+    """(user, None) for `phone` if the caller is that user or staff, else (None, error response)."""
+    try:
+        user = User.objects.get(phone_number=phone)
+    except User.DoesNotExist:
+        return None, Response({"detail": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+    if user.pk != request.user.pk and not request.user.is_staff:
+        return None, Response({"detail": "You can only access your own data"}, status=status.HTTP_403_FORBIDDEN)
+    return user, None
+
+
 class RafeeqViewSet(viewsets.ViewSet):
     """
     API endpoints for Rafeeq functionality.
@@ -72,3 +93,95 @@ class RafeeqViewSet(viewsets.ViewSet):
             })
         except User.DoesNotExist:
             return Response({"status": "new_user", "preferences": None})
+
+
+    @action(detail=False, methods=['get'], url_path='stats')
+    def stats(self, request):
+        """
+        Streaks, weekly adherence and per-prayer miss rates (precomputed aggregates only).
+        Requires a login: users read their own stats (phone_number optional), staff any user's.
+        """
+        if not request.user.is_authenticated:
+            return Response({"detail": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
+        try:
+            weeks = int(request.query_params.get('weeks', 4))
+        except ValueError:
+            return Response({"detail": "weeks must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= weeks <= 52:
+            return Response({"detail": "weeks must be between 1 and 52"}, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user
+        phone = request.query_params.get('phone_number')
+        if phone:
+            user, error = _owned_user(request, phone)
+            if error:
+                return error
+        return Response(user_stats(user, weeks=weeks))
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        """
+        Stream a user's history as CSV or NDJSON, never loading it into memory.
+        Params: phone_number, dataset (activity|subscriptions), output (csv|ndjson),
+        start / end (YYYY-MM-DD or ISO datetime, on reference_time; activity only).
+        Requires a login: users export their own data (phone_number optional),
+        staff may export any user, or every user at once by omitting
+        phone_number (or use the export_activity command).
+        """
+        if not request.user.is_authenticated:
+            return Response({"detail": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
+
+        params = request.query_params
+        phone = params.get('phone_number')
+        user = None
+        if phone:
+            user, error = _owned_user(request, phone)
+            if error:
+                return error
+        elif not request.user.is_staff:
+            user = request.user
+
+        dataset = params.get('dataset', 'activity')
+        export_format = params.get('output', 'csv')
+        try:
+            start = parse_bound(params.get('start'))
+            end = parse_bound(params.get('end'), end=True)
+            lines = export_lines(dataset, export_format, user=user, start=start, end=end)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(lines, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{dataset}.{export_format}"'
+        return response
+
+class WhatsAppWebhookView(APIView):
+    """
+    WhatsApp Cloud API webhook: GET for Meta's verification handshake, POST for
+    incoming replies and delivery statuses. Replies become ActivityLog rows
+    (buffered, written in bulk).
+    """
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request):
+        params = request.query_params
+        if (
+            params.get('hub.mode') == 'subscribe'
+            and settings.WHATSAPP_VERIFY_TOKEN
+            and hmac.compare_digest(params.get('hub.verify_token', ''), settings.WHATSAPP_VERIFY_TOKEN)
+        ):
+            return HttpResponse(params.get('hub.challenge', ''), content_type='text/plain')
+        return Response({"detail": "Verification failed"}, status=status.HTTP_403_FORBIDDEN)
+
+    def post(self, request):
+        # Unsigned callbacks could fake replies, so without a secret nothing is accepted
+        if not settings.WHATSAPP_APP_SECRET:
+            return Response({"detail": "Webhook secret not configured"}, status=status.HTTP_403_FORBIDDEN)
+        expected = 'sha256=' + hmac.new(
+            settings.WHATSAPP_APP_SECRET.encode(), request.body, hashlib.sha256
+        ).hexdigest()
+        if not hmac.compare_digest(request.headers.get('X-Hub-Signature-256', ''), expected):
+            return Response({"detail": "Invalid signature"}, status=status.HTTP_403_FORBIDDEN)
+
+        return Response(ingest_webhook(request.data))
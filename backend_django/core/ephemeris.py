@@ -0,0 +1,203 @@
+# core/ephemeris.py
+"""
+Precomputed daily ephemeris table (solar declination + equation of time).
+
+The table is a flat little-endian binary file:
+
+  header : magic b"RAFEPHEM", version (uint32), first row day (proleptic ordinal, uint32),
+           number of rows (uint32)
+  rows   : one per day at 00:00 UTC, two float64 each:
+           declination (radians), equation of time (minutes)
+           (one extra row before the first and after the last covered date)
+
+It is generated from the exact same NOAA series used by solar_calculations,
+then opened read-only with mmap. The pages are backed by the file, so every
+uvicorn / Django worker on the machine shares one copy in the OS page cache.
+
+Values are interpolated with a centred 3-point (quadratic) formula over the
+nearest daily sample and its two neighbours. Validated against
+the NOAA series (see validate_table) to within:
+  - declination:      TOLERANCE_DECLINATION_RAD (~0.00006 degrees)
+  - equation of time: TOLERANCE_EQ_TIME_MINUTES (~0.06 seconds)
+which is far below the one-minute resolution of published prayer times.
+
+Usage:
+  python -m core.ephemeris build [--path PATH] [--start-year 1900] [--end-year 2100]
+  python -m core.ephemeris validate [--path PATH]
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import mmap
+import os
+import struct
+from datetime import date as Date, datetime, time, timedelta, timezone
+from pathlib import Path
+
+from core import solar_calculations as solar
+
+
+DEFAULT_PATH = Path(__file__).resolve().parent / "data" / "solar_ephemeris.bin"
+
+MAGIC = b"RAFEPHEM"
+VERSION = 1
+_HEADER = struct.Struct("<8sIII")
+_ROW = struct.Struct("<2d")
+_THREE_ROWS = struct.Struct("<6d")
+
+TOLERANCE_DECLINATION_RAD = 1e-6
+TOLERANCE_EQ_TIME_MINUTES = 0.001
+
+
+def build_table(
+    path: str | os.PathLike = DEFAULT_PATH,
+    start: Date = Date(1900, 1, 1),
+    end: Date = Date(2100, 12, 31),
+) -> Path:
+    """
+    Evaluate the NOAA series at 00:00 UTC of every day in [start - 1, end + 1]
+    and write the table. The padding rows let the first/last dates interpolate.
+    """
+    if end < start:
+        raise ValueError("end must not be before start.")
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    first = start - timedelta(days=1)
+    days = (end - first).days + 2
+
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "wb") as fh:
+        fh.write(_HEADER.pack(MAGIC, VERSION, first.toordinal(), days))
+        midnight = datetime.combine(first, time(0, 0), tzinfo=timezone.utc)
+        for i in range(days):
+            state = solar._solar_state(midnight + timedelta(days=i))
+            fh.write(_ROW.pack(state.declination_rad, state.eq_time_minutes))
+    # Atomic swap: workers that already mapped the old file keep a valid view.
+    os.replace(tmp, path)
+    return path
+
+
+class EphemerisTable:
+    """Read-only, memory-mapped view of a table written by build_table()."""
+
+    __slots__ = ("path", "first_ordinal", "days", "_mm")
+
+    def __init__(self, path: str | os.PathLike = DEFAULT_PATH):
+        self.path = Path(path)
+        with open(self.path, "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, first_ordinal, days = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"{self.path} is not a version {VERSION} ephemeris table.")
+        if len(self._mm) != _HEADER.size + days * _ROW.size:
+            self._mm.close()
+            raise ValueError(f"{self.path} is truncated.")
+
+        self.first_ordinal = first_ordinal
+        self.days = days
+
+    @property
+    def start(self) -> Date:
+        """First covered date (row 0 is padding)."""
+        return Date.fromordinal(self.first_ordinal + 1)
+
+    @property
+    def end(self) -> Date:
+        """Last covered date (the final row is padding)."""
+        return Date.fromordinal(self.first_ordinal + self.days - 2)
+
+    def covers(self, dt_utc: datetime) -> bool:
+        return 1 <= dt_utc.toordinal() - self.first_ordinal <= self.days - 2
+
+    def state_at(self, dt_utc: datetime) -> solar._SolarState:
+        """Interpolated solar state for an aware UTC datetime."""
+        dt_utc = dt_utc.astimezone(timezone.utc)
+        index = dt_utc.toordinal() - self.first_ordinal
+        if not 1 <= index <= self.days - 2:
+            raise ValueError(f"{dt_utc.date()} is outside the ephemeris table ({self.start}..{self.end}).")
+
+        frac = (
+            dt_utc.hour * 3600 + dt_utc.minute * 60 + dt_utc.second + dt_utc.microsecond / 1e6
+        ) / 86400.0
+        # Centre on the nearest sample so t stays within [-0.5, 0.5].
+        if frac > 0.5:
+            index += 1
+            frac -= 1.0
+        if index > self.days - 2:
+            # Last covered date, late evening: nearest sample is the padding row,
+            # so interpolate forwards from the previous centre instead.
+            index -= 1
+            frac += 1.0
+
+        dec_a, eqt_a, dec_b, eqt_b, dec_c, eqt_c = _THREE_ROWS.unpack_from(
+            self._mm, _HEADER.size + (index - 1) * _ROW.size
+        )
+        return solar._SolarState(
+            declination_rad=_quadratic(dec_a, dec_b, dec_c, frac),
+            eq_time_minutes=_quadratic(eqt_a, eqt_b, eqt_c, frac),
+        )
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+def _quadratic(before: float, centre: float, after: float, t: float) -> float:
+    """3-point interpolation around the centre sample (t in days from it)."""
+    return centre + t * (after - before) / 2.0 + t * t * (after - 2.0 * centre + before) / 2.0
+
+
+def validate_table(table: EphemerisTable, samples_per_day: int = 4, stride_days: int = 1) -> dict:
+    """
+    Compare interpolated values with the NOAA series at off-grid instants.
+
+    Returns the worst absolute errors and whether they are within tolerance.
+    """
+    max_decl = 0.0
+    max_eqt = 0.0
+    midnight = datetime.combine(table.start, time(0, 0), tzinfo=timezone.utc)
+    offsets = [timedelta(days=(k + 0.5) / samples_per_day) for k in range(samples_per_day)]
+
+    for day in range(0, (table.end - table.start).days + 1, stride_days):
+        base = midnight + timedelta(days=day)
+        for offset in offsets:
+            dt_utc = base + offset
+            exact = solar._solar_state(dt_utc)
+            approx = table.state_at(dt_utc)
+            max_decl = max(max_decl, abs(exact.declination_rad - approx.declination_rad))
+            max_eqt = max(max_eqt, abs(exact.eq_time_minutes - approx.eq_time_minutes))
+
+    return {
+        "max_declination_error_rad": max_decl,
+        "max_declination_error_deg": math.degrees(max_decl),
+        "max_eq_time_error_minutes": max_eqt,
+        "within_tolerance": max_decl <= TOLERANCE_DECLINATION_RAD and max_eqt <= TOLERANCE_EQ_TIME_MINUTES,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Build or validate the solar ephemeris table.")
+    parser.add_argument("command", choices=["build", "validate"])
+    parser.add_argument("--path", default=str(DEFAULT_PATH))
+    parser.add_argument("--start-year", type=int, default=1900)
+    parser.add_argument("--end-year", type=int, default=2100)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        path = build_table(args.path, Date(args.start_year, 1, 1), Date(args.end_year, 12, 31))
+        print(f"Wrote {path} ({path.stat().st_size} bytes)")
+        return 0
+
+    table = EphemerisTable(args.path)
+    report = validate_table(table)
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    return 0 if report["within_tolerance"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,77 @@
+# core/location.py
+"""
+Observer location.
+
+A Location bundles everything about *where* a calculation happens that does not
+change from one day to the next: latitude/longitude, their trigonometry and the
+resolved IANA timezone. Build it once per user / mosque and pass it to
+solar_calculations (*_at functions) and get_prayer_times(location=...).
+"""
+
+from __future__ import annotations
+
+import math
+from datetime import tzinfo
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+
+class Location:
+    """
+    Precomputed observer. Treat instances as immutable (they are shared by caches).
+
+    Attributes:
+      - latitude, longitude: degrees (north / east positive)
+      - timezone: IANA key (e.g. "Europe/Oslo"), tz: the resolved tzinfo
+      - lat_rad, sin_lat, cos_lat: latitude trigonometry
+      - longitude_minutes: 4 * longitude, the solar-time offset from Greenwich
+    """
+
+    __slots__ = (
+        "latitude",
+        "longitude",
+        "timezone",
+        "tz",
+        "lat_rad",
+        "sin_lat",
+        "cos_lat",
+        "longitude_minutes",
+    )
+
+    def __init__(self, latitude: float, longitude: float, timezone: str | tzinfo = "UTC"):
+        if not -90.0 <= latitude <= 90.0:
+            raise ValueError("latitude must be between -90 and 90 degrees.")
+        if not -180.0 <= longitude <= 180.0:
+            raise ValueError("longitude must be between -180 and 180 degrees.")
+
+        if isinstance(timezone, tzinfo):
+            tz = timezone
+            timezone = getattr(tz, "key", None) or str(tz)
+        else:
+            tz = ZoneInfo(timezone)
+
+        self.latitude = latitude
+        self.longitude = longitude
+        self.timezone = timezone
+        self.tz = tz
+
+        self.lat_rad = latitude * math.pi / 180.0
+        self.sin_lat = math.sin(self.lat_rad)
+        self.cos_lat = math.cos(self.lat_rad)
+        # 1 degree of longitude = 4 minutes of solar time
+        self.longitude_minutes = 4.0 * longitude
+
+    def __repr__(self) -> str:
+        return f"Location(latitude={self.latitude!r}, longitude={self.longitude!r}, timezone={self.timezone!r})"
+
+
+LOCATION_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=LOCATION_CACHE_SIZE)
+def cached_location(latitude: float, longitude: float, timezone: str = "UTC") -> Location:
+    """
+    Shared Location per (latitude, longitude, timezone).
+    Repeated daily computations for the same user or mosque reuse one object.
+    """
+    return Location(latitude, longitude, timezone)
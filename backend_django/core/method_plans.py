@@ -0,0 +1,169 @@
+# core/method_plans.py
+"""
+Compiled calculation methods.
+
+core/methods.py holds the scholarly parameters as plain dicts. This module turns
+each entry into an immutable MethodPlan once, at import (or registration) time:
+  - sin() of the Fajr / Isha altitudes, ready for the solar solver
+  - the Asr shadow factor
+  - the Isha strategy ("angle" or fixed "minutes" after Maghrib)
+  - offsets as ready-made timedeltas (zero when the method has none)
+
+get_prayer_times() then reads attributes instead of probing dicts per request.
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from datetime import timedelta
+from types import MappingProxyType
+from typing import Literal, Mapping
+
+from core.methods import METHODS
+
+
+OFFSET_KEYS = ("fajr", "sunrise", "zuhr", "asr", "maghrib", "isha")
+
+_ZERO = timedelta(0)
+
+
+@dataclass(frozen=True, slots=True)
+class MethodPlan:
+    key: str
+    name: str
+    fajr_angle: float
+    sin_fajr_altitude: float          # sin(-fajr_angle)
+    isha_strategy: Literal["angle", "minutes"]
+    isha_angle: float | None
+    sin_isha_altitude: float | None   # sin(-isha_angle), angle strategy only
+    isha_delay: timedelta | None      # after Maghrib, minutes strategy only
+    asr_factor: int
+    offsets: Mapping[str, timedelta]
+    fajr_offset: timedelta
+    sunrise_offset: timedelta
+    zuhr_offset: timedelta
+    asr_offset: timedelta
+    maghrib_offset: timedelta
+    isha_offset: timedelta
+
+
+def _sin_altitude(depression_deg: float) -> float:
+    # Same arithmetic as solar_calculations._deg2rad, so results match the angle path exactly.
+    return math.sin(-depression_deg * math.pi / 180.0)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def validate_method(params: dict) -> None:
+    """
+    Check a method definition (same shape as the METHODS entries).
+    Raises ValueError describing the first problem found.
+    """
+    if not isinstance(params, dict):
+        raise ValueError("Method parameters must be a dict.")
+
+    unknown = set(params) - {"name", "fajr_angle", "isha_angle", "isha_minutes", "asr_factor", "offsets"}
+    if unknown:
+        raise ValueError(f"Unknown method parameters: {', '.join(sorted(unknown))}")
+
+    name = params.get("name")
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("Method 'name' is required.")
+
+    fajr_angle = params.get("fajr_angle")
+    if not _is_number(fajr_angle) or not 0 < fajr_angle <= 30:
+        raise ValueError("'fajr_angle' must be a number of degrees in (0, 30].")
+
+    has_angle = "isha_angle" in params
+    has_minutes = "isha_minutes" in params
+    if has_angle == has_minutes:
+        raise ValueError("Exactly one of 'isha_angle' or 'isha_minutes' is required.")
+    if has_angle:
+        isha_angle = params["isha_angle"]
+        if not _is_number(isha_angle) or not 0 < isha_angle <= 30:
+            raise ValueError("'isha_angle' must be a number of degrees in (0, 30].")
+    else:
+        isha_minutes = params["isha_minutes"]
+        if not _is_number(isha_minutes) or not 0 < isha_minutes <= 240:
+            raise ValueError("'isha_minutes' must be a number of minutes in (0, 240].")
+
+    if params.get("asr_factor", 1) not in (1, 2):
+        raise ValueError("'asr_factor' must be 1 or 2.")
+
+    offsets = params.get("offsets", {})
+    if not isinstance(offsets, dict):
+        raise ValueError("'offsets' must be a dict of minutes.")
+    for key, value in offsets.items():
+        if key not in OFFSET_KEYS:
+            raise ValueError(f"Unknown offset '{key}'. Allowed: {', '.join(OFFSET_KEYS)}")
+        if not _is_number(value) or abs(value) > 120:
+            raise ValueError(f"Offset '{key}' must be a number of minutes within ±120.")
+
+
+def compile_method(key: str, params: dict) -> MethodPlan:
+    """Build the immutable plan for one METHODS entry."""
+    offsets = {k: timedelta(minutes=v) for k, v in params.get("offsets", {}).items()}
+
+    if "isha_minutes" in params:
+        isha_strategy = "minutes"
+        isha_angle = None
+        sin_isha_altitude = None
+        isha_delay = timedelta(minutes=params["isha_minutes"])
+    else:
+        isha_strategy = "angle"
+        isha_angle = params["isha_angle"]
+        sin_isha_altitude = _sin_altitude(isha_angle)
+        isha_delay = None
+
+    return MethodPlan(
+        key=key,
+        name=params["name"],
+        fajr_angle=params["fajr_angle"],
+        sin_fajr_altitude=_sin_altitude(params["fajr_angle"]),
+        isha_strategy=isha_strategy,
+        isha_angle=isha_angle,
+        sin_isha_altitude=sin_isha_altitude,
+        isha_delay=isha_delay,
+        asr_factor=params.get("asr_factor", 1),
+        offsets=MappingProxyType(offsets),
+        fajr_offset=offsets.get("fajr", _ZERO),
+        sunrise_offset=offsets.get("sunrise", _ZERO),
+        zuhr_offset=offsets.get("zuhr", _ZERO),
+        asr_offset=offsets.get("asr", _ZERO),
+        maghrib_offset=offsets.get("maghrib", _ZERO),
+        isha_offset=offsets.get("isha", _ZERO),
+    )
+
+
+PLANS: dict[str, MethodPlan] = {key: compile_method(key, params) for key, params in METHODS.items()}
+
+BUILTIN_METHODS = frozenset(PLANS)
+
+
+def get_plan(method_key: str) -> MethodPlan:
+    try:
+        return PLANS[method_key]
+    except KeyError:
+        raise ValueError(f"Unknown method '{method_key}'") from None
+
+
+def register_method(key: str, params: dict) -> MethodPlan:
+    """
+    Add a custom calculation method (e.g. a local mosque's angles).
+
+    The definition is validated, compiled and then listed alongside the built-in
+    METHODS. Built-in methods cannot be replaced.
+    """
+    if not isinstance(key, str) or not key.strip():
+        raise ValueError("Method key is required.")
+    if key in BUILTIN_METHODS:
+        raise ValueError(f"'{key}' is a built-in method and cannot be replaced.")
+
+    validate_method(params)
+    plan = compile_method(key, params)
+    METHODS[key] = dict(params)
+    PLANS[key] = plan
+    return plan
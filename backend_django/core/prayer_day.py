@@ -0,0 +1,119 @@
+# core/prayer_day.py
+"""
+Compact result of one day's prayer time calculation.
+
+Event instants are stored as integer UTC seconds (floored), one slot per
+prayer. Nothing is formatted until asked for: hhmm() / iso() / local() /
+epoch() convert a single event on demand, and to_dict() builds the public
+get_prayer_times() dict for the API.
+
+A PrayerDay computed with a fields selector only carries those prayers
+(listed in .fields); the fallback flag of a prayer that was not computed
+is None.
+"""
+
+from __future__ import annotations
+
+from datetime import date as Date, datetime, timedelta, timezone
+
+from core.location import Location
+
+PRAYER_KEYS = ("fajr", "sunrise", "zuhr", "asr", "asr_standard", "asr_hanafi", "maghrib", "isha")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_SECOND = timedelta(seconds=1)
+
+
+def epoch_seconds(dt: datetime) -> int:
+    """Aware datetime -> whole seconds since the epoch (floored, exact integer arithmetic)."""
+    return (dt - _EPOCH) // _SECOND
+
+
+class PrayerDay:
+    __slots__ = ("date", "location", "method", "fields", "fajr_fallback", "isha_fallback") + PRAYER_KEYS
+
+    def __init__(
+        self,
+        on_date: Date,
+        location: Location,
+        method: str,
+        instants: dict[str, int],
+        *,
+        fajr_fallback: bool | None = False,
+        isha_fallback: bool | None = False,
+    ):
+        self.date = on_date
+        self.location = location
+        self.method = method
+        self.fajr_fallback = fajr_fallback
+        self.isha_fallback = isha_fallback
+        self.fields = tuple(key for key in PRAYER_KEYS if key in instants)
+        for key in self.fields:
+            setattr(self, key, instants[key])
+
+    def __repr__(self):
+        return f"PrayerDay({self.date.isoformat()}, {self.location.timezone}, {self.method})"
+
+    # -----------------------
+    # Single events, formatted on demand
+    # -----------------------
+    def epoch(self, name: str) -> int:
+        if name not in self.fields:
+            raise KeyError(f"'{name}' was not computed for this day.")
+        return getattr(self, name)
+
+    def local(self, name: str, *, to_minute: bool = False) -> datetime:
+        """
+        Aware local datetime. to_minute=True truncates to the published minute
+        (what hhmm() shows), e.g. for reminders due "at 05:12".
+        """
+        seconds = self.epoch(name)
+        if to_minute:
+            seconds -= seconds % 60
+        return datetime.fromtimestamp(seconds, self.location.tz)
+
+    def hhmm(self, name: str) -> str:
+        local = self.local(name)
+        return f"{local.hour:02d}:{local.minute:02d}"
+
+    def iso(self, name: str) -> str:
+        return self.local(name).isoformat()
+
+    def datetimes(self, names=None) -> dict[str, datetime]:
+        return {name: self.local(name) for name in (self.fields if names is None else names)}
+
+    # -----------------------
+    # API compatibility
+    # -----------------------
+    def to_dict(self, fmt: str = "hhmm") -> dict:
+        """
+        The get_prayer_times() dict. fmt picks the "times" values:
+        "hhmm" (default), "iso", "epoch" or "datetime" (aware local datetimes).
+        """
+        if fmt == "datetime":
+            times = self.datetimes()
+        elif fmt == "hhmm":
+            times = {name: self.hhmm(name) for name in self.fields}
+        elif fmt == "iso":
+            times = {name: self.iso(name) for name in self.fields}
+        elif fmt == "epoch":
+            times = {name: getattr(self, name) for name in self.fields}
+        else:
+            raise ValueError(f"Unknown time format '{fmt}'.")
+
+        any_fallback = self.fajr_fallback or self.isha_fallback
+        return {
+            "date": self.date.isoformat(),
+            "timezone": self.location.timezone,
+            "method": self.method,
+            "location": {
+                "latitude": self.location.latitude,
+                "longitude": self.location.longitude,
+            },
+            "high_latitude_fallback": {
+                "fajr": self.fajr_fallback,
+                "isha": self.isha_fallback,
+                "method": "middle_of_the_night" if any_fallback else None,
+            },
+            "times": times,
+        }
@@ -5,11 +5,15 @@
 from __future__ import annotations
 
 import math
+import os
 from dataclasses import dataclass
+from functools import lru_cache
 from datetime import date as Date, datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 from typing import Literal
 
+from core.location import Location
+
 
 # -----------------------------
 # Small helpers
@@ -129,6 +133,67 @@ def _solar_state(dt_utc: datetime) -> _SolarState:
     return _SolarState(declination_rad=decl, eq_time_minutes=eq_time)
 
 
+# -----------------------------
+# Shared solar state cache
+# -----------------------------
+# The solar state depends only on the UTC instant, never on the observer.
+# Every location asks for the 12:00 UTC state of its date (solar noon estimate),
+# and every event of a request re-uses the state at that location's noon instant.
+# Bounded LRU: ~2 entries per date plus one per (date, longitude) seen recently.
+
+SOLAR_STATE_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=SOLAR_STATE_CACHE_SIZE)
+def _cached_solar_state(dt_utc: datetime) -> _SolarState:
+    table = _ephemeris_table
+    if table is not None and table.covers(dt_utc):
+        return table.state_at(dt_utc)
+    return _solar_state(dt_utc)
+
+
+def solar_state_cache_info():
+    """Hit/miss counters of the shared solar state cache (functools CacheInfo)."""
+    return _cached_solar_state.cache_info()
+
+
+def clear_solar_state_cache() -> None:
+    _cached_solar_state.cache_clear()
+
+
+# -----------------------------
+# Solar model selection
+# -----------------------------
+# "noaa" : evaluate the NOAA series for every instant (default).
+# "table": interpolate from the memory-mapped daily ephemeris table
+#          (core/ephemeris.py); instants outside the table use the series.
+
+_ephemeris_table = None
+
+
+def set_solar_model(model: Literal["noaa", "table"], path: str | None = None) -> None:
+    """
+    Switch how declination / equation of time are obtained.
+    For "table", path defaults to core/ephemeris.DEFAULT_PATH.
+    """
+    global _ephemeris_table
+
+    if model == "noaa":
+        table = None
+    elif model == "table":
+        from core.ephemeris import DEFAULT_PATH, EphemerisTable
+        table = EphemerisTable(path or DEFAULT_PATH)
+    else:
+        raise ValueError(f"Unknown solar model '{model}'. Use 'noaa' or 'table'.")
+
+    _ephemeris_table = table
+    clear_solar_state_cache()
+
+
+def get_solar_model() -> str:
+    return "noaa" if _ephemeris_table is None else "table"
+
+
 def _solar_noon_utc(latitude: float, longitude: float, on_date: Date) -> datetime:
     """
     Approximate solar noon in UTC for the given date.
@@ -138,7 +203,7 @@ def _solar_noon_utc(latitude: float, longitude: float, on_date: Date) -> datetim
     """
     # Start with 12:00 UTC as a reference moment on that date
     base = datetime(on_date.year, on_date.month, on_date.day, 12, 0, tzinfo=timezone.utc)
-    state = _solar_state(base)
+    state = _cached_solar_state(base)
     minutes_utc = 720.0 - 4.0 * longitude - state.eq_time_minutes
     return datetime(on_date.year, on_date.month, on_date.day, tzinfo=timezone.utc) + timedelta(minutes=minutes_utc)
 
@@ -148,6 +213,11 @@ def solar_noon(latitude: float, longitude: float, on_date: Date, tz: ZoneInfo) -
     return dt_utc.astimezone(tz)
 
 
+def solar_noon_at(observer: Location, on_date: Date) -> datetime:
+    dt_utc = _solar_noon_utc(observer.latitude, observer.longitude, on_date)
+    return dt_utc.astimezone(observer.tz)
+
+
 def _hour_angle_for_altitude(
     latitude_deg: float,
     declination_rad: float,
@@ -196,34 +266,83 @@ def _event_time_utc(
 
     If the sun never reaches the altitude (polar day/night), raises ValueError.
     """
+    return _event_time_utc_at(Location(latitude, longitude, timezone.utc), on_date, altitude_deg, direction)
+
+
+def _event_time_utc_at(
+    observer: Location,
+    on_date: Date,
+    altitude_deg: float,
+    direction: Literal["before", "after"],
+) -> datetime:
+    """
+    _event_time_utc for a precomputed observer (latitude trigonometry cached).
+    """
+    return _event_time_utc_sin(observer, on_date, math.sin(_deg2rad(altitude_deg)), direction)
+
+
+# Why a solver found no event; message used by the raising API
+_NO_EVENT_MESSAGES = {
+    "polar": "Polar edge case: cannot compute for this location/date.",
+    "unreachable": "No event time: sun does not reach this altitude on this date at this location.",
+}
+
+
+@dataclass(frozen=True)
+class SolarEvent:
+    """
+    Solver result. `time` is None when there is no event that day; `status`
+    says why ("unreachable": the sun never gets to the altitude, "polar":
+    the hour angle is undefined). Lets callers branch without try/except.
+    """
+    time: datetime | None
+    status: Literal["ok", "unreachable", "polar"] = "ok"
+
+    @property
+    def reachable(self) -> bool:
+        return self.status == "ok"
+
+    def unwrap(self) -> datetime:
+        """The event time, or ValueError (the historical behaviour) if there is none."""
+        if self.time is None:
+            raise ValueError(_NO_EVENT_MESSAGES[self.status])
+        return self.time
+
+
+def _solve_event_utc_sin(
+    observer: Location,
+    on_date: Date,
+    sin_alt: float,
+    direction: Literal["before", "after"],
+) -> SolarEvent:
+    """
+    Core solver, taking sin(altitude) directly so fixed angles (sunrise, a method's
+    Fajr/Isha) can be precomputed once. Never raises for an unreachable altitude.
+    """
     # 1) Solar noon in UTC
-    noon_utc = _solar_noon_utc(latitude, longitude, on_date)
+    noon_utc = _solar_noon_utc(observer.latitude, observer.longitude, on_date)
 
     # 2) Solar state at noon (good approximation for the day)
-    state = _solar_state(noon_utc)
+    state = _cached_solar_state(noon_utc)
     dec = state.declination_rad
     eq_time = state.eq_time_minutes
 
     # 3) Hour angle for desired altitude
     # If the sun never reaches that altitude, acos input will clamp,
     # but we detect reachability by checking unclamped value.
-    lat = _deg2rad(latitude)
-    alt = _deg2rad(altitude_deg)
-
-    sin_alt = math.sin(alt)
-    sin_lat = math.sin(lat)
-    cos_lat = math.cos(lat)
+    sin_lat = observer.sin_lat
+    cos_lat = observer.cos_lat
     sin_dec = math.sin(dec)
     cos_dec = math.cos(dec)
 
     denom = cos_lat * cos_dec
     if abs(denom) < 1e-12:
-        raise ValueError("Polar edge case: cannot compute for this location/date.")
+        return _POLAR
 
     cosH_raw = (sin_alt - sin_lat * sin_dec) / denom
     if cosH_raw < -1.0 or cosH_raw > 1.0:
         # No solution: sun never reaches that altitude
-        raise ValueError("No event time: sun does not reach this altitude on this date at this location.")
+        return _UNREACHABLE
 
     H = math.acos(_clamp(cosH_raw, -1.0, 1.0))  # radians
     H_deg = _rad2deg(H)
@@ -233,7 +352,7 @@ def _event_time_utc(
 
     # Noon in minutes from 00:00 UTC using NOAA formula:
     # solarNoonUTC = 720 - 4*longitude - eqTime
-    solar_noon_minutes = 720.0 - 4.0 * longitude - eq_time
+    solar_noon_minutes = 720.0 - observer.longitude_minutes - eq_time
 
     if direction == "before":
         event_minutes = solar_noon_minutes - delta_minutes
@@ -242,24 +361,52 @@ def _event_time_utc(
 
     # normalize to within day (still safe if a few minutes outside due to approximations)
     dt0 = datetime(on_date.year, on_date.month, on_date.day, tzinfo=timezone.utc)
-    return dt0 + timedelta(minutes=event_minutes)
+    return SolarEvent(dt0 + timedelta(minutes=event_minutes))
+
+
+_POLAR = SolarEvent(None, "polar")
+_UNREACHABLE = SolarEvent(None, "unreachable")
+
+
+def _event_time_utc_sin(
+    observer: Location,
+    on_date: Date,
+    sin_alt: float,
+    direction: Literal["before", "after"],
+) -> datetime:
+    """
+    Raising wrapper around _solve_event_utc_sin: ValueError if there is no event.
+    """
+    return _solve_event_utc_sin(observer, on_date, sin_alt, direction).unwrap()
 
 
 # -----------------------------
 # Public API functions
 # -----------------------------
 
+# Sunrise/sunset altitude (-0.833 degrees), precomputed
+_SIN_HORIZON_ALTITUDE = math.sin(_deg2rad(-0.833))
+
+
 def sunrise(latitude: float, longitude: float, on_date: Date, tz: ZoneInfo) -> datetime:
     """
     Sunrise: standard altitude about -0.833 degrees (refraction + solar radius).
     """
-    dt_utc = _event_time_utc(latitude, longitude, on_date, altitude_deg=-0.833, direction="before")
-    return dt_utc.astimezone(tz)
+    return sunrise_at(Location(latitude, longitude, tz), on_date)
+
+
+def sunrise_at(observer: Location, on_date: Date) -> datetime:
+    dt_utc = _event_time_utc_sin(observer, on_date, _SIN_HORIZON_ALTITUDE, "before")
+    return dt_utc.astimezone(observer.tz)
 
 
 def sunset(latitude: float, longitude: float, on_date: Date, tz: ZoneInfo) -> datetime:
-    dt_utc = _event_time_utc(latitude, longitude, on_date, altitude_deg=-0.833, direction="after")
-    return dt_utc.astimezone(tz)
+    return sunset_at(Location(latitude, longitude, tz), on_date)
+
+
+def sunset_at(observer: Location, on_date: Date) -> datetime:
+    dt_utc = _event_time_utc_sin(observer, on_date, _SIN_HORIZON_ALTITUDE, "after")
+    return dt_utc.astimezone(observer.tz)
 
 
 def time_when_sun_reaches_angle(
@@ -276,8 +423,55 @@ def time_when_sun_reaches_angle(
       angle_degrees is solar altitude in degrees.
       For “below horizon”, pass negative values (e.g., -18 for Fajr).
     """
-    dt_utc = _event_time_utc(latitude, longitude, on_date, altitude_deg=angle_degrees, direction=direction)
-    return dt_utc.astimezone(tz)
+    return time_when_sun_reaches_angle_at(
+        Location(latitude, longitude, tz),
+        on_date,
+        angle_degrees=angle_degrees,
+        direction=direction,
+    )
+
+
+def time_when_sun_reaches_angle_at(
+    observer: Location,
+    on_date: Date,
+    *,
+    angle_degrees: float,
+    direction: Literal["before", "after"],
+) -> datetime:
+    dt_utc = _event_time_utc_at(observer, on_date, altitude_deg=angle_degrees, direction=direction)
+    return dt_utc.astimezone(observer.tz)
+
+
+def time_when_sun_reaches_sin_altitude_at(
+    observer: Location,
+    on_date: Date,
+    *,
+    sin_altitude: float,
+    direction: Literal["before", "after"],
+) -> datetime:
+    """
+    Same as time_when_sun_reaches_angle_at, for a precomputed sin(altitude)
+    (see core.method_plans.MethodPlan). Raises ValueError if there is no event.
+    """
+    return solve_sin_altitude_at(observer, on_date, sin_altitude=sin_altitude, direction=direction).unwrap()
+
+
+def solve_sin_altitude_at(
+    observer: Location,
+    on_date: Date,
+    *,
+    sin_altitude: float,
+    direction: Literal["before", "after"],
+) -> SolarEvent:
+    """
+    Status-returning time_when_sun_reaches_sin_altitude_at: a SolarEvent with
+    a local time, or reachable=False (no exception) when the sun never gets
+    there, e.g. Fajr/Isha angles in high-latitude summers.
+    """
+    event = _solve_event_utc_sin(observer, on_date, sin_altitude, direction)
+    if not event.reachable:
+        return event
+    return SolarEvent(event.time.astimezone(observer.tz))
 
 
 def asr_time(
@@ -300,16 +494,19 @@ def asr_time(
 
     This yields an altitude (positive), then we find the afternoon time the sun reaches it.
     """
+    return asr_time_at(Location(latitude, longitude, tz), on_date, asr_factor=asr_factor)
+
+
+def asr_time_at(observer: Location, on_date: Date, *, asr_factor: int = 1) -> datetime:
     if asr_factor not in (1, 2):
         raise ValueError("asr_factor must be 1 or 2.")
 
-    noon_utc = _solar_noon_utc(latitude, longitude, on_date)
-    state = _solar_state(noon_utc)
+    noon_utc = _solar_noon_utc(observer.latitude, observer.longitude, on_date)
+    state = _cached_solar_state(noon_utc)
     decl = state.declination_rad
 
-    lat_rad = _deg2rad(latitude)
     # |lat - decl| in radians
-    phi = abs(lat_rad - decl)
+    phi = abs(observer.lat_rad - decl)
 
     # altitude for Asr (radians)
     # tan(alt) = 1 / (n + tan(phi))
@@ -317,5 +514,10 @@ def asr_time(
     alt_deg = _rad2deg(alt_rad)
 
     # Asr is always after solar noon
-    dt_utc = _event_time_utc(latitude, longitude, on_date, altitude_deg=alt_deg, direction="after")
-    return dt_utc.astimezone(tz)
+    dt_utc = _event_time_utc_at(observer, on_date, altitude_deg=alt_deg, direction="after")
+    return dt_utc.astimezone(observer.tz)
+
+
+# Opt-in per process: SOLAR_MODEL=table [SOLAR_EPHEMERIS_PATH=/path/to/table.bin]
+if os.getenv("SOLAR_MODEL", "noaa") == "table":
+    set_solar_model("table", os.getenv("SOLAR_EPHEMERIS_PATH"))
@@ -0,0 +1,249 @@
+# messaging/dispatcher.py
+"""
+Async WhatsApp sender for reminder bursts.
+
+At Maghrib every subscriber in a city is due within the same minute. Sending
+them one blocking requests.post at a time takes minutes; this dispatcher
+sends them concurrently over one pooled httpx.AsyncClient, while staying
+inside the Cloud API limits:
+  - at most `concurrency` requests in flight
+  - a token bucket caps the send rate (Cloud API default: 80 messages/s)
+  - 429 / 5xx / network errors are retried with jittered exponential backoff
+    (Retry-After is honoured when the API sends it)
+
+Every send reports its latency and attempt count; stats() summarises the
+last LATENCY_WINDOW sends.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterable
+
+import httpx
+
+from messaging.whatsapp import (
+    ACCESS_TOKEN, PHONE_NUMBER_ID, REQUEST_TIMEOUT, WHATSAPP_API_URL, auth_headers, messages_url, text_message,
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENCY = int(os.getenv("WHATSAPP_MAX_CONCURRENCY", "50"))
+RATE_PER_SECOND = float(os.getenv("WHATSAPP_RATE_PER_SECOND", "80"))
+MAX_RETRIES = int(os.getenv("WHATSAPP_MAX_RETRIES", "4"))
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30.0
+# stats() percentiles cover the most recent sends only, so a long-running sender stays bounded
+LATENCY_WINDOW = 10_000
+
+
+def max_send_seconds(
+    max_retries: int = MAX_RETRIES, timeout: float = REQUEST_TIMEOUT, backoff_max: float = BACKOFF_MAX_SECONDS
+) -> float:
+    """Longest one send() can take: every attempt times out and every retry waits the longest backoff."""
+    return (max_retries + 1) * timeout + max_retries * backoff_max
+
+
+def _retryable(status_code: int) -> bool:
+    return status_code == 429 or status_code >= 500
+
+
+def _json_or_none(response: httpx.Response) -> dict | None:
+    # A 2xx is a delivered message even if the body is not the JSON we expect
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `capacity` (the allowed burst)."""
+
+    def __init__(self, rate: float, capacity: float | None = None, clock=time.monotonic):
+        if rate <= 0:
+            raise ValueError("rate must be positive.")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        # The lock keeps waiters in FIFO order
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+@dataclass(frozen=True, slots=True)
+class SendResult:
+    to: str
+    ok: bool
+    status_code: int | None
+    attempts: int
+    latency_ms: float           # first attempt to final answer, retries included
+    response: dict | None = None
+    error: str | None = None
+
+    @property
+    def message_id(self) -> str | None:
+        """The Cloud API message id ("wamid...") of a successful send, if the response had one."""
+        try:
+            return self.response["messages"][0]["id"]
+        except (TypeError, KeyError, IndexError):
+            return None
+
+
+class WhatsAppDispatcher:
+    """
+    Usage:
+        async with WhatsAppDispatcher() as dispatcher:
+            results = await dispatcher.send_many([(phone, text), ...])
+    """
+
+    def __init__(
+        self,
+        *,
+        api_url: str = WHATSAPP_API_URL,
+        phone_number_id: str = PHONE_NUMBER_ID,
+        access_token: str = ACCESS_TOKEN,
+        concurrency: int = MAX_CONCURRENCY,
+        rate_per_second: float = RATE_PER_SECOND,
+        burst: float | None = None,
+        max_retries: int = MAX_RETRIES,
+        backoff_base: float = BACKOFF_BASE_SECONDS,
+        backoff_max: float = BACKOFF_MAX_SECONDS,
+        timeout: float = REQUEST_TIMEOUT,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1.")
+        self.url = messages_url(phone_number_id, api_url)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._headers = auth_headers(access_token)
+        self._timeout = timeout
+        self._transport = transport
+        self._limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        self._slots = asyncio.Semaphore(concurrency)
+        self._bucket = TokenBucket(rate_per_second, burst)
+        self._client: httpx.AsyncClient | None = None
+        self._sent = 0
+        self._failed = 0
+        self._retries = 0
+        self._latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    async def __aenter__(self):
+        self._client = httpx.AsyncClient(
+            headers=self._headers,
+            timeout=self._timeout,
+            limits=self._limits,
+            transport=self._transport,
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _backoff(self, attempt: int, retry_after: str | None) -> float:
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        # Full jitter: spreads retries from a burst instead of re-synchronising them
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def send(self, to_number: str, text_body: str) -> SendResult:
+        if self._client is None:
+            raise RuntimeError("Use 'async with WhatsAppDispatcher()' before sending.")
+
+        payload = text_message(to_number, text_body)
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            status_code = None
+            retry_after = None
+            # A connection slot is held for the request only, never while backing off
+            async with self._slots:
+                await self._bucket.acquire()
+                try:
+                    response = await self._client.post(self.url, json=payload)
+                    status_code = response.status_code
+                    if response.is_success:
+                        return self._finish(to_number, True, status_code, attempt, started, response=_json_or_none(response))
+                    error = f"HTTP {status_code}: {response.text[:200]}"
+                    retryable = _retryable(status_code)
+                    retry_after = response.headers.get("Retry-After")
+                except httpx.TransportError as e:
+                    error = f"{type(e).__name__}: {e}"
+                    retryable = True
+
+            if not retryable or attempt > self.max_retries:
+                logger.error(f"Failed to send WhatsApp message to {to_number}: {error}")
+                return self._finish(to_number, False, status_code, attempt, started, error=error)
+
+            self._retries += 1
+            await asyncio.sleep(self._backoff(attempt - 1, retry_after))
+
+    def _finish(self, to_number, ok, status_code, attempts, started, response=None, error=None) -> SendResult:
+        latency_ms = (time.perf_counter() - started) * 1000.0
+        self._latencies.append(latency_ms)
+        if ok:
+            self._sent += 1
+        else:
+            self._failed += 1
+        return SendResult(
+            to=to_number,
+            ok=ok,
+            status_code=status_code,
+            attempts=attempts,
+            latency_ms=latency_ms,
+            response=response,
+            error=error,
+        )
+
+    async def send_many(self, messages: Iterable[tuple[str, str]]) -> list[SendResult]:
+        """Send every (to_number, text_body); results come back in input order."""
+        return await asyncio.gather(*(self.send(to, body) for to, body in messages))
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3)
+
+        return {
+            "sent": self._sent,
+            "failed": self._failed,
+            "retries": self._retries,
+            "latency_ms": {
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "max": round(latencies[-1], 3) if latencies else None,
+            },
+        }
@@ -0,0 +1,53 @@
+import requests
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Constants (In production, load these from environment variables)
+WHATSAPP_API_URL = "https://graph.facebook.com/v17.0"
+PHONE_NUMBER_ID = os.getenv("WHATSAPP_PHONE_ID", "dummy_id")
+ACCESS_TOKEN = os.getenv("WHATSAPP_TOKEN", "dummy_token")
+
+# Cloud API per-request timeout (seconds); the sync helper used to wait forever
+REQUEST_TIMEOUT = float(os.getenv("WHATSAPP_TIMEOUT", "10"))
+
+
+def messages_url(phone_number_id: str = PHONE_NUMBER_ID, api_url: str = WHATSAPP_API_URL) -> str:
+    return f"{api_url}/{phone_number_id}/messages"
+
+
+def auth_headers(access_token: str = ACCESS_TOKEN) -> dict:
+    return {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json",
+    }
+
+
+def text_message(to_number: str, text_body: str) -> dict:
+    return {
+        "messaging_product": "whatsapp",
+        "to": to_number,
+        "type": "text",
+        "text": {"body": text_body},
+    }
+
+
+def send_message(to_number: str, text_body: str):
+    """
+    Sends a WhatsApp text message using the Cloud API.
+    For bursts of reminders use messaging.dispatcher.WhatsAppDispatcher instead.
+    """
+    url = messages_url()
+    headers = auth_headers()
+    data = text_message(to_number, text_body)
+    
+    try:
+        response = requests.post(url, headers=headers, json=data, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Failed to send WhatsApp message: {e}")
+        if e.response:
+             logger.error(f"Response: {e.response.text}")
+        return None
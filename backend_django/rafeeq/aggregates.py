@@ -0,0 +1,210 @@
+from collections import defaultdict
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from users.models import User
+from .models import ActivityLog, DailySummary, UserStats
+
+STATUSES = ('prayed', 'late', 'missed', 'unknown')
+BACKFILL_CHUNK_SIZE = 500
+
+
+def _local_date(moment, tz):
+    return moment.astimezone(tz).date()
+
+
+def _zone(name):
+    try:
+        return ZoneInfo(name or "UTC")
+    except Exception:
+        return ZoneInfo("UTC")
+
+
+def is_good_day(summary):
+    """A day counts towards the streak when nothing was missed and something was prayed."""
+    return summary.missed == 0 and summary.prayed + summary.late > 0
+
+
+def _set_status(summary, per_prayer, event_type, status):
+    """Apply one log to a day summary and the per-prayer totals; False if nothing changed."""
+    old = summary.statuses.get(event_type)
+    if old == status:
+        return False
+    counts = per_prayer.setdefault(event_type, dict.fromkeys(STATUSES, 0))
+    if old is not None:
+        setattr(summary, old, getattr(summary, old) - 1)
+        counts[old] -= 1
+    setattr(summary, status, getattr(summary, status) + 1)
+    counts[status] += 1
+    summary.statuses[event_type] = status
+    return True
+
+
+# -----------------------
+# Incremental updates
+# -----------------------
+def record_activity(logs):
+    """
+    Fold newly written ActivityLog rows into DailySummary and UserStats.
+    Called by the webhook buffer after each bulk_create (which sends no signals).
+    """
+    by_user = defaultdict(list)
+    for log in logs:
+        by_user[log.user_id].append(log)
+    zones = dict(User.objects.filter(pk__in=by_user).values_list('id', 'timezone'))
+
+    for user_id, user_logs in by_user.items():
+        tz = _zone(zones.get(user_id))
+        by_day = defaultdict(list)
+        for log in sorted(user_logs, key=lambda l: l.reference_time):
+            by_day[_local_date(log.reference_time, tz)].append(log)
+        with transaction.atomic():
+            stats, _ = UserStats.objects.select_for_update().get_or_create(user_id=user_id)
+            for day, day_logs in sorted(by_day.items()):
+                _apply_day(stats, user_id, day, day_logs)
+            stats.save()
+
+
+def _apply_day(stats, user_id, day, logs):
+    summary, _ = DailySummary.objects.select_for_update().get_or_create(user_id=user_id, date=day)
+    was_good, was_missed = is_good_day(summary), summary.missed > 0
+    changed = False
+    for log in logs:
+        changed |= _set_status(summary, stats.per_prayer, log.event_type, log.status)
+    if not changed:
+        return
+    summary.save()
+
+    if is_good_day(summary) == was_good and (summary.missed > 0) == was_missed:
+        return # streaks only depend on good and missed days
+    answered = Q(missed__gt=0) | Q(prayed__gt=0) | Q(late__gt=0)
+    latest = not DailySummary.objects.filter(answered, user_id=user_id, date__gt=day).exists()
+    if latest and not (was_good or was_missed):
+        _advance_streak(stats, summary)
+    elif latest and was_good and (summary.missed or stats.current_streak > 1):
+        # The streak's last day no longer counts: it now ends the day before
+        stats.current_streak -= 1
+        stats.streak_end = day - timedelta(days=1) if stats.current_streak else None
+        if summary.missed:
+            _close_streak(stats)
+        stats.longest_streak = max(stats.previous_longest_streak, stats.current_streak)
+    else:
+        # A backdated day, or one whose state before it is unknown: walk the history again
+        _recompute_streaks(stats, user_id)
+
+
+def _close_streak(stats):
+    stats.previous_longest_streak = max(stats.previous_longest_streak, stats.current_streak)
+    stats.current_streak = 0
+    stats.streak_end = None
+
+
+def _advance_streak(stats, summary):
+    """Fold the next day (in date order) into the streaks: good days extend or start one, a miss ends it."""
+    if summary.missed:
+        _close_streak(stats)
+    elif is_good_day(summary):
+        if stats.streak_end is not None and summary.date == stats.streak_end + timedelta(days=1):
+            stats.current_streak += 1
+        else:
+            _close_streak(stats)
+            stats.current_streak = 1
+        stats.streak_end = summary.date
+        stats.longest_streak = max(stats.longest_streak, stats.current_streak)
+
+
+def _recompute_streaks(stats, user_id):
+    stats.current_streak = stats.longest_streak = stats.previous_longest_streak = 0
+    stats.streak_end = None
+    days = DailySummary.objects.filter(user_id=user_id).order_by('date').only('date', 'prayed', 'late', 'missed')
+    for summary in days.iterator(chunk_size=500):
+        _advance_streak(stats, summary)
+
+
+# -----------------------
+# Backfill
+# -----------------------
+def rebuild_summaries(user_ids):
+    """
+    Recompute every DailySummary and UserStats row for `user_ids` from their
+    full ActivityLog history, streamed in reference_time order.
+    """
+    zones = {uid: _zone(name) for uid, name in User.objects.filter(pk__in=user_ids).values_list('id', 'timezone')}
+    summaries = {}
+    per_prayer = defaultdict(dict)
+
+    logs = (
+        ActivityLog.objects.filter(user_id__in=user_ids)
+        .order_by('user_id', 'reference_time', 'id')
+        .values_list('user_id', 'event_type', 'status', 'reference_time')
+    )
+    for user_id, event_type, status, reference_time in logs.iterator(chunk_size=2000):
+        day = _local_date(reference_time, zones.get(user_id, ZoneInfo("UTC")))
+        summary = summaries.get((user_id, day))
+        if summary is None:
+            summary = summaries[(user_id, day)] = DailySummary(user_id=user_id, date=day, statuses={})
+        _set_status(summary, per_prayer[user_id], event_type, status)
+
+    stats = {uid: UserStats(user_id=uid, per_prayer=per_prayer[uid]) for uid in per_prayer}
+    # Same rules as the incremental path
+    for (user_id, day), summary in sorted(summaries.items()):
+        _advance_streak(stats[user_id], summary)
+
+    with transaction.atomic():
+        DailySummary.objects.filter(user_id__in=user_ids).delete()
+        UserStats.objects.filter(user_id__in=user_ids).delete()
+        DailySummary.objects.bulk_create(summaries.values(), batch_size=1000)
+        UserStats.objects.bulk_create(stats.values(), batch_size=1000)
+    return len(summaries)
+
+
+# -----------------------
+# Reads
+# -----------------------
+def user_stats(user, today=None, weeks=1):
+    """
+    Streaks, weekly adherence and per-prayer miss rates for `user`, read from
+    UserStats plus at most 7 * `weeks` DailySummary rows.
+    """
+    tz = _zone(user.timezone)
+    today = today or _local_date(timezone.now(), tz)
+    stats = UserStats.objects.filter(user=user).first() or UserStats(user=user)
+
+    # A streak is still "current" until a full day passes without a good day
+    current = stats.current_streak
+    if stats.streak_end is None or stats.streak_end < today - timedelta(days=1):
+        current = 0
+
+    # Week 0 is the 7 days ending today, week 1 the 7 before, ...
+    totals = [[0, 0] for _ in range(weeks)]  # [done, answered]
+    days = DailySummary.objects.filter(user=user, date__range=(today - timedelta(days=7 * weeks - 1), today))
+    for day, prayed, late, missed in days.values_list('date', 'prayed', 'late', 'missed'):
+        week = totals[(today - day).days // 7]
+        week[0] += prayed + late
+        week[1] += prayed + late + missed
+
+    weekly = []
+    for week, (done, answered) in enumerate(totals):
+        end = today - timedelta(days=7 * week)
+        weekly.append({
+            'start': (end - timedelta(days=6)).isoformat(),
+            'end': end.isoformat(),
+            'adherence': round(100.0 * done / answered, 1) if answered else None,
+        })
+
+    miss_rate = {}
+    for prayer, counts in sorted(stats.per_prayer.items()):
+        answered = sum(counts.get(s, 0) for s in ('prayed', 'late', 'missed'))
+        miss_rate[prayer] = round(100.0 * counts.get('missed', 0) / answered, 1) if answered else None
+
+    return {
+        'current_streak': current,
+        'longest_streak': stats.longest_streak,
+        'weekly_adherence': weekly,
+        'miss_rate': miss_rate,
+    }
+
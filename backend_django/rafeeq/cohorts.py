@@ -0,0 +1,71 @@
+from core.location import cached_location
+from core.prayer_times import get_prayer_day
+
+# 0.01 degrees is ~1.1 km: at most a few seconds of prayer time, well
+# inside the one-minute resolution we publish.
+COORDINATE_PRECISION = 2
+DEFAULT_METHOD = "MWL"
+# Prayers a reminder can be subscribed to; the Asr variant columns are skipped
+REMINDER_FIELDS = ("fajr", "sunrise", "zuhr", "asr", "maghrib", "isha")
+
+
+class CohortTimes:
+    """
+    Prayer times shared by subscribers in the same cohort.
+
+    Most users live in a handful of cities, so users are grouped by
+    (quantized lat/lng, timezone, calculation method, date) and
+    the calculation runs once per cohort per day; members reuse the PrayerDay.
+    """
+
+    def __init__(self, precision=COORDINATE_PRECISION):
+        self.precision = precision
+        self._times = {}
+        self._members = {}  # cohort key (without date) -> set of user ids
+        self.lookups = 0
+        self.computed = 0
+
+    def cohort_key(self, user, method=DEFAULT_METHOD):
+        return (
+            round(user.latitude or 0.0, self.precision),
+            round(user.longitude or 0.0, self.precision),
+            user.timezone or "UTC",
+            method,
+        )
+
+    def times_for(self, user, on_date, method=DEFAULT_METHOD):
+        """PrayerDay for the user's cohort on `on_date`."""
+        cohort = self.cohort_key(user, method)
+        self._members.setdefault(cohort, set()).add(user.pk)
+        key = cohort + (on_date,)
+
+        self.lookups += 1
+        times = self._times.get(key)
+        if times is None:
+            lat, lng, tz, method = cohort
+            times = get_prayer_day(
+                on_date=on_date,
+                method_key=method,
+                location=cached_location(lat, lng, tz),
+                fields=REMINDER_FIELDS,
+            )
+            self._times[key] = times
+            self.computed += 1
+        return times
+
+    def prune(self, before):
+        """Drop cached days older than `before` (a date)."""
+        self._times = {k: v for k, v in self._times.items() if k[-1] >= before}
+
+    def clear(self):
+        self._times.clear()
+        self._members.clear()
+
+    def stats(self):
+        return {
+            "cohorts": len(self._members),
+            "members": sum(len(m) for m in self._members.values()),
+            "lookups": self.lookups,
+            "computed": self.computed,
+            "saved": self.lookups - self.computed,
+        }
@@ -0,0 +1,123 @@
+import csv
+import json
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import ActivityLog, Subscription
+
+EXPORT_CHUNK_SIZE = 2000
+FORMATS = ('csv', 'ndjson')
+
+ACTIVITY_COLUMNS = {
+    'user_id': 'user_id',
+    'phone_number': 'user__phone_number',
+    'habit': 'habit__slug',
+    'event_type': 'event_type',
+    'status': 'status',
+    'reference_time': 'reference_time',
+    'logged_at': 'logged_at',
+    'reflection_note': 'reflection_note',
+}
+SUBSCRIPTION_COLUMNS = {
+    'user_id': 'user_id',
+    'phone_number': 'user__phone_number',
+    'habit': 'habit__slug',
+    'is_active': 'is_active',
+    'preferences': 'preferences',
+    'created_at': 'created_at',
+    'last_reminded_at': 'last_reminded_at',
+}
+
+
+def parse_bound(value, end=False):
+    """
+    'YYYY-MM-DD' or an ISO datetime -> aware datetime (UTC when no offset).
+    A plain end date is inclusive, i.e. the bound is the next midnight.
+    Raises ValueError for anything else.
+    """
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+        moment = None if day else parse_datetime(value)
+    except ValueError:
+        day = moment = None
+    if day is not None:
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    elif moment is None:
+        raise ValueError(f"Invalid date '{value}'. Use YYYY-MM-DD or an ISO datetime.")
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=dt_timezone.utc)
+    return moment
+
+
+def activity_rows(user=None, start=None, end=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Stream ActivityLog rows as tuples (ACTIVITY_COLUMNS order) with
+    start <= reference_time < end, from the reference_time indexes.
+    """
+    logs = ActivityLog.objects.all()
+    if user is not None:
+        logs = logs.filter(user=user)
+    if start is not None:
+        logs = logs.filter(reference_time__gte=start)
+    if end is not None:
+        logs = logs.filter(reference_time__lt=end)
+    logs = logs.order_by('reference_time', 'id').values_list(*ACTIVITY_COLUMNS.values())
+    return logs.iterator(chunk_size=chunk_size)
+
+
+def subscription_rows(user=None, chunk_size=EXPORT_CHUNK_SIZE):
+    subs = Subscription.objects.all()
+    if user is not None:
+        subs = subs.filter(user=user)
+    subs = subs.order_by('id').values_list(*SUBSCRIPTION_COLUMNS.values())
+    return subs.iterator(chunk_size=chunk_size)
+
+
+def _cell(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(',', ':'))
+    return value
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_cell(v) for v in row])
+
+
+def render_ndjson(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), default=str, separators=(',', ':')) + '\n'
+
+
+def export_lines(dataset, export_format, user=None, start=None, end=None):
+    """
+    Lines of `dataset` ('activity' or 'subscriptions') in `export_format` ('csv' or 'ndjson').
+    start/end only apply to activity; passing them for subscriptions is a ValueError.
+    """
+    if dataset == 'activity':
+        columns, rows = list(ACTIVITY_COLUMNS), activity_rows(user, start, end)
+    elif dataset == 'subscriptions':
+        if start is not None or end is not None:
+            raise ValueError("start and end apply to the activity dataset only.")
+        columns, rows = list(SUBSCRIPTION_COLUMNS), subscription_rows(user)
+    else:
+        raise ValueError(f"Unknown dataset '{dataset}'. Use 'activity' or 'subscriptions'.")
+    if export_format == 'csv':
+        return render_csv(columns, rows)
+    if export_format == 'ndjson':
+        return render_ndjson(columns, rows)
+    raise ValueError(f"Unknown format '{export_format}'. Use {' or '.join(FORMATS)}.")
@@ -0,0 +1,192 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection
+
+from users.models import User
+from .aggregates import record_activity
+from .models import ActivityLog, Habit
+from .outbox import latest_reminder
+
+logger = logging.getLogger(__name__)
+
+# Reply keywords -> ActivityLog.status
+REPLY_STATUSES = {
+    'prayed': 'prayed', 'done': 'prayed', 'yes': 'prayed', 'alhamdulillah': 'prayed', '✅': 'prayed',
+    'late': 'late', 'qada': 'late',
+    'missed': 'missed', 'no': 'missed', 'skip': 'missed', '❌': 'missed',
+}
+
+
+class ActivityBuffer:
+    """
+    Collects ActivityLog rows and writes them with one bulk_create once
+    `max_size` rows are waiting or the oldest has waited `max_age` seconds.
+
+    Post-prayer bursts bring thousands of webhook callbacks a minute; this
+    turns them into a few INSERTs instead of one per callback. Each flush is
+    then folded into the daily summaries. Replies Meta already delivered
+    (same message id) are dropped, and a failed write puts its rows back for
+    the next flush. Rows still in the buffer are lost if the process dies,
+    so keep `max_age` short.
+    """
+
+    def __init__(self, max_size=500, max_age=2.0):
+        self.max_size = max_size
+        self.max_age = max_age
+        self._rows = []
+        self._oldest = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, row):
+        with self._lock:
+            self._rows.append(row)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._rows) >= self.max_size
+            stale = time.monotonic() - self._oldest >= self.max_age
+            if not (full or stale):
+                # Flush a quiet buffer even if no further callbacks arrive
+                self._start_timer()
+        if full or stale:
+            self.flush()
+
+    def _start_timer(self):
+        # Caller holds self._lock
+        if self._timer is None:
+            self._timer = threading.Timer(self.max_age, self._flush_on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_on_timer(self):
+        try:
+            self.flush()
+        except Exception:
+            pass # logged by flush(); the rows wait for the next one
+        finally:
+            # The timer thread opened its own connection; don't leak it
+            connection.close()
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of rows written."""
+        with self._lock:
+            rows, self._rows = self._rows, []
+            self._oldest = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not rows:
+            return 0
+        try:
+            rows = _drop_duplicates(rows)
+            ActivityLog.objects.bulk_create(rows, batch_size=self.max_size, ignore_conflicts=True)
+        except Exception:
+            logger.exception(f"Failed to write {len(rows)} activity logs; keeping them buffered")
+            with self._lock:
+                self._rows[:0] = rows
+                self._oldest = time.monotonic()
+                self._start_timer()
+            raise
+        # The logs are stored; a failure here is repaired by rebuild_summaries
+        record_activity(rows)
+        return len(rows)
+
+
+def _drop_duplicates(rows):
+    """Rows whose WhatsApp message id is already stored (or repeated in `rows`) are skipped."""
+    ids = {row.provider_message_id for row in rows if row.provider_message_id}
+    seen = set(ActivityLog.objects.filter(provider_message_id__in=ids).values_list('provider_message_id', flat=True))
+    unique = []
+    for row in rows:
+        if row.provider_message_id:
+            if row.provider_message_id in seen:
+                continue
+            seen.add(row.provider_message_id)
+        unique.append(row)
+    return unique
+
+
+activity_buffer = ActivityBuffer(
+    max_size=settings.ACTIVITY_BUFFER_SIZE,
+    max_age=settings.ACTIVITY_FLUSH_SECONDS,
+)
+
+
+def parse_reply(message):
+    """(status, text) for an incoming WhatsApp message (text or button reply)."""
+    if message.get('type') == 'button':
+        text = message.get('button', {}).get('payload') or message.get('button', {}).get('text', '')
+    elif message.get('type') == 'interactive':
+        reply = message.get('interactive', {})
+        reply = reply.get('button_reply') or reply.get('list_reply') or {}
+        text = reply.get('id') or reply.get('title', '')
+    else:
+        text = message.get('text', {}).get('body', '')
+    text = text.strip()
+    words = text.lower().split()
+    status = REPLY_STATUSES.get(words[0].strip('.!,')) if words else None
+    return status or 'unknown', text
+
+
+def _find_users(phones):
+    """Cloud API sends numbers without '+'; we store them either way."""
+    candidates = set(phones) | {f"+{p}" for p in phones}
+    users = {}
+    for user_id, phone in User.objects.filter(phone_number__in=candidates).values_list('id', 'phone_number'):
+        users[phone.lstrip('+')] = user_id
+    return users
+
+
+def ingest_webhook(payload, buffer=None):
+    """
+    Record user replies from a WhatsApp webhook payload as ActivityLog rows.
+
+    Each reply is matched to the reminder it answers (the user's latest
+    reminder due at or before the reply) through the (user, reference_time)
+    outbox index. Delivery status callbacks are only counted, and messages
+    with a malformed timestamp are skipped as invalid.
+    """
+    if buffer is None:
+        buffer = activity_buffer
+    messages, statuses = [], 0
+    for entry in payload.get('entry', []):
+        for change in entry.get('changes', []):
+            value = change.get('value', {})
+            messages.extend(value.get('messages', []))
+            statuses += len(value.get('statuses', []))
+
+    recorded = unmatched = invalid = 0
+    if messages:
+        habit, _ = Habit.objects.get_or_create(slug="salah", defaults={"name": "Salah"})
+        users = _find_users({m.get('from', '').lstrip('+') for m in messages})
+        for message in messages:
+            user_id = users.get(message.get('from', '').lstrip('+'))
+            if user_id is None:
+                unmatched += 1
+                continue
+            try:
+                sent_at = datetime.fromtimestamp(int(message.get('timestamp', time.time())), tz=dt_timezone.utc)
+            except (TypeError, ValueError, OverflowError, OSError):
+                invalid += 1
+                continue
+            status, text = parse_reply(message)
+            reminder = latest_reminder(user_id, sent_at)
+            buffer.add(ActivityLog(
+                user_id=user_id,
+                habit=habit,
+                event_type=reminder.event_type if reminder else 'unknown',
+                status=status,
+                reference_time=reminder.reference_time if reminder else sent_at,
+                reflection_note=text if status == 'unknown' else None,
+                provider_message_id=message.get('id') or '',
+            ))
+            recorded += 1
+
+    return {'replies': recorded, 'unmatched': unmatched, 'invalid': invalid, 'statuses': statuses}
@@ -0,0 +1,27 @@
+import uuid
+
+from django.db import connection, transaction
+
+
+def new_owner(worker=''):
+    """A lease owner tag unique to one claim, so a worker only sees rows it won."""
+    return f"{worker}:{uuid.uuid4().hex[:12]}"
+
+
+def lease_rows(model, claimable, candidates, limit, **lease_fields):
+    """
+    Atomically update up to `limit` rows of `candidates` (a queryset already
+    filtered by the `claimable` Q and ordered) with `lease_fields`.
+
+    Where the database supports it, rows are locked with SKIP LOCKED so
+    concurrent workers never wait on each other. SQLite serializes writers, so
+    there a conditional UPDATE acts as the compare-and-set instead: rows
+    another worker leased in between no longer match `claimable`.
+    """
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(candidates.select_for_update(skip_locked=True).values_list('pk', flat=True)[:limit])
+            return model.objects.filter(pk__in=ids).update(**lease_fields)
+
+    ids = list(candidates.values_list('pk', flat=True)[:limit])
+    return model.objects.filter(claimable, pk__in=ids).update(**lease_fields)
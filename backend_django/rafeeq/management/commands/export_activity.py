@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rafeeq.export import FORMATS, export_lines, parse_bound
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Streams ActivityLog (or subscription) history as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--phone', help='Only this user (default: every user).')
+        parser.add_argument('--dataset', choices=['activity', 'subscriptions'], default='activity')
+        parser.add_argument('--format', choices=FORMATS, default='csv', dest='export_format')
+        parser.add_argument('--start', help='reference_time from (YYYY-MM-DD or ISO datetime).')
+        parser.add_argument('--end', help='reference_time up to (inclusive date or exclusive datetime).')
+        parser.add_argument('--output', help='File to write (default: stdout).')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['phone']:
+            try:
+                user = User.objects.get(phone_number=options['phone'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user with phone number {options['phone']}")
+
+        try:
+            lines = export_lines(
+                options['dataset'],
+                options['export_format'],
+                user=user,
+                start=parse_bound(options['start']),
+                end=parse_bound(options['end'], end=True),
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as out:
+            for line in lines:
+                out.write(line)
@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from rafeeq.cohorts import CohortTimes
+from rafeeq.scheduling import EVENT_HORIZON, populate_prayer_events
+
+
+class Command(BaseCommand):
+    help = 'Materializes upcoming prayer events for every Salah subscriber (run daily)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=int, default=int(EVENT_HORIZON.total_seconds() // 3600),
+            help='How far ahead to materialize events.'
+        )
+
+    def handle(self, *args, **options):
+        cohorts = CohortTimes()
+        written = populate_prayer_events(horizon=timedelta(hours=options['hours']), cohorts=cohorts)
+        stats = cohorts.stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Materialized {written} prayer events for {stats['members']} users "
+            f"({stats['cohorts']} cohorts)."
+        ))
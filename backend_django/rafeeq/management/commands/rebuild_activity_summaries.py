@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from rafeeq.aggregates import BACKFILL_CHUNK_SIZE, rebuild_summaries
+from rafeeq.models import ActivityLog
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds DailySummary / UserStats from the full ActivityLog history, in chunks of users'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=BACKFILL_CHUNK_SIZE,
+            help='Users rebuilt per transaction.'
+        )
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='Only rebuild this user id (repeatable).'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options['users'] or (
+            ActivityLog.objects.order_by('user_id').values_list('user_id', flat=True).distinct().iterator()
+        )
+        chunk_size = options['chunk_size']
+
+        users = days = 0
+        chunk = []
+        for user_id in user_ids:
+            chunk.append(user_id)
+            if len(chunk) >= chunk_size:
+                days += rebuild_summaries(chunk)
+                users += len(chunk)
+                self.stdout.write(f"Rebuilt {users} users...")
+                chunk = []
+        if chunk:
+            days += rebuild_summaries(chunk)
+            users += len(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {days} daily summaries for {users} users."))
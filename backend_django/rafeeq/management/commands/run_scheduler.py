@@ -1,19 +1,163 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from datetime import timedelta
+import os
+import socket
 import time
-from users.models import User
-from rafeeq.services import SalahService
+from django.db import transaction
+from rafeeq.cohorts import CohortTimes
+from rafeeq.outbox import enqueue_reminder, local_due_at
+from rafeeq.scheduling import (
+    EVENT_HORIZON, LEASE_DURATION, ReminderQueue, claim_due_events, mark_dispatched, mark_reminded,
+    next_pending_due_at, populate_prayer_events,
+)
+from rafeeq.sharding import Shard
 
 class Command(BaseCommand):
-    help = 'Runs the Rafeeq Intervention Scheduler (Loop)'
+    help = 'Runs the Rafeeq Intervention Scheduler (event-driven)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--refresh', type=int, default=300,
+            help='Seconds between checks for newly subscribed users.'
+        )
+        parser.add_argument(
+            '--rebuild', type=int, default=3600,
+            help='Seconds between full queue rebuilds (picks up preference/location changes).'
+        )
+        parser.add_argument(
+            '--materialized', action='store_true',
+            help='Dispatch from the PrayerEvent table: extended daily, changed subscribers synced every --refresh seconds.'
+        )
+        parser.add_argument(
+            '--extend', type=int, default=86400,
+            help='Seconds between extending the materialized horizon (--materialized).'
+        )
+        parser.add_argument(
+            '--shard', type=int, default=0,
+            help='This worker\'s shard index (users with id %% --shards == --shard).'
+        )
+        parser.add_argument(
+            '--shards', type=int, default=1,
+            help='Total number of scheduler workers splitting the users.'
+        )
+        parser.add_argument(
+            '--lease', type=int, default=int(LEASE_DURATION.total_seconds()),
+            help='Seconds a claimed event stays leased before another worker may take it (--materialized).'
+        )
+        parser.add_argument(
+            '--worker', default=f"{socket.gethostname()}:{os.getpid()}",
+            help='Worker name recorded on leased events.'
+        )
 
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Starting Rafeeq Scheduler...'))
-        
+
+        refresh = timedelta(seconds=options['refresh'])
+        rebuild = timedelta(seconds=options['rebuild'])
+
+        try:
+            shard = Shard(options['shard'], options['shards']).validate()
+        except ValueError as e:
+            raise CommandError(str(e))
+        if shard.count > 1:
+            self.stdout.write(f"Worker {options['worker']} running shard {shard.index + 1}/{shard.count}.")
+
+        if options['materialized']:
+            lease = timedelta(seconds=options['lease'])
+            extend = timedelta(seconds=options['extend'])
+            return self.run_materialized(refresh, extend, shard, options['worker'], lease)
+
+        queue = ReminderQueue(shard=shard)
+        last_rebuild = last_sync = timezone.now()
+        loaded = queue.load_subscribers()
+        self.stdout.write(f"Loaded {loaded} subscribers.")
+        self.report_cohorts(queue)
+
+        while True:
+            try:
+                now = timezone.now()
+                if now - last_rebuild >= rebuild:
+                    last_rebuild = last_sync = now
+                    queue.clear()
+                    queue.load_subscribers()
+                    self.report_cohorts(queue)
+                elif now - last_sync >= refresh:
+                    since, last_sync = last_sync, now
+                    queue.load_subscribers(since=since)
+                    queue.cohorts.prune(before=(now - timedelta(days=1)).date())
+                    self.report_cohorts(queue)
+
+                self.check_interventions(queue, now)
+
+                # Sleep exactly until the next due event (or the next refresh)
+                wait = (last_sync + refresh - timezone.now()).total_seconds()
+                until_due = queue.seconds_until_next(timezone.now())
+                if until_due is not None:
+                    wait = min(wait, until_due)
+                time.sleep(max(wait, 0.0))
+            except KeyboardInterrupt:
+                self.stdout.write(self.style.WARNING('\nStopping Scheduler...'))
+                break
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Error in scheduler loop: {e}'))
+                time.sleep(60) # Wait before retrying
+
+    def run_materialized(self, refresh, extend, shard, worker, lease):
+        """
+        Rolling job + table dispatch: the next 48h of events are materialized
+        once at startup, then only the new horizon slice is added every
+        `extend` (daily), and every `refresh` only subscribers changed since
+        the last sync are re-materialized (deactivated ones are cancelled).
+        Due work is one indexed range query.
+
+        Any number of workers can run this loop: due events are leased to one
+        worker at a time, and expired leases are picked up by the others.
+        """
+        cohorts = CohortTimes()
+        materialized_until = last_sync = None
         while True:
             try:
-                self.check_interventions()
-                # Sleep for 60 seconds
-                time.sleep(60)
+                now = timezone.now()
+                if materialized_until is None:
+                    last_sync = now
+                    written = populate_prayer_events(now=now, horizon=EVENT_HORIZON, cohorts=cohorts, shard=shard)
+                    materialized_until = now + EVENT_HORIZON
+                    self.stdout.write(f"Materialized {written} prayer events.")
+                elif now + EVENT_HORIZON - materialized_until >= extend:
+                    written = populate_prayer_events(
+                        now=now, horizon=EVENT_HORIZON, cohorts=cohorts, shard=shard, start=materialized_until,
+                    )
+                    materialized_until = now + EVENT_HORIZON
+                    cohorts.prune(before=(now - timedelta(days=1)).date())
+                    self.stdout.write(f"Extended the horizon with {written} prayer events.")
+                if now - last_sync >= refresh:
+                    since, last_sync = last_sync, now
+                    written = populate_prayer_events(
+                        now=now, horizon=materialized_until - now, cohorts=cohorts, shard=shard, since=since,
+                    )
+                    if written:
+                        self.stdout.write(f"Re-materialized {written} events for changed subscribers.")
+
+                for event in claim_due_events(now, worker=worker, lease=lease, shard=shard):
+                    try:
+                        # Marking and enqueuing commit together: never lost, never queued twice
+                        with transaction.atomic():
+                            if not mark_dispatched(event):
+                                continue # lease expired and another worker took it
+                            self.dispatch(event.user, {
+                                'event_type': event.event_type,
+                                'due_at': event.due_at,
+                                'action': event.action,
+                            })
+                    except Exception as e:
+                        self.stdout.write(self.style.ERROR(f"Error checking user {event.user.username}: {e}"))
+
+                wait = (last_sync + refresh - timezone.now()).total_seconds()
+                due_at = next_pending_due_at(shard)
+                if due_at is not None:
+                    wait = min(wait, (due_at - timezone.now()).total_seconds())
+                time.sleep(max(wait, 0.0))
             except KeyboardInterrupt:
                 self.stdout.write(self.style.WARNING('\nStopping Scheduler...'))
                 break
@@ -21,31 +165,30 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.ERROR(f'Error in scheduler loop: {e}'))
                 time.sleep(60) # Wait before retrying
 
-    def check_interventions(self):
+    def report_cohorts(self, queue):
+        stats = queue.cohorts.stats()
+        self.stdout.write(
+            f"Cohorts: {stats['cohorts']} for {stats['members']} users. "
+            f"Prayer time computations: {stats['computed']} of {stats['lookups']} lookups "
+            f"({stats['saved']} saved)."
+        )
+
+    def check_interventions(self, queue, now):
         """
-        Check all active users for upcoming interventions.
+        Fire the events that are due and reschedule only those users.
         """
-        # In production, use batching or celery tasks
-        users = User.objects.all()
-        
-        for user in users:
+        for user, event in queue.pop_due(now):
             try:
-                event = SalahService.get_upcoming_event(user)
-                if not event:
-                    continue
-                
-                # Check if event is "Now" (within 2 minute window for demo)
-                # In real prod: Check "10 mins before" vs "Now" vs "10 mins after"
-                
-                # For Phase 1 Demo: Just log what we WOULD do
-                self.stdout.write(f"User {user.phone_number}: Event {event['event_type']} due at {event['due_at'].strftime('%H:%M')}. Action: {event['action'].upper()}")
-                
-                if event['action'] == 'call':
-                    # TODO: Trigger Vapi/Twilio Call
-                    pass
-                elif event['action'] == 'text':
-                    # TODO: Trigger WhatsApp Text
-                    pass
-                    
+                # Ledger: skip if another worker already reminded this user for this event
+                with transaction.atomic():
+                    if mark_reminded(user.pk, event['due_at']):
+                        self.dispatch(user, event)
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f"Error checking user {user.username}: {e}"))
+            # Next event strictly after the one that just fired (rolls over to tomorrow)
+            queue.schedule(user, after=event['due_at'])
+
+    def dispatch(self, user, event):
+        # Only enqueue: run_sender workers do the (slow) network sends
+        if enqueue_reminder(user, event):
+            self.stdout.write(f"User {user.phone_number}: Event {event['event_type']} due at {local_due_at(user, event).strftime('%H:%M')}. Action: {event['action'].upper()} (queued)")
@@ -0,0 +1,84 @@
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+import asyncio
+import os
+import socket
+from messaging.dispatcher import WhatsAppDispatcher
+from rafeeq.outbox import SEND_BATCH_SIZE, ack, ack_sent, already_sent, claim_batch, fail, next_attempt_at, retry_later
+
+
+class Command(BaseCommand):
+    help = 'Drains the Rafeeq outbox (run as many senders as throughput needs)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch', type=int, default=SEND_BATCH_SIZE,
+            help='Messages claimed per round trip.'
+        )
+        parser.add_argument(
+            '--idle', type=float, default=5.0,
+            help='Longest sleep (seconds) when the outbox is empty.'
+        )
+        parser.add_argument(
+            '--worker', default=f"{socket.gethostname()}:{os.getpid()}",
+            help='Sender name recorded on claimed messages.'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Starting Rafeeq Sender...'))
+        try:
+            asyncio.run(self.run(options['worker'], options['batch'], options['idle']))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('\nStopping Sender...'))
+
+    async def run(self, worker, batch, idle):
+        """
+        One event loop and one dispatcher for the life of the process, so
+        connections are reused and the rate limit holds across batches.
+        """
+        async with WhatsAppDispatcher() as dispatcher:
+            while True:
+                try:
+                    sent = await self.drain_once(dispatcher, worker, batch)
+                    if sent:
+                        continue # more may be waiting
+
+                    wait = idle
+                    ready_at = await sync_to_async(next_attempt_at)()
+                    if ready_at is not None:
+                        wait = min(wait, (ready_at - timezone.now()).total_seconds())
+                    await asyncio.sleep(max(wait, 0.0))
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f'Error in sender loop: {e}'))
+                    await asyncio.sleep(60) # Wait before retrying
+
+    async def drain_once(self, dispatcher, worker, batch):
+        """Claim one batch and send it concurrently. Returns the batch size."""
+        messages = await sync_to_async(claim_batch)(worker=worker, limit=batch)
+        await asyncio.gather(*(self.deliver(dispatcher, message) for message in messages))
+        return len(messages)
+
+    async def deliver(self, dispatcher, message):
+        """
+        Send one message and ack it as soon as the provider accepts it, so a
+        slow batch never leaves sent messages waiting on an expiring lease.
+        """
+        if already_sent(message):
+            # An earlier claim sent it but lost its lease before acking
+            await sync_to_async(ack)([message])
+            return
+
+        if message.channel != 'whatsapp':
+            # No call provider is integrated; retrying would only delay the same failure
+            await sync_to_async(fail)(message, f"No sender for channel '{message.channel}'")
+            self.stdout.write(self.style.ERROR(f"No sender for {message.channel.upper()} -> {message.recipient}"))
+            return
+
+        result = await dispatcher.send(message.recipient, message.message)
+        if result.ok:
+            await sync_to_async(ack_sent)(message, result.message_id or '')
+            self.stdout.write(f"{message.channel.upper()} -> {message.recipient}: {message.message}")
+        else:
+            self.stdout.write(self.style.ERROR(f"Error sending to {message.recipient}: {result.error}"))
+            await sync_to_async(retry_later)(message, result.error)
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rafeeq', '0003_prayerevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prayerevent',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='prayerevent',
+            name='lease_owner',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='prayerevent',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('leased', 'Leased'), ('dispatched', 'Dispatched'), ('cancelled', 'Cancelled')], default='pending', max_length=20),
+        ),
+    ]
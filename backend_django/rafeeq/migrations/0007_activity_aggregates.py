@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rafeeq', '0006_outbox_reference_time'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='activity_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('current_streak', models.PositiveIntegerField(default=0)),
+                ('streak_end', models.DateField(blank=True, null=True)),
+                ('longest_streak', models.PositiveIntegerField(default=0)),
+                ('per_prayer', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('statuses', models.JSONField(default=dict)),
+                ('prayed', models.PositiveSmallIntegerField(default=0)),
+                ('late', models.PositiveSmallIntegerField(default=0)),
+                ('missed', models.PositiveSmallIntegerField(default=0)),
+                ('unknown', models.PositiveSmallIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rafeeq', '0007_activity_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['user', 'reference_time'], name='activitylog_user_reference'),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['reference_time'], name='activitylog_reference_time'),
+        ),
+    ]
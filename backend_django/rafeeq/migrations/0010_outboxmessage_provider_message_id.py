@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rafeeq', '0009_subscription_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='provider_message_id',
+            field=models.CharField(blank=True, default='', max_length=128),
+        ),
+    ]
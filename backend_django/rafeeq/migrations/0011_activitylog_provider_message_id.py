@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rafeeq', '0010_outboxmessage_provider_message_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activitylog',
+            name='provider_message_id',
+            field=models.CharField(blank=True, default='', max_length=128),
+        ),
+        migrations.AddConstraint(
+            model_name='activitylog',
+            constraint=models.UniqueConstraint(condition=models.Q(('provider_message_id', ''), _negated=True), fields=('provider_message_id',), name='activitylog_unique_provider_message'),
+        ),
+    ]
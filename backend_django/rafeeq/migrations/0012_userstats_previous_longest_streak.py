@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:05
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def fill_previous_longest(apps, schema_editor):
+    # Same walk as aggregates._recompute_streaks, on the historical models
+    DailySummary = apps.get_model('rafeeq', 'DailySummary')
+    UserStats = apps.get_model('rafeeq', 'UserStats')
+    for stats in UserStats.objects.iterator(chunk_size=500):
+        previous = current = 0
+        end = None
+        days = DailySummary.objects.filter(user_id=stats.user_id).order_by('date').values_list('date', 'prayed', 'late', 'missed')
+        for day, prayed, late, missed in days.iterator(chunk_size=500):
+            if missed:
+                previous, current, end = max(previous, current), 0, None
+            elif prayed + late:
+                if end is not None and day == end + timedelta(days=1):
+                    current += 1
+                else:
+                    previous, current = max(previous, current), 1
+                end = day
+        UserStats.objects.filter(pk=stats.pk).update(previous_longest_streak=previous)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rafeeq', '0011_activitylog_provider_message_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='previous_longest_streak',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_previous_longest, migrations.RunPython.noop),
+    ]
@@ -15,6 +15,7 @@ class Subscription(models.Model):
     is_active = models.BooleanField(default=True)
     preferences = models.JSONField(default=dict) # {method: 'text', intensity: 'steady', prayers: []}
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True) # incremental scheduler syncs
     last_reminded_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
@@ -38,6 +39,129 @@ class ActivityLog(models.Model):
     reference_time = models.DateTimeField() # When was the task due?
     logged_at = models.DateTimeField(auto_now_add=True)
     reflection_note = models.TextField(blank=True, null=True)
+    provider_message_id = models.CharField(max_length=128, blank=True, default='') # WhatsApp "wamid..." of the reply
+
+    class Meta:
+        indexes = [
+            # Range filters for exports/backfills, per user and across all users
+            models.Index(fields=['user', 'reference_time'], name='activitylog_user_reference'),
+            models.Index(fields=['reference_time'], name='activitylog_reference_time'),
+        ]
+        constraints = [
+            # Meta retries webhooks: one row per incoming message
+            models.UniqueConstraint(
+                fields=['provider_message_id'], condition=~models.Q(provider_message_id=''),
+                name='activitylog_unique_provider_message',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.user} - {self.event_type} - {self.status}"
+
+class PrayerEvent(models.Model):
+    """
+    A subscriber's upcoming prayer reminder, materialized ahead of time by
+    populate_prayer_events so the scheduler finds due work with one indexed
+    range query on (status, due_at).
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('leased', 'Leased'), # claimed by a scheduler worker until lease_expires_at
+        ('dispatched', 'Dispatched'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='prayer_events')
+    event_type = models.CharField(max_length=50) # e.g. "fajr"
+    due_at = models.DateTimeField()
+    action = models.CharField(max_length=20, default='text') # 'text' or 'call'
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    lease_owner = models.CharField(max_length=64, blank=True, default='')
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'due_at'], name='prayerevent_status_due'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'event_type', 'due_at'], name='prayerevent_unique_slot'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.event_type} @ {self.due_at} ({self.status})"
+
+class OutboxMessage(models.Model):
+    """
+    An outgoing reminder. The scheduler only enqueues rows here; run_sender
+    workers claim them in batches, send, and ack (or schedule a retry).
+    """
+    CHANNEL_CHOICES = [
+        ('whatsapp', 'WhatsApp'),
+        ('call', 'Call'),
+    ]
+    STATE_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'), # claimed by a sender until lease_expires_at
+        ('sent', 'Sent'),
+        ('failed', 'Failed'), # gave up after MAX_ATTEMPTS
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
+    recipient = models.CharField(max_length=20) # phone number
+    channel = models.CharField(max_length=20, choices=CHANNEL_CHOICES, default='whatsapp')
+    message = models.TextField()
+    dedup_key = models.CharField(max_length=128, unique=True) # one row per reminder, however often enqueued
+    event_type = models.CharField(max_length=50, blank=True, default='') # e.g. "fajr", for matching replies
+    reference_time = models.DateTimeField(null=True, blank=True) # when the reminded prayer was due
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField()
+    lease_owner = models.CharField(max_length=64, blank=True, default='')
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    provider_message_id = models.CharField(max_length=128, blank=True, default='') # e.g. WhatsApp "wamid..."
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['state', 'next_attempt_at'], name='outbox_state_next_attempt'),
+            models.Index(fields=['user', 'reference_time'], name='outbox_user_reference_time'),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} -> {self.recipient} ({self.state})"
+
+class DailySummary(models.Model):
+    """
+    One row per user per local day, folded from ActivityLog as logs arrive
+    (see rafeeq.aggregates). `statuses` keeps the latest status per prayer,
+    so a corrected reply replaces the earlier one instead of counting twice.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_summaries')
+    date = models.DateField()
+    statuses = models.JSONField(default=dict) # {"fajr": "prayed", "asr": "missed", ...}
+    prayed = models.PositiveSmallIntegerField(default=0)
+    late = models.PositiveSmallIntegerField(default=0)
+    missed = models.PositiveSmallIntegerField(default=0)
+    unknown = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'date')
+
+    def __str__(self):
+        return f"{self.user} - {self.date}"
+
+class UserStats(models.Model):
+    """Running per-user totals so stats reads never scan history."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='activity_stats')
+    current_streak = models.PositiveIntegerField(default=0) # consecutive good days ending on streak_end
+    streak_end = models.DateField(null=True, blank=True)
+    longest_streak = models.PositiveIntegerField(default=0)
+    previous_longest_streak = models.PositiveIntegerField(default=0) # longest streak that ended before the current one
+    per_prayer = models.JSONField(default=dict) # {"fajr": {"prayed": 3, "missed": 1, ...}, ...}
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user} stats"
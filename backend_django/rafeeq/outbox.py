@@ -0,0 +1,176 @@
+import math
+from datetime import timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from messaging.dispatcher import MAX_CONCURRENCY, RATE_PER_SECOND, max_send_seconds
+from .leases import lease_rows, new_owner
+from .models import OutboxMessage
+
+SEND_BATCH_SIZE = 100
+# Must outlast a whole claimed batch (each message is acked as it goes): it goes out in
+# waves of MAX_CONCURRENCY, each bounded by the slowest send with all its retries
+SEND_LEASE = timedelta(
+    seconds=math.ceil(SEND_BATCH_SIZE / MAX_CONCURRENCY) * max_send_seconds() + SEND_BATCH_SIZE / RATE_PER_SECOND
+)
+MAX_ATTEMPTS = 6
+RETRY_BASE = timedelta(seconds=30)
+RETRY_MAX = timedelta(hours=1)
+
+CHANNELS = {'text': 'whatsapp', 'call': 'call'}
+
+
+def reminder_key(user_id, event):
+    # The UTC instant, so heap and materialized dispatch agree on the key
+    return f"salah:{user_id}:{event['event_type']}:{event['due_at'].astimezone(dt_timezone.utc).isoformat()}"
+
+
+def local_due_at(user, event):
+    """The event's due time in the user's timezone (materialized events come back from the DB in UTC)."""
+    try:
+        zone = ZoneInfo(user.timezone or "UTC")
+    except Exception:
+        zone = ZoneInfo("UTC")
+    return event['due_at'].astimezone(zone)
+
+
+def reminder_text(user, event):
+    return f"Rafeeq: it's time for {event['event_type'].capitalize()} ({local_due_at(user, event).strftime('%H:%M')})."
+
+
+def enqueue(recipient, message, dedup_key, channel='whatsapp', user_id=None, now=None,
+            event_type='', reference_time=None):
+    """
+    Add a message to the outbox. Enqueuing the same `dedup_key` again is a
+    no-op, so a retried scheduler step can never queue a reminder twice.
+    Returns True when a new row was written.
+    """
+    _, created = OutboxMessage.objects.get_or_create(
+        dedup_key=dedup_key,
+        defaults={
+            'user_id': user_id,
+            'recipient': recipient,
+            'channel': channel,
+            'message': message,
+            'event_type': event_type,
+            'reference_time': reference_time,
+            'next_attempt_at': now or timezone.now(),
+        },
+    )
+    return created
+
+
+def enqueue_reminder(user, event, now=None):
+    return enqueue(
+        recipient=user.phone_number,
+        message=reminder_text(user, event),
+        dedup_key=reminder_key(user.pk, event),
+        channel=CHANNELS.get(event['action'], 'whatsapp'),
+        user_id=user.pk,
+        now=now,
+        event_type=event['event_type'],
+        reference_time=event['due_at'],
+    )
+
+
+def claim_batch(worker='', limit=SEND_BATCH_SIZE, lease=SEND_LEASE, now=None):
+    """
+    Lease up to `limit` messages that are ready to send.
+
+    Ready means pending with next_attempt_at <= now, or 'sending' with an
+    expired lease (the sender crashed before acking, so it goes out again).
+    """
+    now = now or timezone.now()
+    owner = new_owner(worker)
+    claimable = (
+        Q(state='pending', next_attempt_at__lte=now)
+        | Q(state='sending', lease_expires_at__lte=now)
+    )
+    candidates = OutboxMessage.objects.filter(claimable).order_by('next_attempt_at')
+    lease_rows(
+        OutboxMessage, claimable, candidates, limit,
+        state='sending', lease_owner=owner, lease_expires_at=now + lease,
+        attempts=F('attempts') + 1,
+    )
+    return list(OutboxMessage.objects.filter(state='sending', lease_owner=owner).order_by('next_attempt_at'))
+
+
+def ack(messages, now=None):
+    """
+    Mark successfully sent messages. Only rows still leased by the same claim
+    are updated; returns how many were.
+    """
+    by_owner = {}
+    for message in messages:
+        by_owner.setdefault(message.lease_owner, []).append(message.pk)
+    acked = 0
+    for owner, ids in by_owner.items():
+        acked += OutboxMessage.objects.filter(pk__in=ids, state='sending', lease_owner=owner).update(
+            state='sent', sent_at=now or timezone.now(), lease_expires_at=None,
+        )
+    return acked
+
+
+def ack_sent(message, provider_message_id='', now=None):
+    """
+    Mark one message sent right after the provider accepted it, recording the
+    provider's message id. Returns False when the lease was lost; the id is
+    still recorded then, so whichever sender holds the row next acks it
+    instead of sending it again (see already_sent).
+    """
+    won = OutboxMessage.objects.filter(pk=message.pk, state='sending', lease_owner=message.lease_owner).update(
+        state='sent', sent_at=now or timezone.now(), lease_expires_at=None, provider_message_id=provider_message_id,
+    )
+    if not won and provider_message_id:
+        OutboxMessage.objects.filter(pk=message.pk, provider_message_id='').update(provider_message_id=provider_message_id)
+    return bool(won)
+
+
+def already_sent(message):
+    """True if an earlier claim got this message out (provider id recorded) but never acked it."""
+    return bool(message.provider_message_id)
+
+
+def retry_later(message, error, now=None):
+    """
+    Release a failed send: back to pending with exponential backoff, or
+    'failed' once MAX_ATTEMPTS is reached.
+    """
+    now = now or timezone.now()
+    delay = min(RETRY_BASE * 2 ** max(message.attempts - 1, 0), RETRY_MAX)
+    state = 'failed' if message.attempts >= MAX_ATTEMPTS else 'pending'
+    return bool(
+        OutboxMessage.objects.filter(pk=message.pk, state='sending', lease_owner=message.lease_owner).update(
+            state=state, next_attempt_at=now + delay, lease_expires_at=None, last_error=str(error)[:1000],
+        )
+    )
+
+
+def fail(message, error):
+    """Give up on a message that can never be sent (no retries)."""
+    return bool(
+        OutboxMessage.objects.filter(pk=message.pk, state='sending', lease_owner=message.lease_owner).update(
+            state='failed', lease_expires_at=None, last_error=str(error)[:1000],
+        )
+    )
+
+
+def latest_reminder(user_id, before):
+    """
+    The last reminder sent to the user for a prayer due at or before `before`
+    (what a reply is answering). Pending and failed reminders never reached
+    the user, so they are skipped. Indexed on (user, reference_time).
+    """
+    return (
+        OutboxMessage.objects.filter(user_id=user_id, reference_time__lte=before, state='sent')
+        .order_by('-reference_time')
+        .only('event_type', 'reference_time')
+        .first()
+    )
+
+
+def next_attempt_at():
+    message = OutboxMessage.objects.filter(state='pending').order_by('next_attempt_at').only('next_attempt_at').first()
+    return message.next_attempt_at if message else None
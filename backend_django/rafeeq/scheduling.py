@@ -0,0 +1,250 @@
+import heapq
+import itertools
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .cohorts import CohortTimes
+from .leases import lease_rows, new_owner
+from .models import PrayerEvent, Subscription
+from .services import SalahService
+
+EVENT_HORIZON = timedelta(hours=48)
+POPULATE_CHUNK_SIZE = 1000
+LEASE_DURATION = timedelta(seconds=60)
+CLAIM_LIMIT = 500
+
+
+class ReminderQueue:
+    """
+    Min-heap of every subscriber's next due event.
+
+    Instead of recomputing every user on every tick, the scheduler sleeps until
+    the earliest due_at, pops only the events that are due and reschedules just
+    those users. Entries are replaced lazily: when a user is rescheduled, older
+    heap entries for them are skipped when popped.
+    """
+
+    def __init__(self, service=SalahService, cohorts=None, shard=None):
+        self.service = service
+        self.cohorts = cohorts if cohorts is not None else CohortTimes()
+        self.shard = shard
+        self._heap = []  # (due_at, seq, user_id)
+        self._seq = itertools.count()
+        self._users = {}  # user_id -> User
+        self._events = {}  # user_id -> (seq, event)
+
+    def __len__(self):
+        return len(self._events)
+
+    def schedule(self, user, after=None):
+        """Compute and push the user's next event (after `after`, default now)."""
+        event = self.service.get_upcoming_event(user, after=after, cohorts=self.cohorts)
+        if event is None:
+            self._events.pop(user.pk, None)
+            self._users.pop(user.pk, None)
+            return None
+        return self._push(user, event)
+
+    def _push(self, user, event):
+        seq = next(self._seq)
+        self._users[user.pk] = user
+        self._events[user.pk] = (seq, event)
+        heapq.heappush(self._heap, (event['due_at'], seq, user.pk))
+        return event
+
+    def load(self, users):
+        for user in users:
+            self.schedule(user)
+
+    def load_subscribers(self, since=None):
+        """
+        Push every active Salah subscriber (or only those subscribed or changed after `since`).
+        Returns the number of users loaded.
+
+        Uses the bulk service API: one streamed query for all subscribers.
+        """
+        count = 0
+        subscribers = self.service.get_upcoming_events(since=since, cohorts=self.cohorts, shard=self.shard)
+        for subscriber, event in subscribers:
+            self._push(subscriber, event)
+            count += 1
+        return count
+
+    def _discard_stale(self):
+        while self._heap:
+            due_at, seq, user_id = self._heap[0]
+            current = self._events.get(user_id)
+            if current is not None and current[0] == seq:
+                return
+            heapq.heappop(self._heap)
+
+    def next_due_at(self):
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def seconds_until_next(self, now):
+        due_at = self.next_due_at()
+        if due_at is None:
+            return None
+        return max(0.0, (due_at - now).total_seconds())
+
+    def pop_due(self, now):
+        """
+        Remove and return (user, event) for every event due at or before `now`.
+        Popped users have no entry until rescheduled.
+        """
+        due = []
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > now:
+                return due
+            _, _, user_id = heapq.heappop(self._heap)
+            _, event = self._events.pop(user_id)
+            due.append((self._users.pop(user_id), event))
+
+    def clear(self):
+        self.cohorts.clear()
+        self._heap.clear()
+        self._users.clear()
+        self._events.clear()
+
+
+def populate_prayer_events(now=None, horizon=EVENT_HORIZON, cohorts=None, chunk_size=POPULATE_CHUNK_SIZE,
+                           shard=None, since=None, start=None):
+    """
+    Materialize active Salah subscribers' events due in [start, now + horizon)
+    (start defaults to now). Returns the number of rows written.
+
+    Meant to run as a rolling daily job rather than a full rewrite:
+      - at startup / once a day: the whole window, or just the new slice
+        (start = the end of what is already materialized)
+      - every refresh: only subscriptions changed after `since`, so
+        preference or location changes are picked up
+    In the window, each populated user's pending (and cancelled) rows are
+    replaced; leased and dispatched rows are left alone (the unique slot
+    constraint keeps them from being recreated). Pending rows of users who
+    are no longer subscribed are cancelled on every run.
+    """
+    now = now or timezone.now()
+    start = start or now
+    end = now + horizon
+    cohorts = cohorts if cohorts is not None else CohortTimes()
+
+    cancel_unsubscribed_events(shard=shard)
+    written = 0
+    chunk = []
+    for sub in SalahService.iter_subscribers(since=since, chunk_size=chunk_size, shard=shard):
+        chunk.append(sub)
+        if len(chunk) >= chunk_size:
+            written += _write_events(chunk, start, end, cohorts)
+            chunk = []
+    if chunk:
+        written += _write_events(chunk, start, end, cohorts)
+    return written
+
+
+def _write_events(subs, start, end, cohorts):
+    rows = []
+    for sub in subs:
+        for event in SalahService.get_events_between(sub, start, end, prefs=sub.preferences, cohorts=cohorts):
+            rows.append(PrayerEvent(
+                user_id=sub.pk,
+                event_type=event['event_type'],
+                due_at=event['due_at'],
+                action=event['action'],
+            ))
+
+    with transaction.atomic():
+        PrayerEvent.objects.filter(
+            user_id__in=[sub.pk for sub in subs],
+            status__in=('pending', 'cancelled'),
+            due_at__gte=start,
+            due_at__lt=end,
+        ).delete()
+        PrayerEvent.objects.bulk_create(rows, ignore_conflicts=True)
+    return len(rows)
+
+
+def cancel_unsubscribed_events(shard=None):
+    """
+    Cancel pending and leased events of users without an active Salah
+    subscription (a leased one then fails mark_dispatched and is not sent).
+    Returns the number of rows cancelled.
+    """
+    active = Subscription.objects.filter(user_id=OuterRef('user_id'), habit__slug="salah", is_active=True)
+    stale = PrayerEvent.objects.filter(status__in=('pending', 'leased')).filter(~Exists(active))
+    if shard is not None:
+        stale = shard.filter(stale)
+    return stale.update(status='cancelled', lease_owner='', lease_expires_at=None)
+
+
+def claim_due_events(now=None, worker='', lease=LEASE_DURATION, limit=CLAIM_LIMIT, shard=None):
+    """
+    Lease up to `limit` events due at or before `now` to this worker and return them.
+
+    Claimable rows are pending events plus leased ones whose lease has expired
+    (their worker crashed). One range scan on the (status, due_at) index; no
+    astronomy at dispatch time. Call mark_dispatched() before sending each one.
+    """
+    now = now or timezone.now()
+    owner = new_owner(worker)
+    claimable = Q(status='pending', due_at__lte=now) | Q(status='leased', lease_expires_at__lte=now)
+
+    candidates = PrayerEvent.objects.filter(claimable)
+    if shard is not None:
+        candidates = shard.filter(candidates)
+    lease_rows(
+        PrayerEvent, claimable, candidates.order_by('due_at'), limit,
+        status='leased', lease_owner=owner, lease_expires_at=now + lease,
+    )
+
+    return list(
+        PrayerEvent.objects.filter(status='leased', lease_owner=owner)
+        .select_related('user')
+        .order_by('due_at')
+    )
+
+
+def mark_dispatched(event):
+    """
+    Record `event` as sent, if this worker still holds its lease.
+
+    Returns False when the lease was lost (it expired and another worker
+    re-claimed the row); the caller must then skip sending, so an event is
+    never dispatched twice.
+    """
+    won = PrayerEvent.objects.filter(
+        pk=event.pk, status='leased', lease_owner=event.lease_owner,
+    ).update(status='dispatched')
+    if not won:
+        return False
+    event.status = 'dispatched'
+    mark_reminded(event.user_id, event.due_at)
+    return True
+
+
+def mark_reminded(user_id, due_at):
+    """
+    Advance Subscription.last_reminded_at to `due_at`.
+
+    Returns False when it is already at or past `due_at`, i.e. some worker has
+    reminded this user for this event. Used as the dispatch ledger by the
+    in-memory ReminderQueue, where there is no PrayerEvent row.
+    """
+    return bool(
+        Subscription.objects.filter(user_id=user_id, habit__slug="salah", is_active=True)
+        .filter(Q(last_reminded_at__isnull=True) | Q(last_reminded_at__lt=due_at))
+        .update(last_reminded_at=due_at)
+    )
+
+
+def next_pending_due_at(shard=None):
+    """Earliest pending due_at in this worker's shard (None if there is none)."""
+    pending = PrayerEvent.objects.filter(status='pending')
+    if shard is not None:
+        pending = shard.filter(pending)
+    event = pending.order_by('due_at').only('due_at').first()
+    return event.due_at if event else None
@@ -1,72 +1,201 @@
-from datetime import datetime, date as Date
-from zoneinfo import ZoneInfo
-from core.prayer_times import get_prayer_times
+from datetime import datetime, timedelta, date as Date
+from typing import NamedTuple
+
+from core.location import cached_location
+from core.prayer_day import PRAYER_KEYS
+from core.prayer_times import get_prayer_day
+from .cohorts import DEFAULT_METHOD
 from .models import Habit, Subscription
 
+DEFAULT_PRAYERS = ['fajr', 'zuhr', 'asr', 'maghrib', 'isha']
+BULK_CHUNK_SIZE = 2000
+
+
+class Subscriber(NamedTuple):
+    """
+    The columns the scheduler needs from a Salah subscriber, read with one
+    values_list() query instead of loading User and Subscription rows.
+    """
+    pk: int
+    username: str
+    phone_number: str
+    latitude: float
+    longitude: float
+    timezone: str
+    preferences: dict
+
+
+_SUBSCRIBER_COLUMNS = (
+    'user_id', 'user__username', 'user__phone_number',
+    'user__latitude', 'user__longitude', 'user__timezone', 'preferences',
+)
+
+
 class SalahService:
     @staticmethod
-    def get_upcoming_event(user):
+    def get_upcoming_event(user, after=None, cohorts=None):
         """
         Logic:
-        1. Fetch prayer times for user.
+        1. Fetch prayer times for user (shared with their cohort when a
+           CohortTimes is given).
         2. Filter by user's subscribed prayers.
-        3. Identify the NEXT upcoming prayer.
+        3. Identify the NEXT upcoming prayer (after `after`, default: now).
+           If none are left today, roll over to tomorrow (e.g. next day Fajr).
         4. Return event metadata + method info (Call/Text).
         """
-        # Default Settings
-        DEFAULT_PRAYERS = ['fajr', 'zuhr', 'asr', 'maghrib', 'isha']
-        
         # 1. Get User Preferences
         try:
-            subscription = Subscription.objects.get(user=user, habit__slug="salah", is_active=True)
+            subscription = Subscription.objects.get(user_id=user.pk, habit__slug="salah", is_active=True)
             prefs = subscription.preferences or {}
         except Subscription.DoesNotExist:
             return None # Not subscribed
-            
+
+        return SalahService._next_event(user, prefs, after, cohorts)
+
+    @staticmethod
+    def iter_subscribers(users=None, id_range=None, since=None, chunk_size=BULK_CHUNK_SIZE, shard=None):
+        """
+        Stream active Salah subscribers as Subscriber tuples.
+
+        `users` narrows to a User queryset, `id_range` to user ids in [lo, hi),
+        `since` to subscriptions created or changed (re-activated, new
+        preferences) after it and `shard` (a Shard) to one
+        worker's hash partition. One query whatever the
+        number of users; rows are fetched `chunk_size` at a time.
+        """
+        subs = Subscription.objects.filter(habit__slug="salah", is_active=True)
+        if users is not None:
+            subs = subs.filter(user__in=users)
+        if id_range is not None:
+            lo, hi = id_range
+            subs = subs.filter(user_id__gte=lo, user_id__lt=hi)
+        if since is not None:
+            subs = subs.filter(updated_at__gt=since)
+        if shard is not None:
+            subs = shard.filter(subs)
+
+        rows = subs.order_by('user_id').values_list(*_SUBSCRIBER_COLUMNS)
+        for row in rows.iterator(chunk_size=chunk_size):
+            subscriber = Subscriber._make(row)
+            if subscriber.preferences is None:
+                subscriber = subscriber._replace(preferences={})
+            yield subscriber
+
+    @staticmethod
+    def get_upcoming_events(users=None, id_range=None, since=None, after=None, cohorts=None,
+                            chunk_size=BULK_CHUNK_SIZE, shard=None):
+        """
+        Bulk get_upcoming_event: yields (subscriber, event) for every active
+        subscriber (see iter_subscribers for the filters) that has one.
+        """
+        for subscriber in SalahService.iter_subscribers(users, id_range, since, chunk_size, shard):
+            event = SalahService._next_event(subscriber, subscriber.preferences, after, cohorts)
+            if event is not None:
+                yield subscriber, event
+
+    @staticmethod
+    def _next_event(user, prefs, after, cohorts):
+        location = SalahService._location(user)
+        if location is None:
+            return None
+
+        now_user = (after or datetime.now(location.tz)).astimezone(location.tz)
+        today = now_user.date()
+
+        for on_date in (today, today + timedelta(days=1)):
+            events = SalahService._day_events(user, prefs, location, on_date, cohorts)
+            if events is None:
+                return None
+
+            # Find first future event
+            for event in events:
+                if event['due_at'] > now_user:
+                    return event
+
+        return None
+
+    @staticmethod
+    def get_events_between(user, start, end, prefs=None, cohorts=None):
+        """
+        Every subscribed prayer event with start <= due_at < end, in order.
+        Covers each local day the window touches, so a 24-48h window always
+        includes the next day's Fajr.
+        """
+        if prefs is None:
+            try:
+                subscription = Subscription.objects.get(user_id=user.pk, habit__slug="salah", is_active=True)
+                prefs = subscription.preferences or {}
+            except Subscription.DoesNotExist:
+                return []
+
+        location = SalahService._location(user)
+        if location is None:
+            return []
+
+        found = []
+        on_date = start.astimezone(location.tz).date()
+        last_date = end.astimezone(location.tz).date()
+        while on_date <= last_date:
+            events = SalahService._day_events(user, prefs, location, on_date, cohorts)
+            if events is None:
+                return []
+            found.extend(e for e in events if start <= e['due_at'] < end)
+            on_date += timedelta(days=1)
+        return found
+
+    @staticmethod
+    def _location(user):
+        try:
+            # Same Location object for this user on every scheduler tick
+            return cached_location(
+                user.latitude or 0.0,
+                user.longitude or 0.0,
+                user.timezone or "UTC",
+            )
+        except Exception as e:
+            # Fallback for invalid calculation params
+            return None
+
+    @staticmethod
+    def _day_events(user, prefs, location, on_date, cohorts=None):
+        """The user's subscribed events on `on_date`, sorted by due_at (None on error)."""
         selected_prayers = prefs.get('prayers', DEFAULT_PRAYERS)
         if not selected_prayers:
              selected_prayers = DEFAULT_PRAYERS
-             
+        calculation_method = prefs.get('calculation_method', DEFAULT_METHOD)
+        fields = [name for name in PRAYER_KEYS if name in selected_prayers]
+        if not fields:
+            return []
+
         # 2. Calculate Times
-        today = datetime.now().date()
         try:
-             # Basic timezone handling: assumes timezone is valid
-             times_data = get_prayer_times(
-                latitude=user.latitude or 0.0,
-                longitude=user.longitude or 0.0,
-                on_date=today,
-                timezone=user.timezone or "UTC"
-            )
+             if cohorts is not None:
+                 prayer_day = cohorts.times_for(user, on_date, calculation_method)
+             else:
+                 prayer_day = get_prayer_day(
+                    on_date=on_date,
+                    method_key=calculation_method,
+                    location=location,
+                    fields=fields,
+                )
         except Exception as e:
             # Fallback for invalid calculation params
             return None
 
-        # 3. Parse and Find Next Event
-        now_user = datetime.now(ZoneInfo(user.timezone))
+        # 3. Parse Events
         events = []
-        
-        for name, time_str in times_data['times'].items():
-            if name.lower() not in selected_prayers:
+
+        for name in prayer_day.fields:
+            if name not in selected_prayers:
                 continue
-                
-            # Create aware datetime for prayer
-            dt_str = f"{times_data['date']} {time_str}"
-            dt_naive = datetime.strptime(dt_str, "%Y-%m-%d %H:%M")
-            dt_aware = dt_naive.replace(tzinfo=ZoneInfo(user.timezone))
-            
-            events.append((name, dt_aware))
-            
-        events.sort(key=lambda x: x[1])
-        
-        # Find first future event
-        for name, dt in events:
-            if dt > now_user:
-                return {
-                    'event_type': name,
-                    'due_at': dt,
-                    'action': prefs.get('method', 'text'),
-                    'intensity': prefs.get('intensity', 'steady')
-                }
-                
-        # TODO: Handle "Next Day Fajr" lookup if no events left today
-        return None
+
+            events.append({
+                'event_type': name,
+                # Due at the published minute, straight from the UTC instant
+                'due_at': prayer_day.local(name, to_minute=True),
+                'action': prefs.get('method', 'text'),
+                'intensity': prefs.get('intensity', 'steady')
+            })
+
+        events.sort(key=lambda e: e['due_at'])
+        return events
@@ -0,0 +1,26 @@
+from typing import NamedTuple
+
+from django.db.models.functions import Mod
+
+
+class Shard(NamedTuple):
+    """
+    Hash partition of users across scheduler workers: a worker with
+    Shard(index, count) owns every user with user_id % count == index.
+    """
+    index: int
+    count: int
+
+    def validate(self):
+        if self.count < 1 or not 0 <= self.index < self.count:
+            raise ValueError(f"Invalid shard {self.index}/{self.count}.")
+        return self
+
+    def owns(self, user_id):
+        return user_id % self.count == self.index
+
+    def filter(self, queryset, field='user_id'):
+        """Restrict `queryset` to rows whose `field` falls in this shard."""
+        if self.count == 1:
+            return queryset
+        return queryset.alias(_shard=Mod(field, self.count)).filter(_shard=self.index)
@@ -1,3 +1,647 @@
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
 from django.test import TestCase
 
-# Create your tests here.
+from users.models import User
+from .models import Habit, OutboxMessage, PrayerEvent, Subscription
+from . import outbox
+from .scheduling import (
+    ReminderQueue, claim_due_events, mark_dispatched, mark_reminded, next_pending_due_at,
+    populate_prayer_events,
+)
+from .sharding import Shard
+from .services import SalahService
+
+
+def make_subscriber(phone, prayers=None, tz="Europe/London", lat=51.5074, lng=-0.1278):
+    habit, _ = Habit.objects.get_or_create(slug="salah", defaults={"name": "Salah"})
+    user = User.objects.create(username=phone, phone_number=phone, timezone=tz, latitude=lat, longitude=lng)
+    prefs = {"method": "text"}
+    if prayers is not None:
+        prefs["prayers"] = prayers
+    Subscription.objects.create(user=user, habit=habit, preferences=prefs)
+    return user
+
+
+class SalahServiceTests(TestCase):
+    def test_rolls_over_to_next_day_fajr(self):
+        user = make_subscriber("+440001")
+        late_evening = datetime(2025, 3, 1, 23, 30, tzinfo=ZoneInfo("Europe/London"))
+
+        event = SalahService.get_upcoming_event(user, after=late_evening)
+        self.assertEqual(event["event_type"], "fajr")
+        self.assertEqual(event["due_at"].date(), late_evening.date() + timedelta(days=1))
+
+
+class ReminderQueueTests(TestCase):
+    def test_pops_only_due_events_and_reschedules(self):
+        tz = ZoneInfo("Europe/London")
+        start = datetime(2025, 3, 1, 12, 0, tzinfo=tz)
+        early = make_subscriber("+440002", prayers=["asr"])
+        late = make_subscriber("+440003", prayers=["isha"])
+
+        queue = ReminderQueue()
+        queue.schedule(early, after=start)
+        queue.schedule(late, after=start)
+        self.assertEqual(len(queue), 2)
+
+        asr_due = queue.next_due_at()
+        self.assertEqual(queue.pop_due(asr_due - timedelta(seconds=1)), [])
+
+        due = queue.pop_due(asr_due)
+        self.assertEqual([(u.pk, e["event_type"]) for u, e in due], [(early.pk, "asr")])
+        self.assertEqual(len(queue), 1)
+
+        # Rescheduling after the fired event moves the user to tomorrow's Asr
+        user, event = due[0]
+        queue.schedule(user, after=event["due_at"])
+        remaining = queue.pop_due(start + timedelta(days=2))
+        self.assertEqual([e["event_type"] for _, e in remaining], ["isha", "asr"])
+        self.assertEqual(remaining[1][1]["due_at"].date(), start.date() + timedelta(days=1))
+
+    def test_reschedule_replaces_previous_entry(self):
+        user = make_subscriber("+440004", prayers=["zuhr"])
+        start = datetime(2025, 3, 1, 6, 0, tzinfo=ZoneInfo("Europe/London"))
+
+        queue = ReminderQueue()
+        queue.schedule(user, after=start)
+        queue.schedule(user, after=start + timedelta(days=1))
+        due = queue.pop_due(start + timedelta(days=3))
+        self.assertEqual(len(due), 1)
+        self.assertEqual(due[0][1]["due_at"].date(), start.date() + timedelta(days=1))
+
+
+class CohortTests(TestCase):
+    def test_neighbours_share_one_computation(self):
+        from .cohorts import CohortTimes
+
+        start = datetime(2025, 3, 1, 6, 0, tzinfo=ZoneInfo("Europe/London"))
+        users = [make_subscriber(f"+44100{i}", lat=51.5074 + i * 0.0001, lng=-0.1278) for i in range(5)]
+        users.append(make_subscriber("+441009", tz="Asia/Riyadh", lat=21.4225, lng=39.8262))
+
+        cohorts = CohortTimes()
+        queue = ReminderQueue(cohorts=cohorts)
+        for user in users:
+            queue.schedule(user, after=start)
+
+        stats = cohorts.stats()
+        self.assertEqual(stats["cohorts"], 2)
+        self.assertEqual(stats["members"], 6)
+        self.assertEqual(stats["computed"], 2)
+        self.assertEqual(stats["saved"], stats["lookups"] - 2)
+
+        # Cohort times match a direct computation for a member
+        direct = SalahService.get_upcoming_event(users[0], after=start)
+        shared = SalahService.get_upcoming_event(users[0], after=start, cohorts=cohorts)
+        self.assertEqual(direct, shared)
+
+
+class PrayerEventTests(TestCase):
+    def test_populate_covers_next_day_fajr_and_claims_due_rows(self):
+        tz = ZoneInfo("Europe/London")
+        late_evening = datetime(2025, 3, 1, 23, 0, tzinfo=tz)
+        user = make_subscriber("+440010")
+        make_subscriber("+440011", prayers=["isha"])
+
+        written = populate_prayer_events(now=late_evening, horizon=timedelta(hours=24))
+        events = list(PrayerEvent.objects.filter(user=user).order_by('due_at'))
+        self.assertEqual(written, 6)  # 5 for user, next Isha for the other
+        self.assertEqual(events[0].event_type, "fajr")
+        self.assertEqual(events[0].due_at.astimezone(tz).date(), late_evening.date() + timedelta(days=1))
+
+        # Re-running replaces pending rows instead of duplicating them
+        populate_prayer_events(now=late_evening, horizon=timedelta(hours=24))
+        self.assertEqual(PrayerEvent.objects.count(), 6)
+
+        claimed = claim_due_events(events[1].due_at)
+        self.assertEqual([e.event_type for e in claimed], ["fajr", "zuhr"])
+        self.assertEqual(claim_due_events(events[1].due_at), [])
+        self.assertTrue(all(mark_dispatched(e) for e in claimed))
+        self.assertEqual(PrayerEvent.objects.filter(status='dispatched').count(), 2)
+
+    def test_unsubscribed_users_events_are_cancelled(self):
+        start = datetime(2025, 3, 1, 12, 0, tzinfo=ZoneInfo("Europe/London"))
+        user = make_subscriber("+440012", prayers=["asr", "maghrib"])
+        populate_prayer_events(now=start, horizon=timedelta(hours=12))
+        leased = claim_due_events(PrayerEvent.objects.order_by('due_at').first().due_at)
+
+        Subscription.objects.filter(user=user).update(is_active=False)
+        populate_prayer_events(now=start, horizon=timedelta(hours=12))
+        self.assertEqual(set(PrayerEvent.objects.values_list('status', flat=True)), {'cancelled'})
+        self.assertFalse(mark_dispatched(leased[0]))  # cancelled while leased: not sent
+        self.assertEqual(claim_due_events(start + timedelta(days=1)), [])
+
+        # Re-subscribing replaces the cancelled rows
+        sub = Subscription.objects.get(user=user)
+        sub.is_active = True
+        sub.save()
+        populate_prayer_events(now=start, horizon=timedelta(hours=12), since=start - timedelta(days=1))
+        self.assertEqual(PrayerEvent.objects.filter(status='pending').count(), 2)
+
+    def test_rolling_slice_adds_only_new_events(self):
+        start = datetime(2025, 3, 1, 12, 0, tzinfo=ZoneInfo("Europe/London"))
+        make_subscriber("+440013", prayers=["asr"])
+        populate_prayer_events(now=start, horizon=timedelta(hours=48))
+        first = set(PrayerEvent.objects.values_list('pk', flat=True))
+
+        from .cohorts import CohortTimes
+
+        cohorts = CohortTimes()
+        tomorrow = start + timedelta(days=1)
+        written = populate_prayer_events(now=tomorrow, horizon=timedelta(hours=48), cohorts=cohorts,
+                                         start=start + timedelta(hours=48))
+        self.assertEqual(written, 1)  # only the new day's Asr
+        self.assertTrue(first < set(PrayerEvent.objects.values_list('pk', flat=True)))
+        self.assertEqual(cohorts.stats()['computed'], 2)  # the two local days the slice touches, not three
+
+    def test_expired_lease_is_reclaimed_without_double_dispatch(self):
+        tz = ZoneInfo("Europe/London")
+        start = datetime(2025, 3, 1, 12, 0, tzinfo=tz)
+        make_subscriber("+440020", prayers=["asr"])
+        populate_prayer_events(now=start, horizon=timedelta(hours=12))
+        due = PrayerEvent.objects.get().due_at
+
+        (crashed,) = claim_due_events(due, worker="a", lease=timedelta(seconds=30))
+        self.assertEqual(claim_due_events(due + timedelta(seconds=10), worker="b"), [])
+
+        (taken,) = claim_due_events(due + timedelta(seconds=31), worker="b")
+        self.assertEqual(taken.pk, crashed.pk)
+        self.assertFalse(mark_dispatched(crashed))  # worker "a" comes back too late
+        self.assertTrue(mark_dispatched(taken))
+        self.assertFalse(mark_dispatched(taken))
+        self.assertEqual(Subscription.objects.get().last_reminded_at, due)
+
+    def test_shards_partition_users(self):
+        later = datetime.now(ZoneInfo("UTC")) + timedelta(days=2)
+        users = [make_subscriber(f"+44003{i}", prayers=["asr"]) for i in range(6)]
+        seen = []
+        for index in range(3):
+            queue = ReminderQueue(shard=Shard(index, 3))
+            queue.load_subscribers()
+            owned = [user.pk for user, _ in queue.pop_due(later)]
+            self.assertTrue(all(Shard(index, 3).owns(pk) for pk in owned))
+            seen.extend(owned)
+        self.assertEqual(sorted(seen), [u.pk for u in users])
+
+    def test_incremental_sync_sees_changed_subscriptions(self):
+        later = datetime.now(ZoneInfo("UTC")) + timedelta(days=2)
+        user = make_subscriber("+440050", prayers=["asr"])
+        since = datetime.now(ZoneInfo("UTC"))
+        queue = ReminderQueue()
+        self.assertEqual(queue.load_subscribers(since=since), 0)
+
+        sub = Subscription.objects.get(user=user)
+        sub.preferences = {"method": "text", "prayers": ["maghrib"]}
+        sub.save()
+        self.assertEqual(queue.load_subscribers(since=since), 1)
+        self.assertEqual([e["event_type"] for _, e in queue.pop_due(later)], ["maghrib"])
+
+    def test_next_pending_due_at_is_per_shard(self):
+        start = datetime(2025, 3, 1, 12, 0, tzinfo=ZoneInfo("Europe/London"))
+        users = [make_subscriber(f"+44006{i}", prayers=["asr"], lat=51.5 - i * 10) for i in range(2)]
+        populate_prayer_events(now=start, horizon=timedelta(hours=12))
+        for user in users:
+            shard = Shard(user.pk % 2, 2)
+            own = PrayerEvent.objects.get(user=user).due_at
+            self.assertEqual(next_pending_due_at(shard), own)
+
+    def test_materialized_reminder_uses_local_time(self):
+        from io import StringIO
+
+        from .management.commands.run_scheduler import Command
+
+        riyadh = ZoneInfo("Asia/Riyadh")
+        start = datetime(2025, 3, 1, 12, 0, tzinfo=riyadh)
+        user = make_subscriber("+966500001", prayers=["maghrib"], tz="Asia/Riyadh", lat=24.7136, lng=46.6753)
+        populate_prayer_events(now=start, horizon=timedelta(hours=12))
+        (event,) = claim_due_events(start + timedelta(hours=12))
+
+        command = Command(stdout=StringIO())
+        command.dispatch(event.user, {"event_type": "maghrib", "due_at": event.due_at, "action": "text"})
+        local = event.due_at.astimezone(riyadh).strftime("%H:%M")
+        message = OutboxMessage.objects.get(user=user)
+        self.assertEqual(message.message, f"Rafeeq: it's time for Maghrib ({local}).")
+        self.assertIn(f"due at {local}.", command.stdout.getvalue())
+
+        # The heap path passes the same instant as a local datetime: same key, no second message
+        heap_event = {"event_type": "maghrib", "due_at": event.due_at.astimezone(riyadh), "action": "text"}
+        self.assertFalse(outbox.enqueue_reminder(user, heap_event))
+
+    def test_ledger_reminds_once(self):
+        user = make_subscriber("+440040")
+        due = datetime(2025, 3, 1, 17, 0, tzinfo=ZoneInfo("Europe/London"))
+        self.assertTrue(mark_reminded(user.pk, due))
+        self.assertFalse(mark_reminded(user.pk, due))
+        self.assertTrue(mark_reminded(user.pk, due + timedelta(hours=2)))
+
+
+class BulkSalahServiceTests(TestCase):
+    def test_constant_queries_and_matches_single_user_api(self):
+        start = datetime(2025, 3, 1, 12, 0, tzinfo=ZoneInfo("Europe/London"))
+        users = [make_subscriber(f"+44200{i}", lat=51.5 + i) for i in range(8)]
+
+        with self.assertNumQueries(1):
+            results = list(SalahService.get_upcoming_events(after=start, chunk_size=3))
+        self.assertEqual([s.pk for s, _ in results], [u.pk for u in users])
+        for user, (_, event) in zip(users, results):
+            self.assertEqual(event, SalahService.get_upcoming_event(user, after=start))
+
+        lo, hi = users[2].pk, users[5].pk
+        in_range = [s.pk for s, _ in SalahService.get_upcoming_events(id_range=(lo, hi), after=start)]
+        self.assertEqual(in_range, [u.pk for u in users[2:5]])
+
+        subset = User.objects.filter(pk__in=[users[0].pk, users[7].pk])
+        chosen = [s.pk for s, _ in SalahService.get_upcoming_events(users=subset, after=start)]
+        self.assertEqual(chosen, [users[0].pk, users[7].pk])
+
+
+class OutboxTests(TestCase):
+    def test_enqueue_is_idempotent_and_claim_ack_retry(self):
+        user = make_subscriber("+440050")
+        now = datetime(2025, 3, 1, 18, 0, tzinfo=ZoneInfo("UTC"))
+        event = {"event_type": "maghrib", "due_at": now, "action": "text"}
+
+        self.assertTrue(outbox.enqueue_reminder(user, event, now=now))
+        self.assertFalse(outbox.enqueue_reminder(user, event, now=now))
+        outbox.enqueue("+440051", "hello", "other", now=now)
+
+        first = outbox.claim_batch(worker="s1", limit=1, now=now)
+        second = outbox.claim_batch(worker="s2", limit=10, now=now)
+        self.assertEqual(len(first), 1)
+        self.assertEqual(len(second), 1)
+        self.assertEqual(outbox.claim_batch(worker="s3", now=now), [])
+
+        self.assertEqual(outbox.ack(first, now=now), 1)
+        self.assertTrue(outbox.retry_later(second[0], "HTTP 503", now=now))
+        retry = OutboxMessage.objects.get(pk=second[0].pk)
+        self.assertEqual((retry.state, retry.attempts), ("pending", 1))
+        self.assertEqual(outbox.claim_batch(worker="s3", now=now), [])  # backing off
+        self.assertEqual(len(outbox.claim_batch(worker="s3", now=retry.next_attempt_at)), 1)
+
+    def test_send_lease_outlasts_retries(self):
+        from messaging.dispatcher import max_send_seconds
+
+        self.assertGreater(outbox.SEND_LEASE.total_seconds(), max_send_seconds())
+
+    def test_crashed_sender_lease_expires(self):
+        now = datetime(2025, 3, 1, 18, 0, tzinfo=ZoneInfo("UTC"))
+        outbox.enqueue("+440052", "hello", "k", now=now)
+
+        (lost,) = outbox.claim_batch(worker="crashed", lease=timedelta(seconds=60), now=now)
+        self.assertEqual(outbox.claim_batch(worker="s2", now=now + timedelta(seconds=30)), [])
+        (again,) = outbox.claim_batch(worker="s2", now=now + timedelta(seconds=61))
+        self.assertEqual(again.attempts, 2)
+        self.assertEqual(outbox.ack([lost]), 0)  # stale claim cannot ack
+        self.assertEqual(outbox.ack([again]), 1)
+
+
+    def _drain(self, command, batches, **options):
+        from asgiref.sync import async_to_sync
+        from messaging.dispatcher import WhatsAppDispatcher
+
+        async def drain():
+            async with WhatsAppDispatcher(api_url="http://stub", phone_number_id="123", access_token="t",
+                                          **options) as dispatcher:
+                return [await command.drain_once(dispatcher, "s1", batch) for batch in batches]
+        return async_to_sync(drain)()
+
+    def test_sender_rate_limit_holds_across_batches(self):
+        import time
+
+        import httpx
+
+        from .management.commands.run_sender import Command
+
+        now = datetime.now(ZoneInfo("UTC"))
+        for i in range(8):
+            outbox.enqueue(f"+44008{i}", "Fajr", f"rate{i}", now=now)
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, json={"messages": [{"id": "wamid.r"}]}))
+
+        started = time.perf_counter()
+        self.assertEqual(self._drain(Command(), [2, 2, 2, 2], transport=transport, rate_per_second=20, burst=2), [2] * 4)
+        # One dispatcher for every batch: 2 sends at once, then 6 at 20/s
+        self.assertGreaterEqual(time.perf_counter() - started, 0.28)
+        self.assertEqual(OutboxMessage.objects.filter(state="sent").count(), 8)
+
+    def test_sender_acks_each_send_and_retries_failures(self):
+        import json
+
+        import httpx
+
+        from .management.commands.run_sender import Command
+
+        now = datetime.now(ZoneInfo("UTC"))
+        outbox.enqueue("+440053", "Maghrib", "ok", now=now)
+        outbox.enqueue("+500054", "Maghrib", "down", now=now)
+        outbox.enqueue("+440055", "Maghrib", "call", channel="call", now=now)
+
+        def handler(request):
+            to = json.loads(request.content)["to"]
+            if to.startswith("+500"):
+                return httpx.Response(503, text="unavailable")
+            return httpx.Response(200, json={"messages": [{"id": f"wamid.{to}"}]})
+
+        self.assertEqual(self._drain(Command(), [10], transport=httpx.MockTransport(handler), max_retries=0), [3])
+
+        sent = OutboxMessage.objects.get(dedup_key="ok")
+        self.assertEqual((sent.state, sent.provider_message_id), ("sent", "wamid.+440053"))
+        failed = OutboxMessage.objects.get(dedup_key="down")
+        self.assertEqual(failed.state, "pending")
+        self.assertIn("503", failed.last_error)
+        call = OutboxMessage.objects.get(dedup_key="call")
+        self.assertEqual((call.state, call.attempts), ("failed", 1))  # no call provider: not retried
+
+    def test_send_recorded_after_lost_lease_is_not_repeated(self):
+        now = datetime(2025, 3, 1, 18, 0, tzinfo=ZoneInfo("UTC"))
+        outbox.enqueue("+440055", "hello", "slow", now=now)
+        (slow,) = outbox.claim_batch(worker="slow", lease=timedelta(seconds=60), now=now)
+        (again,) = outbox.claim_batch(worker="s2", now=now + timedelta(seconds=61))
+
+        # The slow sender's message went out after its lease expired
+        self.assertFalse(outbox.ack_sent(slow, "wamid.1"))
+        again.refresh_from_db()
+        self.assertTrue(outbox.already_sent(again))
+        self.assertEqual(outbox.ack([again]), 1)
+
+
+class WebhookIngestTests(TestCase):
+    def _reply(self, phone, body, when, message_id=None):
+        return {"from": phone.lstrip("+"), "id": message_id or f"wamid.{phone}.{body}",
+                "timestamp": str(int(when.timestamp())), "type": "text", "text": {"body": body}}
+
+    def test_replies_are_buffered_and_matched_to_their_reminder(self):
+        from .ingest import ActivityBuffer, ingest_webhook
+        from .models import ActivityLog
+
+        user = make_subscriber("+440060")
+        asr = datetime(2025, 3, 1, 15, 30, tzinfo=ZoneInfo("UTC"))
+        maghrib = datetime(2025, 3, 1, 17, 50, tzinfo=ZoneInfo("UTC"))
+        isha = datetime(2025, 3, 1, 19, 10, tzinfo=ZoneInfo("UTC"))
+        for event_type, due_at in (("asr", asr), ("maghrib", maghrib), ("isha", isha)):
+            outbox.enqueue_reminder(user, {"event_type": event_type, "due_at": due_at, "action": "text"})
+        # Isha never went out: a reply after it still answers Maghrib
+        OutboxMessage.objects.exclude(event_type="isha").update(state="sent")
+        OutboxMessage.objects.filter(event_type="isha").update(state="failed")
+
+        payload = {"entry": [{"changes": [{"value": {
+            "messages": [
+                self._reply("+440060", "Prayed!", asr + timedelta(minutes=20)),
+                self._reply("+440060", "late", isha + timedelta(minutes=5)),
+                self._reply("+449999", "prayed", maghrib),
+            ],
+            "statuses": [{"id": "wamid.y", "status": "delivered"}],
+        }}]}]}
+        buffer = ActivityBuffer(max_size=100, max_age=60)
+        counts = ingest_webhook(payload, buffer=buffer)
+        self.assertEqual(counts, {"replies": 2, "unmatched": 1, "invalid": 0, "statuses": 1})
+        self.assertEqual(ActivityLog.objects.count(), 0)  # still buffered
+
+        self.assertEqual(buffer.flush(), 2)
+        logs = list(ActivityLog.objects.order_by("reference_time").values_list("event_type", "status", "reference_time"))
+        self.assertEqual(logs, [("asr", "prayed", asr), ("maghrib", "late", maghrib)])
+
+    def test_redelivered_and_malformed_replies(self):
+        from .ingest import ActivityBuffer, ingest_webhook
+        from .models import ActivityLog, DailySummary
+
+        make_subscriber("+440062")
+        when = datetime(2025, 3, 1, 13, 0, tzinfo=ZoneInfo("UTC"))
+        reply = self._reply("+440062", "prayed", when, "wamid.1")
+        bad = dict(self._reply("+440062", "prayed", when, "wamid.2"), timestamp="yesterday")
+        payload = {"entry": [{"changes": [{"value": {"messages": [reply, reply, bad]}}]}]}
+
+        buffer = ActivityBuffer(max_size=100, max_age=60)
+        self.assertEqual(ingest_webhook(payload, buffer=buffer)["invalid"], 1)
+        self.assertEqual(buffer.flush(), 1)
+        # Meta retries the same callback: nothing new is stored or counted
+        ingest_webhook(payload, buffer=buffer)
+        self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(ActivityLog.objects.count(), 1)
+        self.assertEqual(DailySummary.objects.get().prayed, 1)
+
+    def test_failed_flush_keeps_rows(self):
+        from unittest import mock
+        from .ingest import ActivityBuffer
+        from .models import ActivityLog
+
+        user = make_subscriber("+440063")
+        habit = Habit.objects.get(slug="salah")
+        buffer = ActivityBuffer(max_size=100, max_age=60)
+        now = datetime(2025, 3, 1, 12, 0, tzinfo=ZoneInfo("UTC"))
+        buffer.add(ActivityLog(user=user, habit=habit, event_type="zuhr", status="prayed", reference_time=now))
+        with mock.patch.object(ActivityLog.objects, "bulk_create", side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                buffer.flush()
+        self.assertEqual(len(buffer), 1)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(ActivityLog.objects.count(), 1)
+
+    def test_buffer_flushes_on_size(self):
+        from .ingest import ActivityBuffer
+        from .models import ActivityLog
+
+        user = make_subscriber("+440061")
+        habit = Habit.objects.get(slug="salah")
+        buffer = ActivityBuffer(max_size=3, max_age=60)
+        now = datetime(2025, 3, 1, 12, 0, tzinfo=ZoneInfo("UTC"))
+        for _ in range(4):
+            buffer.add(ActivityLog(user=user, habit=habit, event_type="zuhr", status="prayed", reference_time=now))
+        self.assertEqual(ActivityLog.objects.count(), 3)
+        self.assertEqual(len(buffer), 1)
+        buffer.flush()
+
+    def test_webhook_endpoint(self):
+        from django.test import override_settings
+
+        with override_settings(WHATSAPP_VERIFY_TOKEN="secret"):
+            ok = self.client.get("/webhooks/whatsapp/", {"hub.mode": "subscribe", "hub.verify_token": "secret", "hub.challenge": "42"})
+            bad = self.client.get("/webhooks/whatsapp/", {"hub.mode": "subscribe", "hub.verify_token": "nope", "hub.challenge": "42"})
+        self.assertEqual((ok.status_code, ok.content), (200, b"42"))
+        self.assertEqual(bad.status_code, 403)
+
+        import hashlib
+        import hmac
+
+        body = b'{"entry": []}'
+        self.assertEqual(self.client.post("/webhooks/whatsapp/", body, content_type="application/json").status_code, 403)
+        with override_settings(WHATSAPP_APP_SECRET="app-secret"):
+            signature = "sha256=" + hmac.new(b"app-secret", body, hashlib.sha256).hexdigest()
+            response = self.client.post("/webhooks/whatsapp/", body, content_type="application/json",
+                                        headers={"X-Hub-Signature-256": signature})
+            forged = self.client.post("/webhooks/whatsapp/", body, content_type="application/json",
+                                      headers={"X-Hub-Signature-256": "sha256=00"})
+        self.assertEqual(response.json(), {"replies": 0, "unmatched": 0, "invalid": 0, "statuses": 0})
+        self.assertEqual(forged.status_code, 403)
+
+
+class ActivityAggregateTests(TestCase):
+    def _log(self, user, day, event_type, status):
+        from .models import ActivityLog
+
+        habit = Habit.objects.get(slug="salah")
+        when = datetime(2025, 3, day, 13, 0, tzinfo=ZoneInfo("Europe/London"))
+        return ActivityLog(user=user, habit=habit, event_type=event_type, status=status, reference_time=when)
+
+    def test_incremental_matches_backfill(self):
+        from .aggregates import rebuild_summaries, user_stats
+        from .ingest import ActivityBuffer
+        from .models import DailySummary, UserStats
+
+        user = make_subscriber("+440070")
+        buffer = ActivityBuffer(max_size=2, max_age=60)
+        history = [
+            (1, "fajr", "prayed"), (1, "zuhr", "late"),
+            (2, "fajr", "missed"),
+            (3, "fajr", "prayed"), (4, "asr", "prayed"), (5, "isha", "prayed"),
+            (2, "fajr", "prayed"),  # correction: day 2 becomes good, joining 1..5
+        ]
+        for day, event_type, status in history:
+            buffer.add(self._log(user, day, event_type, status))
+        buffer.flush()
+
+        stats = user_stats(user, today=date(2025, 3, 5), weeks=2)
+        self.assertEqual(stats["current_streak"], 5)
+        self.assertEqual(stats["longest_streak"], 5)
+        self.assertEqual(stats["weekly_adherence"][0]["adherence"], 100.0)
+        self.assertIsNone(stats["weekly_adherence"][1]["adherence"])
+        self.assertEqual(stats["miss_rate"]["fajr"], 0.0)
+        self.assertEqual(user_stats(user, today=date(2025, 3, 8))["current_streak"], 0)
+
+        incremental = (
+            list(DailySummary.objects.order_by("date").values_list("date", "prayed", "late", "missed")),
+            UserStats.objects.values_list("current_streak", "longest_streak", "streak_end", "per_prayer").get(),
+        )
+        rebuild_summaries([user.pk])
+        rebuilt = (
+            list(DailySummary.objects.order_by("date").values_list("date", "prayed", "late", "missed")),
+            UserStats.objects.values_list("current_streak", "longest_streak", "streak_end", "per_prayer").get(),
+        )
+        self.assertEqual(incremental, rebuilt)
+
+    def test_out_of_order_logs_match_rebuild(self):
+        from .aggregates import rebuild_summaries
+        from .ingest import ActivityBuffer
+        from .models import UserStats
+
+        user = make_subscriber("+440072")
+        buffer = ActivityBuffer(max_size=1, max_age=60)  # one flush per log
+        history = [
+            (1, "fajr", "prayed"), (2, "fajr", "prayed"), (3, "fajr", "prayed"),
+            (5, "fajr", "missed"),
+            (4, "fajr", "prayed"),  # backdated: the later miss still ends the streak
+            (2, "zuhr", "missed"),  # the 3-day streak never happened
+        ]
+        for day, event_type, status in history:
+            buffer.add(self._log(user, day, event_type, status))
+
+        fields = ("current_streak", "longest_streak", "streak_end", "previous_longest_streak")
+        incremental = UserStats.objects.values_list(*fields).get()
+        self.assertEqual(incremental, (0, 2, None, 2))
+        rebuild_summaries([user.pk])
+        self.assertEqual(UserStats.objects.values_list(*fields).get(), incremental)
+
+    def test_latest_day_changes_do_not_walk_history(self):
+        from unittest import mock
+
+        from . import aggregates
+        from .ingest import ActivityBuffer
+        from .models import UserStats
+
+        user = make_subscriber("+440073")
+        buffer = ActivityBuffer(max_size=1, max_age=60)
+        for day in (1, 2, 4, 5, 6):
+            buffer.add(self._log(user, day, "fajr", "prayed"))
+
+        fields = ("current_streak", "longest_streak", "streak_end", "previous_longest_streak")
+        walk = mock.patch.object(aggregates, "_recompute_streaks", side_effect=AssertionError("walked the history"))
+        with walk:
+            buffer.add(self._log(user, 6, "zuhr", "missed"))  # a miss after a "prayed" on the same day
+        self.assertEqual(UserStats.objects.values_list(*fields).get(), (0, 2, None, 2))
+        buffer.add(self._log(user, 6, "zuhr", "prayed"))  # un-missing a day walks: its earlier state is gone
+        self.assertEqual(UserStats.objects.values_list(*fields).get(), (3, 3, date(2025, 3, 6), 2))
+
+        incremental = UserStats.objects.values_list(*fields).get()
+        aggregates.rebuild_summaries([user.pk])
+        self.assertEqual(UserStats.objects.values_list(*fields).get(), incremental)
+
+    def test_miss_ends_streak_and_endpoint_reads_aggregates(self):
+        from .aggregates import record_activity
+        from .models import ActivityLog
+
+        user = make_subscriber("+440071")
+        logs = [self._log(user, 1, "fajr", "prayed"), self._log(user, 2, "fajr", "prayed"), self._log(user, 3, "asr", "missed")]
+        ActivityLog.objects.bulk_create(logs)
+        record_activity(logs)
+
+        self.assertEqual(self.client.get("/rafeeq/stats/", {"phone_number": "+440071"}).status_code, 401)
+        other = make_subscriber("+440074")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get("/rafeeq/stats/", {"phone_number": "+440071"}).status_code, 403)
+
+        self.client.force_login(user)
+        with self.assertNumQueries(4):  # session, login user, stats, summaries
+            response = self.client.get("/rafeeq/stats/", {"weeks": 1})
+        body = response.json()
+        self.assertEqual((body["current_streak"], body["longest_streak"]), (0, 2))
+        self.assertEqual(self.client.get("/rafeeq/stats/", {"phone_number": "+440071", "weeks": 99}).status_code, 400)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        from .models import ActivityLog
+
+        self.user = make_subscriber("+440080")
+        other = make_subscriber("+440081")
+        habit = Habit.objects.get(slug="salah")
+        ActivityLog.objects.bulk_create([
+            ActivityLog(user=user, habit=habit, event_type="fajr", status="prayed",
+                        reference_time=datetime(2025, 3, day, 5, 30, tzinfo=ZoneInfo("UTC")))
+            for user in (self.user, other) for day in (1, 2, 3)
+        ])
+        self.client.force_login(self.user)
+
+    def test_streams_csv_for_a_range(self):
+        response = self.client.get("/rafeeq/export/", {
+            "phone_number": "+440080", "start": "2025-03-02", "end": "2025-03-03",
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:3], ["user_id", "phone_number", "habit"])
+        self.assertEqual(len(lines), 3)  # header + 2 and 3 March
+        self.assertIn("2025-03-02T05:30:00+00:00", lines[1])
+
+    def test_ndjson_and_errors(self):
+        import json
+
+        response = self.client.get("/rafeeq/export/", {"phone_number": "+440080", "output": "ndjson", "dataset": "subscriptions"})
+        (record,) = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual((record["phone_number"], record["preferences"]), ("+440080", {"method": "text"}))
+
+        self.assertEqual(self.client.get("/rafeeq/export/", {"dataset": "subscriptions", "start": "2025-03-01"}).status_code, 400)
+        self.assertEqual(self.client.get("/rafeeq/export/", {"phone_number": "+440080", "start": "March"}).status_code, 400)
+        self.assertEqual(self.client.get("/rafeeq/export/", {"phone_number": "+440080", "output": "xml"}).status_code, 400)
+
+    def test_requires_owner_or_staff(self):
+        self.assertEqual(self.client.get("/rafeeq/export/", {"phone_number": "+440081"}).status_code, 403)
+        # Without phone_number a user gets only their own history
+        lines = b"".join(self.client.get("/rafeeq/export/").streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+
+        self.client.logout()
+        self.assertEqual(self.client.get("/rafeeq/export/", {"phone_number": "+440080"}).status_code, 401)
+
+        staff = User.objects.create(username="admin", phone_number="+440089", is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get("/rafeeq/export/", {"phone_number": "+440081"}).status_code, 200)
+        lines = b"".join(self.client.get("/rafeeq/export/").streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 7)  # header + every user's rows
+
+    def test_command_exports_every_user(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command("export_activity", "--format", "ndjson", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 6)
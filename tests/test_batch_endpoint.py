@@ -0,0 +1,25 @@
+from fastapi.testclient import TestClient
+from api.main import app
+import json
+
+client = TestClient(app)
+
+
+def test_batch_streams_ndjson_with_inline_errors():
+    payload = {
+        "queries": [
+            {"latitude": 51.5074, "longitude": -0.1278, "date": "2025-03-01", "timezone": "Europe/London"},
+            {"latitude": 21.4225, "longitude": 39.8262, "date": "2025-03-01", "timezone": "Not/AZone"},
+            {"latitude": 59.91, "longitude": 10.75, "date": "2025-06-21", "timezone": "Europe/Oslo", "method": "ISNA"},
+            {"latitude": 0.0, "longitude": 0.0, "date": "2025-03-01", "method": "NOPE"},
+        ]
+    }
+    response = client.post("/times/batch", json=payload)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["index"] for line in lines] == [0, 1, 2, 3]
+    assert [line["status"] for line in lines] == ["ok", "error", "ok", "error"]
+    assert lines[0]["result"]["timezone"] == "Europe/London"
+    assert lines[2]["result"]["high_latitude_fallback"]["fajr"] is True
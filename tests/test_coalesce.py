@@ -0,0 +1,49 @@
+import threading
+import time
+
+import pytest
+
+from api.coalesce import SingleFlight
+
+
+def test_concurrent_identical_calls_share_one_computation():
+    flight = SingleFlight()
+    calls = []
+    gate = threading.Event()
+
+    def compute():
+        calls.append(1)
+        gate.wait(timeout=5)
+        return {"answer": 42}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", compute))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    # Let every thread join the in-flight call before releasing it
+    deadline = time.monotonic() + 5
+    while flight.stats()["coalesced"] < 7 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    gate.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert len(results) == 8
+    assert all(r is results[0] for r in results)
+    assert flight.stats() == {"in_flight": 0, "executed": 1, "coalesced": 7}
+
+    # Once finished, the next call computes again
+    flight.do("key", compute)
+    assert len(calls) == 2
+
+
+def test_errors_propagate_and_do_not_stick():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flight.do("key", fail)
+    assert flight.do("key", lambda: "ok") == "ok"
@@ -0,0 +1,66 @@
+import time
+from datetime import date
+
+import pytest
+
+from api import tasks
+from api.executor import ComputeBusy, ComputePool, ComputeTimeout
+
+
+def test_inline_mode_calls_directly():
+    pool = ComputePool(mode="inline")
+    assert pool.run(pow, 2, 10) == 1024
+    assert list(pool.map_ordered(pow, [(2, 1), (2, 2)], window=4)) == [2, 4]
+    assert pool.stats()["submitted"] == 0
+
+
+def test_process_mode_offloads_bounds_and_times_out():
+    pool = ComputePool(mode="process", workers=2, max_pending=1, timeout=0.2)
+    try:
+        result = pool.run(tasks.times_range, 51.5074, -0.1278, date(2025, 1, 1), date(2025, 1, 31), "MWL", "Europe/London")
+        assert len(result["dates"]) == 31
+
+        # Ordered streaming over the pool (max_pending=1 forces the inline fallback too)
+        assert list(pool.map_ordered(pow, [(2, i) for i in range(5)], window=2)) == [1, 2, 4, 8, 16]
+
+        slow = pool.submit(time.sleep, 0.5)
+        with pytest.raises(ComputeBusy):
+            pool.submit(pow, 2, 2)
+        with pytest.raises(ComputeTimeout):
+            pool.result(slow)
+        assert pool.stats()["rejected"] >= 1
+        assert pool.stats()["timed_out"] == 1
+    finally:
+        pool.shutdown()
+    assert not pool.enabled
+
+
+def test_stuck_workers_are_recycled():
+    pool = ComputePool(mode="process", workers=1, max_pending=1, timeout=0.5, max_timeouts=1)
+    try:
+        assert pool.run(pow, 2, 3) == 8  # worker running
+        with pytest.raises(ComputeTimeout):
+            pool.run(time.sleep, 30)
+        assert pool.stats()["recycled"] == 1
+
+        # The killed worker gave its slot back; a fresh pool serves the next task
+        deadline = time.monotonic() + 5
+        while True:
+            try:
+                assert pool.run(pow, 2, 4) == 16
+                break
+            except ComputeBusy:
+                assert time.monotonic() < deadline
+                time.sleep(0.05)
+    finally:
+        pool.shutdown()
+
+
+def test_map_ordered_reports_failed_tasks_in_place():
+    pool = ComputePool(mode="process", workers=2, max_pending=4, timeout=0.5)
+    try:
+        results = pool.map_ordered(time.sleep, [(0,), (1.5,), (0,)], window=3,
+                                   on_error=lambda args, error: f"failed {args}: {type(error).__name__}")
+        assert list(results) == [None, "failed (1.5,): ComputeTimeout", None]
+    finally:
+        pool.shutdown()
@@ -0,0 +1,165 @@
+from datetime import date
+
+from core import solar_calculations as solar
+from core.prayer_times import get_prayer_times
+
+
+def test_solar_state_cache_shared_across_locations():
+    solar.clear_solar_state_cache()
+    on_date = date(2025, 3, 14)
+
+    london = get_prayer_times(latitude=51.5074, longitude=-0.1278, on_date=on_date, timezone="Europe/London")
+    first = solar.solar_state_cache_info()
+    # One state for 12:00 UTC of the date + one for London's noon instant
+    assert first.misses == 2
+    assert first.hits > 0
+
+    # Same answer from the cache
+    assert get_prayer_times(latitude=51.5074, longitude=-0.1278, on_date=on_date, timezone="Europe/London") == london
+    assert solar.solar_state_cache_info().misses == 2
+
+    # A different city on the same date only adds its own noon instant
+    get_prayer_times(latitude=21.4225, longitude=39.8262, on_date=on_date, timezone="Asia/Riyadh")
+    assert solar.solar_state_cache_info().misses == 3
+
+
+def test_ephemeris_table_mode(tmp_path):
+    from core import ephemeris
+
+    path = ephemeris.build_table(tmp_path / "ephemeris.bin", date(2024, 1, 1), date(2026, 12, 31))
+    table = ephemeris.EphemerisTable(path)
+    assert table.start == date(2024, 1, 1)
+    assert table.end == date(2026, 12, 31)
+    assert ephemeris.validate_table(table, stride_days=5)["within_tolerance"]
+
+    kwargs = dict(latitude=59.91, longitude=10.75, on_date=date(2025, 6, 21), timezone="Europe/Oslo")
+    noaa = get_prayer_times(**kwargs)
+    try:
+        solar.set_solar_model("table", path)
+        assert solar.get_solar_model() == "table"
+        assert get_prayer_times(**kwargs) == noaa
+    finally:
+        solar.set_solar_model("noaa")
+
+
+def test_location_object_matches_coordinates():
+    from core.location import Location, cached_location
+
+    on_date = date(2025, 12, 21)
+    oslo = Location(59.91, 10.75, "Europe/Oslo")
+    assert not hasattr(oslo, "__dict__")
+
+    by_location = get_prayer_times(on_date=on_date, method_key="ISNA", location=oslo)
+    by_coordinates = get_prayer_times(
+        latitude=59.91, longitude=10.75, on_date=on_date, method_key="ISNA", timezone="Europe/Oslo"
+    )
+    assert by_location == by_coordinates
+    assert cached_location(59.91, 10.75, "Europe/Oslo") is cached_location(59.91, 10.75, "Europe/Oslo")
+
+
+def test_custom_method_registration():
+    import dataclasses
+
+    import pytest
+
+    from core.method_plans import get_plan, register_method
+    from core.methods import METHODS
+
+    plan = get_plan("UMM_AL_QURA")
+    assert plan.isha_strategy == "minutes"
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        plan.asr_factor = 2
+
+    with pytest.raises(ValueError):
+        register_method("MWL", {"name": "Overwrite", "fajr_angle": 18.0, "isha_angle": 17.0})
+    with pytest.raises(ValueError):
+        register_method("BAD", {"name": "Both", "fajr_angle": 18.0, "isha_angle": 17.0, "isha_minutes": 90})
+    with pytest.raises(ValueError):
+        register_method("BAD", {"name": "Offsets", "fajr_angle": 18.0, "isha_angle": 17.0, "offsets": {"dhuha": 5}})
+
+    # Same parameters as ISNA under a new key -> same times
+    register_method("TEST_LOCAL", {"name": "Local Mosque", "fajr_angle": 15.0, "isha_angle": 15.0})
+    assert "TEST_LOCAL" in METHODS
+    kwargs = dict(latitude=40.71, longitude=-74.0, on_date=date(2025, 9, 1), timezone="America/New_York")
+    local = get_prayer_times(method_key="TEST_LOCAL", **kwargs)
+    isna = get_prayer_times(method_key="ISNA", **kwargs)
+    assert local["method"] == "Local Mosque"
+    assert local["times"] == isna["times"]
+
+
+def test_range_matches_single_days():
+    from datetime import timedelta
+
+    from core.prayer_calendar import get_prayer_times_range
+
+    start = date(2025, 6, 1)
+    result = get_prayer_times_range(
+        latitude=59.91, longitude=10.75, start=start, end=date(2025, 6, 30), timezone="Europe/Oslo"
+    )
+    assert len(result["dates"]) == 30
+    assert all(len(column) == 30 for column in result["times"].values())
+
+    for i in (0, 14, 29):
+        single = get_prayer_times(latitude=59.91, longitude=10.75, on_date=start + timedelta(days=i), timezone="Europe/Oslo")
+        assert {key: column[i] for key, column in result["times"].items()} == single["times"]
+        assert result["high_latitude_fallback"]["fajr"][i] == single["high_latitude_fallback"]["fajr"]
+
+
+def test_prayer_day_formats_lazily():
+    from core.prayer_day import PRAYER_KEYS
+    from core.prayer_times import get_prayer_day
+
+    # Oslo in June: Isha falls back to the middle of the night
+    kwargs = dict(latitude=59.91, longitude=10.75, on_date=date(2025, 6, 21), timezone="Europe/Oslo")
+    day = get_prayer_day(**kwargs)
+
+    assert day.to_dict() == get_prayer_times(**kwargs)
+    assert day.isha_fallback
+    for name in PRAYER_KEYS:
+        assert isinstance(day.epoch(name), int)
+        local = day.local(name, to_minute=True)
+        assert local.strftime("%H:%M") == day.hhmm(name) and local.second == 0
+        assert day.iso(name).startswith("2025-06-2")
+    assert day.to_dict("epoch")["times"]["zuhr"] == day.zuhr
+
+
+def test_fields_compute_only_what_is_asked():
+    import pytest
+
+    from core.prayer_times import get_prayer_day
+
+    # Oslo in June needs sunrise and sunset for the Isha fallback even when only Isha is asked for
+    kwargs = dict(latitude=59.91, longitude=10.75, on_date=date(2025, 6, 21), timezone="Europe/Oslo")
+    full = get_prayer_times(**kwargs)
+    isha = get_prayer_times(**kwargs, fields=["isha"])
+    assert isha["times"] == {"isha": full["times"]["isha"]}
+    assert isha["high_latitude_fallback"] == {"fajr": None, "isha": True, "method": "middle_of_the_night"}
+
+    day = get_prayer_day(**kwargs, fields="zuhr, asr_hanafi")
+    assert day.fields == ("zuhr", "asr_hanafi")
+    assert day.hhmm("asr_hanafi") == full["times"]["asr_hanafi"]
+    with pytest.raises(KeyError):
+        day.epoch("fajr")
+
+
+def test_solver_reports_unreachable_altitude_without_raising():
+    import math
+
+    import pytest
+
+    from core.location import cached_location
+
+    oslo = cached_location(59.91, 10.75, "Europe/Oslo")
+    sin_fajr = math.sin(math.radians(-18.0))
+
+    summer = solar.solve_sin_altitude_at(oslo, date(2025, 6, 21), sin_altitude=sin_fajr, direction="before")
+    assert not summer.reachable and summer.time is None and summer.status == "unreachable"
+    # The raising API keeps its behaviour
+    with pytest.raises(ValueError):
+        solar.time_when_sun_reaches_sin_altitude_at(oslo, date(2025, 6, 21), sin_altitude=sin_fajr, direction="before")
+
+    winter = solar.solve_sin_altitude_at(oslo, date(2025, 1, 15), sin_altitude=sin_fajr, direction="before")
+    assert winter.reachable
+    assert winter.time == solar.time_when_sun_reaches_sin_altitude_at(
+        oslo, date(2025, 1, 15), sin_altitude=sin_fajr, direction="before"
+    )
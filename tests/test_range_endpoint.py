@@ -0,0 +1,30 @@
+from fastapi.testclient import TestClient
+from api.main import app
+
+client = TestClient(app)
+
+
+def test_month_range():
+    response = client.get("/times/range", params={
+        "lat": 51.5074, "lng": -0.1278, "year": 2024, "month": 2, "timezone": "Europe/London",
+    })
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["start"] == "2024-02-01"
+    assert data["end"] == "2024-02-29"
+    assert len(data["dates"]) == 29
+    assert len(data["times"]["maghrib"]) == 29
+
+
+def test_explicit_range_and_validation():
+    response = client.get("/times/range", params={
+        "lat": 21.4225, "lng": 39.8262, "start": "2025-03-01", "end": "2025-03-10",
+        "method": "UMM_AL_QURA", "timezone": "Asia/Riyadh",
+    })
+    assert response.status_code == 200, response.text
+    assert len(response.json()["times"]["isha"]) == 10
+
+    response = client.get("/times/range", params={"lat": 0, "lng": 0, "start": "2025-03-10", "end": "2025-03-01"})
+    assert response.status_code == 400
+    response = client.get("/times/range", params={"lat": 0, "lng": 0, "start": "2020-01-01", "end": "2025-01-01"})
+    assert response.status_code == 400
@@ -0,0 +1,125 @@
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from core.prayer_times import get_prayer_datetimes
+from core.scheduler import FreeIntervals, build_blocks, calculate_schedule, pack_tasks
+
+TZ = ZoneInfo("Europe/London")
+
+
+def _day():
+    return get_prayer_datetimes(latitude=51.5074, longitude=-0.1278, on_date=date(2025, 3, 1), timezone="Europe/London")
+
+
+def _block(schedule, kind):
+    return next(b for b in schedule if b["type"] == kind)
+
+
+def test_packs_by_priority_and_overflows_to_next_block():
+    prayer = _day()
+    deep_minutes = int((prayer["times"]["zuhr"] - prayer["times"]["sunrise"]).total_seconds() // 60)
+    tasks = [
+        {"name": "filler", "duration_minutes": deep_minutes - 30, "type": "deep"},
+        {"name": "urgent", "duration_minutes": 60, "type": "deep", "priority": 5, "splittable": False},
+        {"name": "email", "duration_minutes": 20, "type": "shallow"},
+    ]
+    schedule, unscheduled = calculate_schedule(tasks, prayer)
+
+    deep = _block(schedule, "work_deep")
+    # Higher priority goes first; "filler" no longer fits whole anywhere, so it is
+    # split: the rest of the morning, then the mid-day block
+    assert [t["name"] for t in deep["tasks"]] == ["urgent", "filler"]
+    assert deep["tasks"][0]["start"] == deep["start"]
+    assert deep["free_minutes"] == 0
+    filler_parts = [t for b in schedule for t in b.get("tasks", []) if t["name"] == "filler"]
+    assert sum(t["scheduled_minutes"] for t in filler_parts) == deep_minutes - 30
+    assert all(t["parts"] == len(filler_parts) for t in filler_parts)
+    assert unscheduled == []
+
+
+def test_unsplittable_task_that_fits_nowhere_is_unscheduled():
+    schedule, unscheduled = calculate_schedule(
+        [{"name": "marathon", "duration_minutes": 20 * 60, "type": "deep", "splittable": False}], _day()
+    )
+    assert [t["name"] for t in unscheduled] == ["marathon"]
+    assert unscheduled[0]["remaining_minutes"] == 20 * 60
+    assert all(not b.get("tasks") for b in schedule)
+
+
+def test_free_intervals_take_best_fit():
+    start = datetime(2025, 3, 1, 9, 0, tzinfo=TZ)
+    free = FreeIntervals(start, start + timedelta(hours=3))
+    assert free.take(timedelta(minutes=100)) == (start, start + timedelta(minutes=100))
+    assert free.largest() == timedelta(minutes=80)
+    assert free.take(timedelta(minutes=30)) == (start + timedelta(minutes=100), start + timedelta(minutes=130))
+    assert free.free == timedelta(minutes=50)
+    assert free.intervals() == [(start + timedelta(minutes=130), start + timedelta(minutes=180))]
+    assert free.take(timedelta(minutes=60)) is None
+
+
+def test_hundreds_of_tasks_pack_without_overlap():
+    prayer = _day()
+    tasks = [{"name": f"t{i}", "duration_minutes": 5 + i % 40, "type": "deep" if i % 3 else "shallow",
+              "priority": i % 4} for i in range(800)]
+    blocks = build_blocks(prayer["times"])
+    unscheduled = pack_tasks(blocks, tasks)
+    assert unscheduled
+
+    for block in blocks:
+        slots = sorted(slot for slot, _, _ in block.placed)
+        for (s1, e1), (s2, e2) in zip(slots, slots[1:]):
+            assert e1 <= s2
+        assert all(block.start <= s and e <= block.end for s, e in slots)
+
+
+def _week(start=date(2025, 3, 3), days=5):
+    from core.prayer_calendar import get_prayer_datetimes_range
+    return get_prayer_datetimes_range(
+        latitude=51.5074, longitude=-0.1278, start=start, end=start + timedelta(days=days - 1), timezone="Europe/London"
+    )
+
+
+def _placed(plan, name):
+    return {
+        day.date: sum(int((end - start).total_seconds() // 60) for block in day.blocks for (start, end), task, _ in block.placed if task["name"] == name)
+        for day in plan.days
+    }
+
+
+def test_multi_day_plan_carries_work_over():
+    from core.scheduler import MultiDayPlan
+    days = _week()
+    tasks = [
+        {"name": "thesis", "duration_minutes": 1500, "type": "deep"},
+        {"name": "email", "duration_minutes": 30, "type": "shallow"},
+    ]
+    plan = MultiDayPlan(days, tasks)
+
+    placed = _placed(plan, "thesis")
+    # More than a day of work: it spills into later days, and nothing is lost
+    assert placed[days[0]["date"]] > 0 and placed[days[1]["date"]] > 0
+    assert sum(placed.values()) + sum(t["remaining_minutes"] for t in plan.unscheduled) == 1500
+    carried = [t for b in plan.render()["days"][1]["schedule"] for t in b.get("tasks", []) if t["name"] == "thesis"]
+    assert carried and all(t["carried_over"] for t in carried)
+
+
+def test_multi_day_plan_replans_incrementally():
+    from core.scheduler import MultiDayPlan
+    days = _week()
+    plan = MultiDayPlan(days, [{"name": "report", "duration_minutes": 600, "type": "deep"}])
+    before = _placed(plan, "report")
+
+    # Re-planning starts at day 1 and stops once a day carries out what it did before;
+    # the result matches planning from scratch
+    changed = plan.add_task({"name": "call", "duration_minutes": 15, "type": "shallow"})
+    assert changed[0] == days[0]["date"] and len(changed) < len(days)
+    fresh = MultiDayPlan(days, plan.tasks)
+    assert _placed(plan, "report") == _placed(fresh, "report")
+    assert _placed(plan, "call") == _placed(fresh, "call")
+
+    # Completing a task never re-plans the days before its first placed piece
+    first_day = min(d for d, minutes in before.items() if minutes)
+    changed = plan.complete_task("report")
+    assert all(d >= first_day for d in changed)
+    assert sum(_placed(plan, "report").values()) == 0
+    assert plan.unscheduled == []
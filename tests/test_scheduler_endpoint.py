@@ -44,5 +44,24 @@ def test_generate_schedule():
     print("Test passed!")
     print(json.dumps(schedule, indent=2))
 
+def test_generate_schedule_range():
+    payload = {
+        "latitude": 51.5074,
+        "longitude": -0.1278,
+        "start": "2025-03-03",
+        "end": "2025-03-09",
+        "timezone": "Europe/London",
+        "tasks": [{"name": "Write book", "duration_minutes": 1200, "type": "deep"}],
+    }
+    response = client.post("/schedule/range", json=payload)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert [d["date"] for d in data["days"]][0] == "2025-03-03"
+    assert len(data["days"]) == 7
+    assert data["unscheduled"] == []
+
+    payload["end"] = "2025-06-01"
+    assert client.post("/schedule/range", json=payload).status_code == 400
+
 if __name__ == "__main__":
     test_generate_schedule()
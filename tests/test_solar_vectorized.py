@@ -0,0 +1,65 @@
+from datetime import date, timedelta
+from zoneinfo import ZoneInfo
+import math
+
+import numpy as np
+
+from core import solar_calculations as solar
+from core import solar_vectorized as vsolar
+
+
+def _scalar_minutes(dt_utc, on_date):
+    midnight = dt_utc.replace(year=on_date.year, month=on_date.month, day=on_date.day,
+                              hour=0, minute=0, second=0, microsecond=0)
+    return (dt_utc - midnight).total_seconds() / 60.0
+
+
+def test_matches_scalar_for_a_year():
+    """
+    A full year for one city must agree with the scalar engine to well under a second.
+    """
+    lat, lng = 51.5074, -0.1278
+    start = date(2025, 1, 1)
+    days = [start + timedelta(days=i) for i in range(365)]
+
+    sunrise = vsolar.sunrise_utc(lat, lng, days)
+    sunset = vsolar.sunset_utc(lat, lng, days)
+    noon = vsolar._solar_noon_utc(lat, lng, days)
+    asr = vsolar.asr_time_utc(lat, lng, days, asr_factor=2)
+
+    for i in range(0, 365, 7):
+        d = days[i]
+        expected = _scalar_minutes(solar._event_time_utc(lat, lng, d, -0.833, "before"), d)
+        assert abs(sunrise[i] - expected) < 1e-3
+        expected = _scalar_minutes(solar._event_time_utc(lat, lng, d, -0.833, "after"), d)
+        assert abs(sunset[i] - expected) < 1e-3
+        expected = _scalar_minutes(solar._solar_noon_utc(lat, lng, d), d)
+        assert abs(noon[i] - expected) < 1e-3
+        tz = ZoneInfo("UTC")
+        expected = _scalar_minutes(solar.asr_time(latitude=lat, longitude=lng, on_date=d, tz=tz, asr_factor=2), d)
+        assert abs(asr[i] - expected) < 1e-3
+
+
+def test_city_grid_broadcasts():
+    lats = np.array([[21.42], [51.51], [59.91]])
+    lngs = np.array([[39.83], [-0.13], [10.75]])
+    days = np.arange("2025-01-01", "2026-01-01", dtype="datetime64[D]")
+
+    fajr = vsolar._event_time_utc(lats, lngs, days, -18.0, "before")
+    assert fajr.shape == (3, 365)
+    # Makkah always has a Fajr at 18 degrees
+    assert np.isfinite(fajr[0]).all()
+
+
+def test_unreachable_altitude_is_nan():
+    """
+    Oslo in midsummer: the sun never gets 18 degrees below the horizon.
+    """
+    days = [date(2025, 6, 21), date(2025, 12, 21)]
+    fajr = vsolar._event_time_utc(59.91, 10.75, days, -18.0, "before")
+    assert math.isnan(fajr[0])
+    assert not math.isnan(fajr[1])
+
+    instants = vsolar.minutes_to_datetime64(days, fajr)
+    assert np.isnat(instants[0])
+    assert not np.isnat(instants[1])
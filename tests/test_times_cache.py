@@ -0,0 +1,45 @@
+from fastapi.testclient import TestClient
+from api.main import app, times_cache
+
+client = TestClient(app)
+
+PARAMS = {"lat": 51.5074, "lng": -0.1278, "date": "2025-03-01", "timezone": "Europe/London"}
+
+
+def test_etag_and_cache_headers():
+    times_cache.clear()
+    first = client.get("/times", params=PARAMS)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert "max-age=" in first.headers["cache-control"]
+
+    # Deterministic: same request, same ETag, served from the cache
+    hits = times_cache.stats()["hits"]
+    second = client.get("/times", params=PARAMS)
+    assert second.headers["etag"] == etag
+    assert second.json() == first.json()
+    assert times_cache.stats()["hits"] == hits + 1
+
+    other = client.get("/times", params={**PARAMS, "date": "2025-03-02"})
+    assert other.headers["etag"] != etag
+
+
+def test_if_none_match_returns_304_without_computing():
+    times_cache.clear()
+    etag = client.get("/times", params=PARAMS).headers["etag"]
+    misses = times_cache.stats()["misses"]
+
+    response = client.get("/times", params=PARAMS, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+    assert times_cache.stats()["misses"] == misses
+
+
+def test_fields_selector():
+    full = client.get("/times", params=PARAMS)
+    narrow = client.get("/times", params={**PARAMS, "fields": "maghrib,isha"})
+    assert narrow.status_code == 200
+    assert narrow.json()["times"] == {k: full.json()["times"][k] for k in ("maghrib", "isha")}
+    assert narrow.headers["etag"] != full.headers["etag"]
+    assert client.get("/times", params={**PARAMS, "fields": "sunset"}).status_code == 400
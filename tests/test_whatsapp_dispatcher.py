@@ -0,0 +1,138 @@
+import asyncio
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from messaging.dispatcher import TokenBucket, WhatsAppDispatcher
+
+
+class StubCloudAPI(BaseHTTPRequestHandler):
+    """
+    Local stand-in for the Cloud API messages endpoint:
+      +429...  rate limited on the first attempt
+      +500...  always fails
+      +400...  rejected (not retryable)
+      anything else succeeds after a short delay
+    """
+    calls = Counter()
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        to = body["to"]
+        cls = type(self)
+        with cls.lock:
+            cls.calls[to] += 1
+            attempt = cls.calls[to]
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            time.sleep(0.02)
+            if to.startswith("+429") and attempt == 1:
+                self._reply(429, {"error": "rate limited"}, {"Retry-After": "0"})
+            elif to.startswith("+500"):
+                self._reply(500, {"error": "boom"})
+            elif to.startswith("+400"):
+                self._reply(400, {"error": "bad number"})
+            else:
+                self._reply(200, {"messages": [{"id": f"wamid.{to}"}]})
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def _reply(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_api():
+    StubCloudAPI.calls = Counter()
+    StubCloudAPI.in_flight = StubCloudAPI.max_in_flight = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubCloudAPI)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def _send(api_url, messages, **kwargs):
+    async def run():
+        async with WhatsAppDispatcher(api_url=api_url, phone_number_id="123", access_token="t",
+                                      backoff_base=0.01, **kwargs) as dispatcher:
+            return await dispatcher.send_many(messages), dispatcher.stats()
+    return asyncio.run(run())
+
+
+def test_sends_concurrently_within_cap_and_retries(stub_api):
+    messages = [(f"+4470000{i:03d}", "Maghrib") for i in range(30)]
+    messages += [("+429111", "retry me"), ("+500222", "always fails"), ("+400333", "rejected")]
+
+    results, stats = _send(stub_api, messages, concurrency=5, rate_per_second=1000, max_retries=2)
+
+    assert [r.to for r in results] == [to for to, _ in messages]
+    assert all(r.ok and r.attempts == 1 for r in results[:30])
+    assert results[30].ok and results[30].attempts == 2
+    assert not results[31].ok and results[31].status_code == 500 and results[31].attempts == 3
+    assert not results[32].ok and results[32].attempts == 1
+    assert all(r.latency_ms > 0 for r in results)
+
+    assert 1 < StubCloudAPI.max_in_flight <= 5
+    assert stats["sent"] == 31 and stats["failed"] == 2 and stats["retries"] == 3
+    assert stats["latency_ms"]["p50"] is not None
+
+
+def test_token_bucket_limits_rate(stub_api):
+    started = time.perf_counter()
+    results, _ = _send(stub_api, [(f"+4471{i}", "Fajr") for i in range(12)], rate_per_second=20, burst=2)
+    elapsed = time.perf_counter() - started
+    assert all(r.ok for r in results)
+    assert elapsed >= 0.45  # 2 immediately, then 10 at 20/s
+
+
+def test_token_bucket_validates_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+
+
+def test_backoff_releases_the_slot_and_tolerates_non_json_success():
+    import httpx
+
+    finished = []
+
+    def handler(request):
+        to = json.loads(request.content)["to"]
+        if to == "+500":
+            return httpx.Response(503, headers={"Retry-After": "0.2"}, text="busy")
+        return httpx.Response(200, text="OK")  # 2xx without a JSON body
+
+    async def run():
+        async with WhatsAppDispatcher(api_url="http://stub", phone_number_id="123", access_token="t", concurrency=1,
+                                      max_retries=1, transport=httpx.MockTransport(handler)) as dispatcher:
+            async def send(to):
+                result = await dispatcher.send(to, "Isha")
+                finished.append(to)
+                return result
+            return await asyncio.gather(send("+500"), send("+4472"))
+
+    failing, healthy = asyncio.run(run())
+    # With one slot, the healthy send goes out while the failing one sleeps
+    assert finished == ["+4472", "+500"]
+    assert healthy.ok and healthy.response is None
+    assert not failing.ok and failing.attempts == 2